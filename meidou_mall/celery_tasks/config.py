@@ -1 +1,15 @@
-broker_url = 'redis://127.0.0.1/15'
\ No newline at end of file
+broker_url = 'redis://127.0.0.1/15'
+
+# 定时任务, 需要启动celery beat
+beat_schedule = {
+    # 每5秒把redis中预扣的销量同步到数据库
+    'flush-stock-sold-delta': {
+        'task': 'flush_stock_sold_delta',
+        'schedule': 5.0,
+    },
+    # 每5秒批量更新搜索索引
+    'flush-search-index': {
+        'task': 'flush_search_index',
+        'schedule': 5.0,
+    },
+}
@@ -0,0 +1,20 @@
+import logging
+
+from celery_tasks.main import celery_app
+from goods import inventory
+
+
+logger = logging.getLogger('django')
+
+
+@celery_app.task(name='flush_stock_sold_delta')
+def flush_stock_sold_delta():
+    """把redis中预扣的销量批量同步到数据库"""
+    try:
+        count = inventory.flush_sold_delta()
+    except Exception as e:
+        logger.error('同步redis预扣库存[异常][ message: %s]' % e)
+        raise
+    else:
+        if count:
+            logger.info('同步redis预扣库存[正常][ sku数量: %s]' % count)
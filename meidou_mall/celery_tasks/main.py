@@ -14,4 +14,4 @@ celery_app = Celery('meiduo')
 celery_app.config_from_object('celery_tasks.config')
 
 # 导入任务
-celery_app.autodiscover_tasks(['celery_tasks.sms', 'celery_tasks.email', 'celery_tasks.html'])
\ No newline at end of file
+celery_app.autodiscover_tasks(['celery_tasks.sms', 'celery_tasks.email', 'celery_tasks.html', 'celery_tasks.inventory', 'celery_tasks.search'])
\ No newline at end of file
@@ -0,0 +1,23 @@
+import logging
+
+from celery_tasks.main import celery_app
+from goods.search import invalidate_search_cache
+from meidou_mall.utils.search_queue import flush_search_queue
+
+
+logger = logging.getLogger('django')
+
+
+@celery_app.task(name='flush_search_index')
+def flush_search_index():
+    """把排队的商品修改批量写入搜索索引"""
+    try:
+        updated, removed = flush_search_queue()
+    except Exception as e:
+        logger.error('更新搜索索引[异常][ message: %s]' % e)
+        raise
+    else:
+        if updated or removed:
+            # 索引已更新, 搜索结果缓存失效
+            invalidate_search_cache()
+            logger.info('更新搜索索引[正常][ 更新: %s, 删除: %s]' % (updated, removed))
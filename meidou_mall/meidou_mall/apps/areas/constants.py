@@ -0,0 +1,5 @@
+# 省市区数据版本号缓存键, 数据修改后版本号加1, 各进程重新加载省市区树
+AREA_TREE_VERSION_CACHE_KEY = 'area_tree_version'
+
+# 进程检查省市区数据版本号的间隔, 单位秒
+AREA_TREE_CHECK_INTERVAL = 60
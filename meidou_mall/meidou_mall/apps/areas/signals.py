@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from areas.models import Area
+from areas.tree import invalidate_area_tree
+
+
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+def reload_area_tree(sender, **kwargs):
+    """省市区修改的事务提交后, 各进程重新加载省市区树"""
+    transaction.on_commit(invalidate_area_tree)
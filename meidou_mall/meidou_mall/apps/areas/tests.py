@@ -1,3 +1,50 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from areas.tree import AreaTree
+
+ROWS = [
+    (110101, '东城区', 110100),
+    (120000, '天津市', None),
+    (110102, '西城区', 110100),
+    (110000, '北京市', None),
+    (110100, '北京市', 110000),
+    (120100, '天津市', 120000),
+]
+
+
+class AreaTreeTest(SimpleTestCase):
+    """进程内的省市区树"""
+
+    def setUp(self):
+        self.tree = AreaTree(ROWS)
+
+    def test_roots(self):
+        self.assertEqual(json.loads(self.tree.roots_json.decode()), [
+            {'id': 110000, 'name': '北京市'},
+            {'id': 120000, 'name': '天津市'},
+        ])
+
+    def test_node_json(self):
+        self.assertEqual(json.loads(self.tree.get_node_json(110100).decode()), {
+            'id': 110100,
+            'name': '北京市',
+            'subs': [{'id': 110101, 'name': '东城区'}, {'id': 110102, 'name': '西城区'}],
+        })
+        self.assertEqual(json.loads(self.tree.get_node_json(110101).decode()),
+                         {'id': 110101, 'name': '东城区', 'subs': []})
+        self.assertIsNone(self.tree.get_node_json(999999))
+
+    def test_name_and_parent(self):
+        self.assertEqual(self.tree.get_name(110102), '西城区')
+        self.assertEqual(self.tree.get_parent_id(110102), 110100)
+        self.assertEqual(self.tree.get_parent_id(110100), 110000)
+        self.assertIsNone(self.tree.get_parent_id(110000))
+        self.assertIsNone(self.tree.get_name(999999))
+        self.assertIsNone(self.tree.get_parent_id(999999))
+
+    def test_empty(self):
+        tree = AreaTree([])
+        self.assertEqual(json.loads(tree.roots_json.decode()), [])
+        self.assertIsNone(tree.get_node_json(110000))
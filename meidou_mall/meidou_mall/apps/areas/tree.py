@@ -0,0 +1,145 @@
+"""
+进程内的省市区树
+
+tb_areas 很少修改, 每个进程加载一次全部数据(1次查询), 之后省市区接口不再访问数据库和redis
+- 节点按 (上级节点, id) 排序后保存在数组中, 同一节点的下级节点连续存放, 用起止下标表示
+- 每个节点预先序列化好接口返回的JSON
+- 数据修改的事务提交后通过信号使版本号加1, 各进程最多在 AREA_TREE_CHECK_INTERVAL 秒后从主库重新加载
+"""
+import json
+import threading
+import time
+from array import array
+
+from django.core.cache import cache
+
+from areas import constants
+from areas.models import Area
+from meidou_mall.utils.db_router import use_primary
+
+
+def _dumps(data):
+    # 与rest_framework的JSONRenderer输出一致
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class AreaTree(object):
+    """省市区树"""
+
+    def __init__(self, rows):
+        """
+        :param rows: [(id, name, parent_id), ...]
+        """
+        # 顶级节点在前, 同一上级的节点相邻
+        rows = sorted(rows, key=lambda row: (row[2] is not None, row[2] or 0, row[0]))
+
+        self.ids = array('l', (row[0] for row in rows))
+        self.names = [row[1] for row in rows]
+        self.index = {area_id: i for i, area_id in enumerate(self.ids)}
+        # 上级节点的下标, 顶级节点为-1
+        self.parents = array('l', (self.index.get(row[2], -1) for row in rows))
+
+        # 下级节点的起止下标 [start, end)
+        size = len(rows)
+        self.child_start = array('l', [0] * size)
+        self.child_end = array('l', [0] * size)
+        self.root_end = 0
+        for i, parent in enumerate(self.parents):
+            if parent == -1:
+                self.root_end = i + 1
+                continue
+            if self.child_end[parent] == 0:
+                self.child_start[parent] = i
+            self.child_end[parent] = i + 1
+
+        # 预先序列化的JSON
+        self.roots_json = _dumps([self._brief(i) for i in range(self.root_end)])
+        self.node_json = [
+            _dumps({
+                'id': self.ids[i],
+                'name': self.names[i],
+                'subs': [self._brief(j) for j in range(self.child_start[i], self.child_end[i])],
+            }) for i in range(size)
+        ]
+
+    def _brief(self, i):
+        return {'id': self.ids[i], 'name': self.names[i]}
+
+    def get_name(self, area_id):
+        """查询名称, 不存在时返回None"""
+        i = self.index.get(area_id)
+        return None if i is None else self.names[i]
+
+    def get_parent_id(self, area_id):
+        i = self.index.get(area_id)
+        if i is None or self.parents[i] == -1:
+            return None
+        return self.ids[self.parents[i]]
+
+    def get_node_json(self, area_id):
+        """节点及其下级节点的JSON, 不存在时返回None"""
+        i = self.index.get(area_id)
+        return None if i is None else self.node_json[i]
+
+
+# 进程内的省市区树 (版本号, 树, 下次检查版本号的时间)
+_tree_memo = (None, None, 0)
+_tree_lock = threading.Lock()
+
+
+def _get_version():
+    version = cache.get(constants.AREA_TREE_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(constants.AREA_TREE_VERSION_CACHE_KEY, 1, None)
+        version = cache.get(constants.AREA_TREE_VERSION_CACHE_KEY, 1)
+    return version
+
+
+def load_area_tree():
+    """从主库加载省市区树, 加载后直到下次修改都不再检查, 不能使用从库的旧数据"""
+    with use_primary():
+        rows = list(Area.objects.values_list('id', 'name', 'parent_id'))
+    return AreaTree(rows)
+
+
+def get_area_tree():
+    """获取进程内的省市区树, 每隔 AREA_TREE_CHECK_INTERVAL 秒检查一次版本号"""
+    global _tree_memo
+
+    version, tree, check_at = _tree_memo
+    now = time.time()
+    if tree is not None and now < check_at:
+        return tree
+
+    with _tree_lock:
+        version, tree, check_at = _tree_memo
+        if tree is not None and now < check_at:
+            return tree
+
+        new_version = _get_version()
+        if tree is None or new_version != version:
+            tree = load_area_tree()
+        _tree_memo = (new_version, tree, now + constants.AREA_TREE_CHECK_INTERVAL)
+        return tree
+
+
+def reload_area_tree():
+    """立即重新加载本进程的省市区树"""
+    global _tree_memo
+    with _tree_lock:
+        _tree_memo = (None, None, 0)
+    return get_area_tree()
+
+
+def invalidate_area_tree():
+    """
+    省市区数据修改的事务提交后调用, 本进程下次使用时重新加载, 其他进程在下次检查版本号时重新加载
+    """
+    global _tree_memo
+    try:
+        cache.incr(constants.AREA_TREE_VERSION_CACHE_KEY)
+    except ValueError:
+        # 版本号不存在
+        cache.add(constants.AREA_TREE_VERSION_CACHE_KEY, 1, None)
+    with _tree_lock:
+        _tree_memo = (None, None, 0)
@@ -1,25 +1,25 @@
-from django.shortcuts import render
-from rest_framework import serializers
-from rest_framework.viewsets import ReadOnlyModelViewSet
-from rest_framework_extensions.cache.mixins import CacheResponseMixin
+from django.http import HttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.viewsets import ViewSet
 
-from areas.models import Area
-from . import serializers
+from areas.tree import get_area_tree
 
 
-class AreaViewSet(CacheResponseMixin, ReadOnlyModelViewSet):
+class AreaViewSet(ViewSet):
+    """
+    省市区
+    直接返回进程内省市区树中预先序列化好的JSON, 不访问数据库和redis
+    """
 
-    # 关闭分页处理
-    pagination_class = None
+    def list(self, request):
+        return HttpResponse(get_area_tree().roots_json, content_type='application/json')
 
-    def get_queryset(self):
-        if self.action == 'list':
-            return Area.objects.filter(parent=None)
-        else:
-            return Area.objects.all()
-
-    def get_serializer_class(self):
-        if self.action == 'list':
-            return serializers.AreaSerializer
-        else:
-            return serializers.SubAreaSerializer
+    def retrieve(self, request, pk=None):
+        try:
+            area_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+        node_json = get_area_tree().get_node_json(area_id)
+        if node_json is None:
+            raise NotFound()
+        return HttpResponse(node_json, content_type='application/json')
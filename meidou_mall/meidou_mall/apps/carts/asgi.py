@@ -0,0 +1,296 @@
+"""
+购物车接口的异步实现(ASGI), 接口与 carts.views 相同:
+    GET/POST/PUT/DELETE  /cart/
+    PUT                  /cart/selection/
+
+django 1.11 不支持ASGI, 这里是一个独立的ASGI应用, 由 meidou_mall/asgi.py 加载, 例如:
+    uvicorn meidou_mall.asgi:application --workers 4
+nginx把 /cart/ 转发到该服务, 其他接口仍由uwsgi处理
+
+- 已登录用户的购物车通过异步redis客户端读写, 与同步视图使用相同的redis键
+- 查询购物车只通过商品摘要缓存(一次批量查询)访问数据库, 数据库查询在线程池中执行
+- 添加/修改时与 CartSerializer 相同, 按数据库中的库存检查数量
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_jwt.settings import api_settings
+
+from goods.models import SKU
+from goods.summary import get_sku_summaries
+from .async_store import AsyncRedisCartStore
+from .store import CookieCartStore
+
+
+class ValidationError(Exception):
+    """参数错误, 返回400, 格式与rest_framework的校验错误相同"""
+
+    def __init__(self, detail):
+        self.detail = detail
+
+
+class CookieRequest(object):
+    """CookieCartStore 需要的请求对象"""
+
+    def __init__(self, cookies):
+        self.COOKIES = cookies
+
+
+class CookieResponse(object):
+    """收集 CookieCartStore.save 写入的cookie"""
+
+    def __init__(self):
+        self.cookies = SimpleCookie()
+
+    def set_cookie(self, key, value, max_age=None):
+        self.cookies[key] = value
+        self.cookies[key]['path'] = '/'
+        if max_age is not None:
+            self.cookies[key]['max-age'] = max_age
+
+    def headers(self):
+        return [(b'set-cookie', morsel.OutputString().encode()) for morsel in self.cookies.values()]
+
+
+def get_user_id(headers):
+    """从JWT中获取用户id, 没有或无效的token按未登录处理(与同步视图相同)"""
+    auth = headers.get(b'authorization', b'').decode().split()
+    if len(auth) != 2 or auth[0].lower() != api_settings.JWT_AUTH_HEADER_PREFIX.lower():
+        return None
+    try:
+        payload = api_settings.JWT_DECODE_HANDLER(auth[1])
+    except Exception:
+        return None
+    return payload.get('user_id')
+
+
+def parse_int(data, name, required=True):
+    value = data.get(name)
+    if value is None:
+        if required:
+            raise ValidationError({name: ['该字段是必填项。']})
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: ['请填写合法的整数值。']})
+    if value < 1:
+        raise ValidationError({name: ['请确保该值大于或者等于 1。']})
+    return value
+
+
+def parse_bool(data, name, default=None):
+    value = data.get(name, default)
+    if value in (True, 'true', 'True', 'TRUE', '1', 1):
+        return True
+    if value in (False, 'false', 'False', 'FALSE', '0', 0):
+        return False
+    if value is None:
+        raise ValidationError({name: ['该字段是必填项。']})
+    raise ValidationError({name: ['"%s"不是合法的布尔值。' % value]})
+
+
+def _call_db(func, *args):
+    # 线程池中没有 request_started/request_finished 信号, 查询前后自行关闭超时或出错的数据库连接,
+    # 否则连接空闲超过MySQL的wait_timeout后报 "MySQL server has gone away"
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func, *args):
+    """在线程池中执行数据库查询"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, _call_db, func, *args)
+
+
+async def get_summaries(sku_ids):
+    """在线程池中批量查询商品摘要"""
+    return await run_db(get_sku_summaries, list(sku_ids))
+
+
+def _get_sku_stock(sku_id):
+    """商品不存在时返回None"""
+    return SKU.objects.filter(id=sku_id).values_list('stock', flat=True).first()
+
+
+async def check_sku(sku_id, count=None):
+    """检查商品存在, 指定数量时检查库存, 与 CartSerializer 相同"""
+    if count is None:
+        summaries = await get_summaries([sku_id])
+        if sku_id not in summaries:
+            raise ValidationError({'non_field_errors': ['商品不存在']})
+        return
+
+    stock = await run_db(_get_sku_stock, sku_id)
+    if stock is None:
+        raise ValidationError({'non_field_errors': ['商品不存在']})
+    if count > stock:
+        raise ValidationError({'non_field_errors': ['商品库存不足']})
+
+
+async def cart_get(store, data):
+    cart_dict = await maybe_await(store.get_cart())
+    sku_summaries = await get_summaries(cart_dict.keys())
+    sku_list = []
+    for sku_id, count_selected_dict in cart_dict.items():
+        sku = sku_summaries.get(sku_id)
+        if sku is None:
+            # 商品已不存在
+            continue
+        # 与 CartSKUSerializer 的字段相同
+        sku_list.append({
+            'id': sku['id'],
+            'count': count_selected_dict['count'],
+            'name': sku['name'],
+            'default_image_url': sku['default_image_url'],
+            'price': sku['price'],
+            'selected': count_selected_dict['selected'],
+        })
+    return 200, sku_list
+
+
+async def cart_post(store, data):
+    sku_id = parse_int(data, 'sku_id')
+    count = parse_int(data, 'count')
+    selected = parse_bool(data, 'selected', default=True)
+    await check_sku(sku_id, count)
+    await maybe_await(store.add_many({sku_id: {'count': count, 'selected': selected}}))
+    return 201, {'sku_id': sku_id, 'count': count, 'selected': selected}
+
+
+async def cart_put(store, data):
+    sku_id = parse_int(data, 'sku_id')
+    count = parse_int(data, 'count')
+    selected = parse_bool(data, 'selected', default=True)
+    await check_sku(sku_id, count)
+    await maybe_await(store.update(sku_id, count, selected))
+    return 200, {'sku_id': sku_id, 'count': count, 'selected': selected}
+
+
+async def cart_delete(store, data):
+    sku_id = parse_int(data, 'sku_id')
+    await check_sku(sku_id)
+    await maybe_await(store.remove_many([sku_id]))
+    return 204, None
+
+
+async def selection_put(store, data):
+    selected = parse_bool(data, 'selected')
+    await maybe_await(store.select_all(selected))
+    return 200, {'message': 'OK'}
+
+
+async def maybe_await(result):
+    """CookieCartStore的方法是同步的"""
+    if asyncio.iscoroutine(result):
+        return await result
+    return result
+
+
+ROUTES = {
+    ('/cart/', 'GET'): cart_get,
+    ('/cart/', 'POST'): cart_post,
+    ('/cart/', 'PUT'): cart_put,
+    ('/cart/', 'DELETE'): cart_delete,
+    ('/cart/selection/', 'PUT'): selection_put,
+}
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def parse_body(headers, body):
+    if not body:
+        return {}
+    content_type = headers.get(b'content-type', b'').decode()
+    if content_type.startswith('application/json'):
+        try:
+            data = json.loads(body.decode())
+        except ValueError:
+            raise ValidationError({'detail': 'JSON parse error'})
+        if not isinstance(data, dict):
+            raise ValidationError({'non_field_errors': ['无效数据。期待为字典类型，得到的是 %s 。' % type(data).__name__]})
+        return data
+    return dict(parse_qsl(body.decode()))
+
+
+def cors_headers(headers):
+    """与 django-cors-headers 的配置相同"""
+    origin = headers.get(b'origin', b'').decode()
+    if not origin:
+        return []
+    if origin not in settings.CORS_ORIGIN_WHITELIST:
+        return []
+    result = [(b'access-control-allow-origin', origin.encode()), (b'vary', b'Origin')]
+    if getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+        result.append((b'access-control-allow-credentials', b'true'))
+    return result
+
+
+class CartApplication(object):
+    """购物车ASGI应用"""
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        headers = dict((key.lower(), value) for key, value in scope['headers'])
+        path = scope['path'] if scope['path'].endswith('/') else scope['path'] + '/'
+        method = scope['method']
+        extra_headers = cors_headers(headers)
+
+        if method == 'OPTIONS':
+            extra_headers += [
+                (b'access-control-allow-methods', b'GET, POST, PUT, DELETE, OPTIONS'),
+                (b'access-control-allow-headers', headers.get(b'access-control-request-headers', b'*')),
+            ]
+            return await self.respond(send, 200, None, extra_headers)
+
+        handler = ROUTES.get((path, method))
+        if handler is None:
+            return await self.respond(send, 404, {'detail': '未找到。'}, extra_headers)
+
+        user_id = get_user_id(headers)
+        if user_id is not None:
+            store = AsyncRedisCartStore(user_id)
+        else:
+            cookie = SimpleCookie(headers.get(b'cookie', b'').decode())
+            store = CookieCartStore(CookieRequest({key: morsel.value for key, morsel in cookie.items()}))
+
+        try:
+            data = parse_body(headers, await read_body(receive))
+            status, result = await handler(store, data)
+        except ValidationError as e:
+            return await self.respond(send, 400, e.detail, extra_headers)
+
+        response = CookieResponse()
+        store.save(response)
+        await self.respond(send, status, result, extra_headers + response.headers())
+
+    async def respond(self, send, status, data, headers):
+        body = b'' if data is None else json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+        headers = list(headers)
+        if data is not None:
+            headers.append((b'content-type', b'application/json'))
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
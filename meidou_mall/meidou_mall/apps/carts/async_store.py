@@ -0,0 +1,88 @@
+"""
+异步购物车存储, 供 carts.asgi 使用
+
+与 carts.store 使用相同的redis键和lua脚本, 同步视图和异步接口可以同时读写同一个购物车
+cookie购物车没有I/O, 直接复用 CookieCartStore
+"""
+from django.conf import settings
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    raise ImportError('异步购物车接口需要 redis-py 4.2 或以上版本(redis.asyncio), 请执行 pip install "redis>=4.2"')
+
+from .store import GET_SELECTED_SCRIPT, SELECT_ALL_SCRIPT
+
+# 每个进程的redis连接池 {缓存别名: ConnectionPool}
+_pools = {}
+
+# 每个连接池的最大连接数, 超过后请求等待空闲连接
+ASYNC_REDIS_MAX_CONNECTIONS = 200
+
+
+def get_async_redis(alias):
+    """获取异步redis客户端, 连接地址与 CACHES 中的配置相同, 同一进程共用连接池"""
+    pool = _pools.get(alias)
+    if pool is None:
+        pool = _pools[alias] = aioredis.BlockingConnectionPool.from_url(
+            settings.CACHES[alias]['LOCATION'], max_connections=ASYNC_REDIS_MAX_CONNECTIONS)
+    return aioredis.Redis(connection_pool=pool)
+
+
+class AsyncRedisCartStore(object):
+    """已登录用户的redis购物车, 方法与 RedisCartStore 相同, 每个方法一次网络往返"""
+
+    def __init__(self, user_id, redis_conn=None):
+        self.redis_conn = redis_conn or get_async_redis('cart')
+        self.cart_key = 'cart_%s' % user_id
+        self.selected_key = 'cart_selected_%s' % user_id
+
+    async def get_cart(self):
+        async with self.redis_conn.pipeline(transaction=False) as pl:
+            redis_cart, redis_cart_selected = await pl.hgetall(self.cart_key).smembers(self.selected_key).execute()
+
+        cart_dict = {}
+        for sku_id, count in redis_cart.items():
+            cart_dict[int(sku_id)] = {
+                'count': int(count),
+                'selected': sku_id in redis_cart_selected
+            }
+        return cart_dict
+
+    async def get_selected(self):
+        result = await self.redis_conn.eval(GET_SELECTED_SCRIPT, 2, self.cart_key, self.selected_key)
+        return {int(result[i]): int(result[i + 1]) for i in range(0, len(result), 2)}
+
+    async def add_many(self, items):
+        if not items:
+            return
+        async with self.redis_conn.pipeline(transaction=False) as pl:
+            selected_sku_ids = []
+            for sku_id, item in items.items():
+                pl.hincrby(self.cart_key, sku_id, item['count'])
+                if item['selected']:
+                    selected_sku_ids.append(sku_id)
+            if selected_sku_ids:
+                pl.sadd(self.selected_key, *selected_sku_ids)
+            await pl.execute()
+
+    async def update(self, sku_id, count, selected):
+        async with self.redis_conn.pipeline(transaction=False) as pl:
+            pl.hset(self.cart_key, sku_id, count)
+            if selected:
+                pl.sadd(self.selected_key, sku_id)
+            else:
+                pl.srem(self.selected_key, sku_id)
+            await pl.execute()
+
+    async def remove_many(self, sku_ids):
+        if not sku_ids:
+            return
+        async with self.redis_conn.pipeline(transaction=False) as pl:
+            await pl.hdel(self.cart_key, *sku_ids).srem(self.selected_key, *sku_ids).execute()
+
+    async def select_all(self, selected):
+        await self.redis_conn.eval(SELECT_ALL_SCRIPT, 2, self.cart_key, self.selected_key, 1 if selected else 0)
+
+    def save(self, response):
+        pass
@@ -0,0 +1,157 @@
+"""
+cookie购物车编解码
+
+格式: urlsafe_base64(版本号 1字节 + 商品数据 + 签名)
+商品数据按sku_id升序排列, 每件商品为两个varint: sku_id与前一件商品sku_id的差值, count << 1 | selected
+签名为 版本号+商品数据 的HMAC, 截取前 CART_COOKIE_SIGNATURE_LENGTH 字节
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import io
+import logging
+import pickle
+
+from django.conf import settings
+
+from . import constants
+
+logger = logging.getLogger('django')
+
+# 签名使用的盐, 与其他使用SECRET_KEY的签名区分开
+SIGNATURE_SALT = 'carts.cookie'
+
+
+# 签名密钥, 与django.utils.crypto.salted_hmac的派生方式相同, 缓存后每次签名不必重新派生
+_signature_key = None
+
+
+def _sign(data):
+    global _signature_key
+    if _signature_key is None:
+        _signature_key = hashlib.sha1((SIGNATURE_SALT + settings.SECRET_KEY).encode()).digest()
+    return hmac.new(_signature_key, data, hashlib.sha1).digest()[:constants.CART_COOKIE_SIGNATURE_LENGTH]
+
+
+def _write_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(data, pos):
+    byte = data[pos]
+    if byte < 0x80:
+        # 单字节的值最常见, 直接返回
+        return byte, pos + 1
+
+    value = byte & 0x7f
+    shift = 7
+    pos += 1
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_cart(cart_dict):
+    """
+    编码cookie购物车
+    :param cart_dict: {sku_id: {'count': 10, 'selected': True}, ...}
+    :return: 用于保存到cookie的字符串
+    """
+    buf = bytearray([constants.CART_COOKIE_VERSION])
+    last_sku_id = 0
+    for sku_id in sorted(cart_dict):
+        count_selected_dict = cart_dict[sku_id]
+        _write_varint(buf, sku_id - last_sku_id)
+        _write_varint(buf, count_selected_dict['count'] << 1 | bool(count_selected_dict['selected']))
+        last_sku_id = sku_id
+
+    buf += _sign(bytes(buf))
+    return base64.urlsafe_b64encode(bytes(buf)).rstrip(b'=').decode()
+
+
+def decode_cart(cookie_cart):
+    """
+    解码cookie购物车, 格式错误或签名不符时视为空购物车
+    :param cookie_cart: cookie中保存的字符串
+    :return: {sku_id: {'count': 10, 'selected': True}, ...}
+    """
+    if not cookie_cart:
+        return {}
+
+    # 旧格式为 base64(pickle), pickle数据以 \x80 开头, base64编码后以 gA 开头
+    if cookie_cart.startswith('gA'):
+        return _decode_legacy_cart(cookie_cart)
+
+    try:
+        data = base64.urlsafe_b64decode(cookie_cart + '=' * (-len(cookie_cart) % 4))
+    except (binascii.Error, ValueError):
+        return {}
+
+    signature_length = constants.CART_COOKIE_SIGNATURE_LENGTH
+    if len(data) <= signature_length or data[0] != constants.CART_COOKIE_VERSION:
+        return {}
+
+    body, signature = data[:-signature_length], data[-signature_length:]
+    if not hmac.compare_digest(_sign(body), signature):
+        logger.warning('cookie购物车签名错误')
+        return {}
+
+    cart_dict = {}
+    pos = 1
+    sku_id = 0
+    try:
+        while pos < len(body):
+            delta, pos = _read_varint(body, pos)
+            value, pos = _read_varint(body, pos)
+            sku_id += delta
+            cart_dict[sku_id] = {
+                'count': value >> 1,
+                'selected': bool(value & 1)
+            }
+    except IndexError:
+        return {}
+
+    return cart_dict
+
+
+class _LegacyCartUnpickler(pickle.Unpickler):
+    """旧格式的购物车只包含dict/int/bool, 不允许加载任何类, 防止构造恶意cookie执行代码"""
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('forbidden global %s.%s' % (module, name))
+
+
+def _decode_legacy_cart(cookie_cart):
+    if not constants.CART_COOKIE_ACCEPT_LEGACY:
+        return {}
+
+    try:
+        cart_dict = _LegacyCartUnpickler(io.BytesIO(base64.b64decode(cookie_cart.encode()))).load()
+    except Exception:
+        return {}
+
+    if not isinstance(cart_dict, dict):
+        return {}
+
+    # 旧格式的cookie可以被客户端修改, 只保留格式正确的商品, 避免编码或购物车视图出错
+    valid_cart_dict = {}
+    for sku_id, count_selected_dict in cart_dict.items():
+        if not _is_positive_int(sku_id) or not isinstance(count_selected_dict, dict):
+            continue
+        count = count_selected_dict.get('count')
+        selected = count_selected_dict.get('selected')
+        if _is_positive_int(count) and isinstance(selected, bool):
+            valid_cart_dict[sku_id] = {'count': count, 'selected': selected}
+    return valid_cart_dict
+
+
+def _is_positive_int(value):
+    # bool是int的子类, 需要排除
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
@@ -1,2 +1,11 @@
 # cookie中的购物车有效期
-CART_COOKIE_EXPIRES = 365 * 24 * 60 * 60
\ No newline at end of file
+CART_COOKIE_EXPIRES = 365 * 24 * 60 * 60
+
+# cookie购物车编码格式版本
+CART_COOKIE_VERSION = 1
+
+# cookie购物车签名长度, 单位字节
+CART_COOKIE_SIGNATURE_LENGTH = 8
+
+# 是否兼容读取旧的 base64(pickle) 格式的cookie购物车, 旧cookie全部过期后可以关闭
+CART_COOKIE_ACCEPT_LEGACY = True
@@ -0,0 +1,240 @@
+"""
+购物车存储
+
+已登录用户的购物车保存在redis中:
+    hash  cart_<user_id>           {sku_id: count}
+    set   cart_selected_<user_id>  {勾选的sku_id}
+未登录用户的购物车保存在cookie中, 编码格式见 carts.codec
+
+每个方法对redis只有一次网络往返(管道或lua脚本)
+购物车数据统一表示为 {sku_id: {'count': 10, 'selected': True}, ...}
+"""
+from django_redis import get_redis_connection
+
+from . import constants
+from .codec import decode_cart, encode_cart
+
+
+# lua的unpack参数个数有上限(约8000), 大购物车每次最多展开1000个sku_id
+
+# 查询勾选商品的数量, 只返回勾选的商品
+# KEYS[1]: 商品数量hash, KEYS[2]: 勾选商品set
+# 返回 {sku_id_1, count_1, sku_id_2, count_2, ...}
+GET_SELECTED_SCRIPT = """
+local sku_ids = redis.call('SMEMBERS', KEYS[2])
+local result = {}
+for start = 1, #sku_ids, 1000 do
+    local batch = {unpack(sku_ids, start, math.min(start + 999, #sku_ids))}
+    local counts = redis.call('HMGET', KEYS[1], unpack(batch))
+    for i, sku_id in ipairs(batch) do
+        if counts[i] then
+            table.insert(result, sku_id)
+            table.insert(result, counts[i])
+        end
+    end
+end
+return result
+"""
+
+# 全选/取消全选
+# KEYS[1]: 商品数量hash, KEYS[2]: 勾选商品set, ARGV[1]: 1全选 0取消全选
+SELECT_ALL_SCRIPT = """
+if ARGV[1] == '1' then
+    local sku_ids = redis.call('HKEYS', KEYS[1])
+    for start = 1, #sku_ids, 1000 do
+        redis.call('SADD', KEYS[2], unpack(sku_ids, start, math.min(start + 999, #sku_ids)))
+    end
+else
+    redis.call('DEL', KEYS[2])
+end
+return 0
+"""
+
+
+class CartStore(object):
+    """购物车存储基类"""
+
+    def get_cart(self):
+        """
+        查询购物车
+        :return: {sku_id: {'count': 10, 'selected': True}, ...}
+        """
+        raise NotImplementedError
+
+    def get_selected(self):
+        """
+        查询勾选的商品
+        :return: {sku_id: count, ...}
+        """
+        return {sku_id: item['count'] for sku_id, item in self.get_cart().items() if item['selected']}
+
+    def add_many(self, items):
+        """
+        添加商品, 已在购物车中的商品累加数量
+        :param items: {sku_id: {'count': 10, 'selected': True}, ...}
+        """
+        raise NotImplementedError
+
+    def update(self, sku_id, count, selected):
+        """修改购物车中的商品数量和勾选状态"""
+        raise NotImplementedError
+
+    def remove_many(self, sku_ids):
+        """删除商品"""
+        raise NotImplementedError
+
+    def select_all(self, selected):
+        """全选/取消全选"""
+        raise NotImplementedError
+
+    def save(self, response):
+        """保存修改, 需要通过响应写回客户端的存储在此写入response"""
+        pass
+
+
+class RedisCartStore(CartStore):
+    """已登录用户的redis购物车"""
+
+    def __init__(self, user_id, redis_conn=None):
+        self.redis_conn = redis_conn or get_redis_connection('cart')
+        self.cart_key = 'cart_%s' % user_id
+        self.selected_key = 'cart_selected_%s' % user_id
+
+    def get_cart(self):
+        pl = self.redis_conn.pipeline()
+        pl.hgetall(self.cart_key)
+        pl.smembers(self.selected_key)
+        redis_cart, redis_cart_selected = pl.execute()
+        # redis_cart = {
+        #     商品的sku_id  bytes字节类型: 数量  bytes字节类型
+        #    ...
+        # }
+        # redis_cart_selected = set(勾选的商品sku_id bytes字节类型, ....)
+
+        cart_dict = {}
+        for sku_id, count in redis_cart.items():
+            cart_dict[int(sku_id)] = {
+                'count': int(count),
+                'selected': sku_id in redis_cart_selected
+            }
+        return cart_dict
+
+    def get_selected(self):
+        script = self.redis_conn.register_script(GET_SELECTED_SCRIPT)
+        result = script(keys=[self.cart_key, self.selected_key])
+        return {int(result[i]): int(result[i + 1]) for i in range(0, len(result), 2)}
+
+    def add_many(self, items):
+        if not items:
+            return
+        pl = self.redis_conn.pipeline()
+        selected_sku_ids = []
+        for sku_id, item in items.items():
+            # 哈希的hincrby方法：若以前有就在原先基础上累加，若以前没有就添加
+            pl.hincrby(self.cart_key, sku_id, item['count'])
+            if item['selected']:
+                selected_sku_ids.append(sku_id)
+        if selected_sku_ids:
+            pl.sadd(self.selected_key, *selected_sku_ids)
+        pl.execute()
+
+    def set_many(self, items):
+        """
+        设置商品的数量和勾选状态, 以传入的数据为准, 用于登录时合并cookie购物车
+        :param items: {sku_id: {'count': 10, 'selected': True}, ...}
+        """
+        if not items:
+            return
+        selected_add = [sku_id for sku_id, item in items.items() if item['selected']]
+        selected_remove = [sku_id for sku_id, item in items.items() if not item['selected']]
+
+        pl = self.redis_conn.pipeline()
+        pl.hmset(self.cart_key, {sku_id: item['count'] for sku_id, item in items.items()})
+        # 设置set类型, 如果没有数据会报错,所以设置前需要判断
+        if selected_remove:
+            pl.srem(self.selected_key, *selected_remove)
+        if selected_add:
+            pl.sadd(self.selected_key, *selected_add)
+        pl.execute()
+
+    def update(self, sku_id, count, selected):
+        self.set_many({sku_id: {'count': count, 'selected': selected}})
+
+    def remove_many(self, sku_ids):
+        if not sku_ids:
+            return
+        pl = self.redis_conn.pipeline()
+        pl.hdel(self.cart_key, *sku_ids)
+        pl.srem(self.selected_key, *sku_ids)
+        pl.execute()
+
+    def select_all(self, selected):
+        script = self.redis_conn.register_script(SELECT_ALL_SCRIPT)
+        script(keys=[self.cart_key, self.selected_key], args=[1 if selected else 0])
+
+
+class CookieCartStore(CartStore):
+    """未登录用户的cookie购物车"""
+
+    def __init__(self, request):
+        self.cart_dict = decode_cart(request.COOKIES.get('cart'))
+        self.modified = False
+
+    def get_cart(self):
+        return self.cart_dict
+
+    def add_many(self, items):
+        for sku_id, item in items.items():
+            if sku_id in self.cart_dict:
+                # 如果商品存在购物车中，累加
+                self.cart_dict[sku_id]['count'] += item['count']
+                self.cart_dict[sku_id]['selected'] = item['selected']
+            else:
+                # 如果商品不在购物车中，设置
+                self.cart_dict[sku_id] = {
+                    'count': item['count'],
+                    'selected': item['selected']
+                }
+            self.modified = True
+
+    def update(self, sku_id, count, selected):
+        # 只修改购物车中已有的商品
+        if sku_id in self.cart_dict:
+            self.cart_dict[sku_id] = {
+                'count': count,
+                'selected': selected
+            }
+            self.modified = True
+
+    def remove_many(self, sku_ids):
+        for sku_id in sku_ids:
+            if sku_id in self.cart_dict:
+                del self.cart_dict[sku_id]
+                self.modified = True
+
+    def select_all(self, selected):
+        # 勾选状态都没有变化时不重写cookie
+        for count_selected_dict in self.cart_dict.values():
+            if count_selected_dict['selected'] != selected:
+                count_selected_dict['selected'] = selected
+                self.modified = True
+
+    def save(self, response):
+        if self.modified:
+            response.set_cookie('cart', encode_cart(self.cart_dict), max_age=constants.CART_COOKIE_EXPIRES)
+
+
+def get_cart_store(request):
+    """
+    根据用户登录状态获取购物车存储
+    视图需关闭perform_authentication, 由此处判断登录状态
+    """
+    try:
+        user = request.user   # 匿名用户 AnonymoseUser
+    except Exception:
+        user = None
+
+    if user and user.is_authenticated:
+        return RedisCartStore(user.id)
+    else:
+        return CookieCartStore(request)
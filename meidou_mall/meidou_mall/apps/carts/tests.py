@@ -1,3 +1,85 @@
-from django.test import TestCase
+import base64
+import pickle
+from collections import OrderedDict
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from carts import codec, constants
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _unb64(cookie):
+    return base64.urlsafe_b64decode(cookie + '=' * (-len(cookie) % 4))
+
+
+class CartCodecTest(SimpleTestCase):
+    """cookie购物车编解码"""
+
+    def test_round_trip(self):
+        cart_dict = {
+            1: {'count': 2, 'selected': True},
+            300: {'count': 1, 'selected': False},
+            100000: {'count': 129, 'selected': True},
+        }
+        self.assertEqual(codec.decode_cart(codec.encode_cart(cart_dict)), cart_dict)
+
+    def test_empty_cart(self):
+        self.assertEqual(codec.decode_cart(codec.encode_cart({})), {})
+        self.assertEqual(codec.decode_cart(''), {})
+        self.assertEqual(codec.decode_cart(None), {})
+
+    def test_tampered_cookie(self):
+        data = bytearray(_unb64(codec.encode_cart({10: {'count': 3, 'selected': True}})))
+        data[2] ^= 1
+        self.assertEqual(codec.decode_cart(_b64(bytes(data))), {})
+
+    def test_malformed_cookie(self):
+        for cookie in ('!!!', 'AQ', 'abc', _b64(b'\x02' + b'\0' * 20)):
+            self.assertEqual(codec.decode_cart(cookie), {})
+
+    def test_truncated_body(self):
+        # 签名正确但varint不完整
+        body = bytes([constants.CART_COOKIE_VERSION, 0x81])
+        self.assertEqual(codec.decode_cart(_b64(body + codec._sign(body))), {})
+
+
+class LegacyCartCookieTest(SimpleTestCase):
+    """旧的 base64(pickle) 格式cookie"""
+
+    def _legacy(self, data):
+        return base64.b64encode(pickle.dumps(data)).decode()
+
+    def test_legacy_cookie(self):
+        cart_dict = {1: {'count': 2, 'selected': True}, 5: {'count': 1, 'selected': False}}
+        self.assertEqual(codec.decode_cart(self._legacy(cart_dict)), cart_dict)
+
+    def test_legacy_cookie_disabled(self):
+        with mock.patch.object(constants, 'CART_COOKIE_ACCEPT_LEGACY', False):
+            self.assertEqual(codec.decode_cart(self._legacy({1: {'count': 2, 'selected': True}})), {})
+
+    def test_legacy_cookie_drops_malformed_entries(self):
+        cart_dict = {
+            1: {'count': 2, 'selected': True},
+            'x': {'count': 2, 'selected': True},
+            True: {'count': 2, 'selected': True},
+            0: {'count': 2, 'selected': True},
+            2: 'bad',
+            3: {'count': '2', 'selected': True},
+            4: {'count': 1},
+            5: {'count': True, 'selected': True},
+            6: {'count': 0, 'selected': True},
+            7: {'count': 1, 'selected': 1},
+        }
+        decoded = codec.decode_cart(self._legacy(cart_dict))
+        self.assertEqual(decoded, {1: {'count': 2, 'selected': True}})
+        # 过滤后可以正常编码
+        self.assertEqual(codec.decode_cart(codec.encode_cart(decoded)), decoded)
+
+    def test_legacy_cookie_rejects_non_dict_and_globals(self):
+        self.assertEqual(codec.decode_cart(self._legacy([1, 2])), {})
+        self.assertEqual(codec.decode_cart(self._legacy(OrderedDict([(1, {'count': 1, 'selected': True})]))), {})
+        self.assertEqual(codec.decode_cart('gA' + 'not pickle'), {})
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from contents.models import Content, ContentCategory
+from goods.static_pipeline import mark_dirty
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+@receiver(post_save, sender=ContentCategory)
+@receiver(post_delete, sender=ContentCategory)
+def mark_index_dirty(sender, **kwargs):
+    """广告内容修改后重新生成首页"""
+    mark_dirty(index=True)
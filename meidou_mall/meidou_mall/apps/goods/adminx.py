@@ -30,25 +30,7 @@ class SKUAdmin(object):
     list_editable = ['price', 'stock']
 
 
-class SKUSpecificationAdmin(object):
-    def save_models(self):
-        # 保存数据对象
-        obj = self.new_obj
-        obj.save()
-
-        # 补充自定义行为
-        from celery_tasks.html.tasks import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(obj.sku.id)
-
-    def delete_model(self):
-        # 删除数据对象
-        obj = self.obj
-        sku_id = obj.sku.id
-        obj.delete()
-
-        # 补充自定义行为
-        from celery_tasks.html.tasks import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(sku_id)
+# 商品修改后的静态详情页由goods.signals记录, 经goods.static_pipeline合并后生成
 
 
 xadmin.site.register(models.GoodsCategory)
@@ -56,7 +38,7 @@ xadmin.site.register(models.GoodsChannel)
 xadmin.site.register(models.Goods)
 xadmin.site.register(models.Brand)
 xadmin.site.register(models.GoodsSpecification)
-xadmin.site.register(models.SpecificationOption, SKUSpecificationAdmin)
+xadmin.site.register(models.SpecificationOption)
 xadmin.site.register(models.SKU, SKUAdmin)
 xadmin.site.register(models.SKUSpecification)
 xadmin.site.register(models.SKUImage)
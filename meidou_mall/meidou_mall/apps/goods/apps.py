@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class GoodsConfig(AppConfig):
     name = 'goods'
-    verbose_name = '商品管理'
\ No newline at end of file
+    verbose_name = '商品管理'
+
+    def ready(self):
+        # 注册信号处理函数
+        from goods import signals
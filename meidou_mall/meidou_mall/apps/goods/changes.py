@@ -0,0 +1,67 @@
+"""
+商品数据修改记录
+
+商品、SPU、品牌、分类修改后在redis中记录修改的对象和递增的序号, 进程内的索引(搜索建议、分类筛选)
+记住已应用的序号, 定期读取之后的修改记录, 只重新加载修改过的数据
+同一对象多次修改只保留最后一次的序号, 保留最近 CATALOG_CHANGE_LOG_SIZE 个序号的记录
+"""
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from goods import constants
+
+# 修改记录的类型
+CHANGE_KINDS = ('sku', 'goods', 'brand', 'category')
+
+# 原子地增加序号并写入修改记录, 保留序号在最近 ARGV[1] 个以内的记录
+# 一次写入多个对象时共用一个序号, 按序号而不是按数量删除, 与read_changes按序号差判断记录是否完整一致
+RECORD_CHANGES_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[2], seq, ARGV[i])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', seq - tonumber(ARGV[1]))
+return seq
+"""
+
+
+def record_changes(kind, ids):
+    """
+    记录修改, 在事务提交后写入, 避免其他进程读到修改前的数据
+    :param kind: 'sku', 'goods', 'brand', 'category'
+    :param ids: 修改的id
+    """
+    members = ['%s:%s' % (kind, object_id) for object_id in ids]
+    if not members:
+        return
+
+    def write():
+        redis_conn = get_redis_connection('default')
+        redis_conn.eval(RECORD_CHANGES_SCRIPT, 2, constants.CATALOG_CHANGE_SEQ_KEY, constants.CATALOG_CHANGE_LOG_KEY,
+                        constants.CATALOG_CHANGE_LOG_SIZE, *members)
+
+    transaction.on_commit(write)
+
+
+def get_current_seq():
+    """当前的修改序号"""
+    return int(get_redis_connection('default').get(constants.CATALOG_CHANGE_SEQ_KEY) or 0)
+
+
+def read_changes(last_seq):
+    """
+    读取序号 last_seq 之后的修改记录
+    :return: (当前序号, {类型: {id, ...}}), 修改记录不完整(落后太多)时修改为None
+    """
+    redis_conn = get_redis_connection('default')
+    seq = int(redis_conn.get(constants.CATALOG_CHANGE_SEQ_KEY) or 0)
+    if seq <= last_seq:
+        return seq, {}
+    if seq - last_seq > constants.CATALOG_CHANGE_LOG_SIZE:
+        return seq, None
+
+    changes = {kind: set() for kind in CHANGE_KINDS}
+    for member in redis_conn.zrangebyscore(constants.CATALOG_CHANGE_LOG_KEY, '(%d' % last_seq, seq):
+        kind, object_id = member.decode().split(':')
+        changes[kind].add(int(object_id))
+    return seq, changes
@@ -0,0 +1,131 @@
+# redis预扣库存: 商品在redis中的可售库存键
+STOCK_REDIS_KEY = 'stock_%s'
+
+# redis预扣库存: 已在redis中扣减、尚未同步到数据库的销量 hash {sku_id: count}
+STOCK_SOLD_DELTA_KEY = 'stock_sold_delta'
+
+# redis预扣库存: 正在同步到数据库的销量 hash, 同步失败时下次优先重试
+STOCK_SOLD_FLUSHING_KEY = 'stock_sold_flushing'
+
+# 每条同步语句更新的商品数量
+STOCK_FLUSH_BATCH_SIZE = 200
+
+# redis预扣库存: 同步销量与加载库存互斥的锁, 保证读取的数据库库存与待同步销量一致
+STOCK_FLUSH_LOCK_KEY = 'stock_flush_lock'
+
+# redis预扣库存: 锁的有效期(持有锁的进程异常退出时自动释放), 单位秒
+STOCK_FLUSH_LOCK_EXPIRES = 30
+
+# redis预扣库存: 等待锁的最长时间, 单位秒
+STOCK_FLUSH_LOCK_WAIT = 10
+
+# 商品摘要缓存: redis hash键
+SKU_SUMMARY_REDIS_KEY = 'sku_summary_%s'
+
+# 商品摘要缓存: redis中的有效期, 单位秒
+SKU_SUMMARY_REDIS_EXPIRES = 24 * 60 * 60
+
+# 商品摘要缓存: 进程内缓存的最大商品数量
+SKU_SUMMARY_LOCAL_MAX_SIZE = 10000
+
+# 商品摘要缓存: 进程内缓存的有效期, 单位秒, 其他进程修改商品后本进程最多延迟这么久看到新数据
+SKU_SUMMARY_LOCAL_EXPIRES = 10
+
+# 商品分类菜单缓存: 版本号键, 分类或频道修改后版本号加1
+CATEGORIES_VERSION_CACHE_KEY = 'categories_version'
+
+# 商品分类菜单缓存: 数据键
+CATEGORIES_CACHE_KEY = 'categories_%s'
+
+# 商品分类菜单缓存: 数据的有效期, 单位秒
+CATEGORIES_CACHE_EXPIRES = 24 * 60 * 60
+
+# 静态页面增量生成: 有修改的SKU set
+STATIC_DIRTY_SKUS_KEY = 'static_dirty_skus'
+
+# 静态页面增量生成: 有修改的SPU set, 其下所有SKU详情页都需要重新生成
+STATIC_DIRTY_SPUS_KEY = 'static_dirty_spus'
+
+# 静态页面增量生成: 需要重新生成全部详情页的标记(分类菜单修改)
+STATIC_DIRTY_ALL_KEY = 'static_dirty_all'
+
+# 静态页面增量生成: 需要重新生成首页的标记
+STATIC_DIRTY_INDEX_KEY = 'static_dirty_index'
+
+# 静态页面增量生成: 已安排生成任务的标记, 防抖期内的修改合并到同一个任务
+STATIC_REBUILD_SCHEDULED_KEY = 'static_rebuild_scheduled'
+
+# 静态页面增量生成: 防抖时间, 单位秒, 第一次修改后等待这么久再生成
+STATIC_REBUILD_DEBOUNCE = 10
+
+# 静态页面增量生成: 生成任务标记的有效期, 任务丢失时过期后可以重新安排
+STATIC_REBUILD_SCHEDULED_EXPIRES = 5 * 60
+
+# SPU规格矩阵缓存键
+SPEC_MATRIX_CACHE_KEY = 'spec_matrix_%s'
+
+# SPU规格矩阵缓存有效期, 单位秒
+SPEC_MATRIX_CACHE_EXPIRES = 60 * 60
+
+# 分类商品列表索引: 每个分类每种排序一个 redis zset, 键为 (分类id, 排序字段)
+SKU_LIST_INDEX_KEY = 'sku_list_%s_%s'
+
+# 分类商品列表索引: 已建立索引的标记, 没有标记时从数据库建立
+SKU_LIST_READY_KEY = 'sku_list_ready_%s'
+
+# 分类商品列表索引: 建立索引的锁, 同一分类只有一个请求从数据库建立
+SKU_LIST_BUILD_LOCK_KEY = 'sku_list_lock_%s'
+
+# 分类商品列表索引: 商品所在分类 hash {sku_id: category_id}, 商品修改分类时从原分类索引中删除
+SKU_LIST_SKU_CATEGORY_KEY = 'sku_list_sku_category'
+
+# 分类商品列表索引: 有效期, 单位秒, 过期后从数据库重新建立以修正偏差
+SKU_LIST_INDEX_EXPIRES = 60 * 60
+
+# 分类商品列表索引: 建立索引的锁的有效期, 单位秒
+SKU_LIST_BUILD_LOCK_EXPIRES = 30
+
+# 搜索结果缓存: 版本号键, 索引更新后版本号加1
+SEARCH_CACHE_VERSION_KEY = 'sku_search_version'
+
+# 搜索结果缓存: 数据键 (版本号, 查询内容的哈希)
+SEARCH_CACHE_KEY = 'sku_search_%s_%s'
+
+# 搜索结果缓存: 有效期, 单位秒
+SEARCH_CACHE_EXPIRES = 30
+
+# 搜索耗时: 每类查询最近的耗时 redis list, 单位毫秒
+SEARCH_LATENCY_KEY = 'sku_search_latency_%s'
+
+# 搜索耗时: 每类查询保留的耗时数量
+SEARCH_LATENCY_SAMPLES = 1000
+
+# 商品数据修改记录: 序号键, 每次修改加1
+CATALOG_CHANGE_SEQ_KEY = 'catalog_change_seq'
+
+# 商品数据修改记录: zset, 成员为 'sku:1', 'goods:1', 'brand:1', 'category:1', 分数为修改序号
+CATALOG_CHANGE_LOG_KEY = 'catalog_change_log'
+
+# 商品数据修改记录: 保留的序号数量, 进程落后更多时重新加载全部数据
+CATALOG_CHANGE_LOG_SIZE = 10000
+
+# 搜索建议: 进程检查修改记录的间隔, 单位秒
+SUGGEST_CHECK_INTERVAL = 5
+
+# 搜索建议: 进程重新建立索引的间隔(同步销量排序), 单位秒
+SUGGEST_REBUILD_INTERVAL = 60 * 60
+
+# 搜索建议: 前缀树的最大深度, 更长的输入在该深度的节点上逐个匹配
+SUGGEST_MAX_PREFIX_LENGTH = 12
+
+# 搜索建议: 每个节点保存的建议数量, 也是接口返回的最大数量
+SUGGEST_TOP_K = 10
+
+# 分类筛选: 进程检查商品数据修改记录的间隔, 单位秒
+FACET_CHECK_INTERVAL = 5
+
+# 分类筛选: 进程重新建立分类筛选数据的间隔(重新划分价格区间), 单位秒
+FACET_REBUILD_INTERVAL = 60 * 60
+
+# 分类筛选: 价格区间数量
+FACET_PRICE_BUCKETS = 5
@@ -0,0 +1,371 @@
+"""
+分类商品筛选
+
+每个进程为访问过的三级分类在内存中保存筛选数据: 分类的上架商品按顺序编号, 每个品牌、规格选项、价格区间
+用一个python整数作为位图记录包含的商品
+- 同一组(品牌/价格/同名规格)内的选项取并集, 不同组之间取交集, 一次位运算得到筛选结果
+- 每个选项的数量为 (其他组的筛选结果 & 选项位图) 中1的个数, 与筛选结果在同一次请求中返回
+- 不同SPU的规格相互独立, 按规格名称和选项值合并(如各SPU的 "颜色: 金色")
+- 价格区间在建立时按分类商品价格的分位数划分
+- 商品数据修改后通过修改记录(goods.changes)逐个商品更新位图, 每隔 FACET_REBUILD_INTERVAL 秒重新建立
+"""
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.db.models import Q
+
+from goods import constants
+from goods.changes import get_current_seq, read_changes
+from goods.models import SKU, Brand, SKUSpecification
+from meidou_mall.utils.db_router import use_primary
+
+# 筛选参数
+BRAND_PARAM = 'brand'
+PRICE_PARAM = 'price'
+SPEC_PARAM = 'spec'
+FACETS_PARAM = 'facets'
+
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+
+def _iter_positions(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _round_down(value):
+    """保留两位有效数字, 如 1234 -> 1200"""
+    value = int(value)
+    unit = 10 ** max(len(str(value)) - 2, 0)
+    return value - value % unit
+
+
+def _price_bounds(prices):
+    """按分位数划分价格区间, 返回各区间的下限"""
+    prices = sorted(prices)
+    count = constants.FACET_PRICE_BUCKETS
+    bounds = {_round_down(prices[len(prices) * i // count]) for i in range(1, count)} if prices else set()
+    return [0] + sorted(bound for bound in bounds if bound > 0)
+
+
+class CategoryFacets(object):
+    """一个三级分类的筛选数据"""
+
+    def __init__(self, category_id, price_bounds):
+        self.category_id = category_id
+        self.price_bounds = price_bounds
+        # 商品编号 {sku_id: 编号}, 删除商品的编号留给新商品使用
+        self.positions = {}
+        self.free_positions = []
+        self.sku_ids = []
+        self.all_bits = 0
+        # 位图 {brand_id: bits}, {区间下标: bits}, {规格名称: {选项值: bits}}
+        self.brands = {}
+        self.prices = {}
+        self.specs = {}
+        self.brand_names = {}
+        # 商品所在的位图, 用于删除 {sku_id: (brand_id, 区间下标, ((规格名称, 选项值), ...))}
+        self.sku_facets = {}
+
+    @classmethod
+    def build(cls, category_id):
+        """从数据库建立, 固定查询3次数据库"""
+        rows = list(SKU.objects.filter(category_id=category_id, is_launched=True).order_by('id').values_list(
+            'id', 'price', 'goods__brand_id'))
+        options = {}
+        for sku_id, spec_name, value in SKUSpecification.objects.filter(
+                sku__category_id=category_id, sku__is_launched=True).values_list(
+                'sku_id', 'spec__name', 'option__value'):
+            options.setdefault(sku_id, []).append((spec_name, value))
+
+        facets = cls(category_id, _price_bounds(row[1] for row in rows))
+        facets.brand_names = dict(Brand.objects.filter(id__in={row[2] for row in rows}).values_list('id', 'name'))
+        for sku_id, price, brand_id in rows:
+            facets.add_sku(sku_id, price, brand_id, options.get(sku_id, ()))
+        return facets
+
+    def price_label(self, index):
+        lower = self.price_bounds[index]
+        if index + 1 < len(self.price_bounds):
+            return '%s-%s' % (lower, self.price_bounds[index + 1])
+        return '%s-' % lower
+
+    def add_sku(self, sku_id, price, brand_id, options):
+        """
+        :param options: 商品的规格 [(规格名称, 选项值), ...]
+        """
+        self.remove_sku(sku_id)
+        if self.free_positions:
+            position = self.free_positions.pop()
+            self.sku_ids[position] = sku_id
+        else:
+            position = len(self.sku_ids)
+            self.sku_ids.append(sku_id)
+        self.positions[sku_id] = position
+        bit = 1 << position
+
+        price_index = bisect_right(self.price_bounds, price) - 1
+        options = tuple(options)
+        self.all_bits |= bit
+        self.brands[brand_id] = self.brands.get(brand_id, 0) | bit
+        self.prices[price_index] = self.prices.get(price_index, 0) | bit
+        for spec_name, value in options:
+            values = self.specs.setdefault(spec_name, {})
+            values[value] = values.get(value, 0) | bit
+        self.sku_facets[sku_id] = (brand_id, price_index, options)
+
+    def _clear_bit(self, bitmaps, key, mask):
+        bits = bitmaps.get(key, 0) & mask
+        if bits:
+            bitmaps[key] = bits
+        else:
+            bitmaps.pop(key, None)
+
+    def remove_sku(self, sku_id):
+        position = self.positions.pop(sku_id, None)
+        if position is None:
+            return
+        brand_id, price_index, options = self.sku_facets.pop(sku_id)
+        mask = ~(1 << position)
+
+        self.all_bits &= mask
+        self._clear_bit(self.brands, brand_id, mask)
+        self._clear_bit(self.prices, price_index, mask)
+        for spec_name, value in options:
+            values = self.specs[spec_name]
+            self._clear_bit(values, value, mask)
+            if not values:
+                del self.specs[spec_name]
+        self.sku_ids[position] = None
+        self.free_positions.append(position)
+
+    def query(self, filters):
+        """
+        :param filters: parse_filters的返回值
+        :return: (符合条件的sku_id列表, 各选项的数量)
+        """
+        # 每组筛选条件的位图 {组: bits}
+        groups = OrderedDict()
+        if filters['brand']:
+            groups['brand'] = self._union(self.brands.get(brand_id, 0) for brand_id in filters['brand'])
+        if filters['price']:
+            labels = filters['price']
+            groups['price'] = self._union(bits for index, bits in self.prices.items()
+                                          if self.price_label(index) in labels)
+        for spec_name, values in filters['spec'].items():
+            spec_values = self.specs.get(spec_name, {})
+            groups[('spec', spec_name)] = self._union(spec_values.get(value, 0) for value in values)
+
+        def base_bits(exclude):
+            bits = self.all_bits
+            for group, group_bits in groups.items():
+                if group != exclude:
+                    bits &= group_bits
+            return bits
+
+        matched = base_bits(None)
+        sku_ids = [self.sku_ids[position] for position in _iter_positions(matched)]
+
+        bits = base_bits('brand')
+        brands = [{
+            'id': brand_id,
+            'name': self.brand_names.get(brand_id, ''),
+            'count': _popcount(bits & brand_bits),
+            'selected': brand_id in filters['brand'],
+        } for brand_id, brand_bits in self.brands.items()]
+        brands.sort(key=lambda item: (-item['count'], item['id']))
+
+        bits = base_bits('price')
+        prices = [{
+            'value': self.price_label(index),
+            'count': _popcount(bits & self.prices.get(index, 0)),
+            'selected': self.price_label(index) in filters['price'],
+        } for index in range(len(self.price_bounds))]
+
+        specs = []
+        for spec_name in sorted(self.specs):
+            bits = base_bits(('spec', spec_name))
+            selected = filters['spec'].get(spec_name, ())
+            specs.append({
+                'name': spec_name,
+                'options': [{
+                    'value': value,
+                    'count': _popcount(bits & value_bits),
+                    'selected': value in selected,
+                } for value, value_bits in sorted(self.specs[spec_name].items())]
+            })
+
+        return sku_ids, OrderedDict([('brand', brands), ('price', prices), ('specs', specs)])
+
+    @staticmethod
+    def _union(bitmaps):
+        bits = 0
+        for bitmap in bitmaps:
+            bits |= bitmap
+        return bits
+
+
+def parse_filters(query_params):
+    """
+    解析筛选参数: ?brand=1,2&price=1000-2000,2000-5000&spec=颜色:金色&spec=内存:64GB
+    同一参数的多个值取并集, 不同参数(不同规格名称)取交集; 只要求返回各选项数量时使用 ?facets=1
+    :return: {'brand': {brand_id, ...}, 'price': {区间, ...}, 'spec': {规格名称: {选项值, ...}}}, 没有筛选参数时返回None
+    """
+    if not any(param in query_params for param in (BRAND_PARAM, PRICE_PARAM, SPEC_PARAM, FACETS_PARAM)):
+        return None
+
+    filters = {'brand': set(), 'price': set(), 'spec': {}}
+    for value in query_params.get(BRAND_PARAM, '').split(','):
+        if value.strip().isdigit():
+            filters['brand'].add(int(value))
+    filters['price'] = {value.strip() for value in query_params.get(PRICE_PARAM, '').split(',') if value.strip()}
+    for item in query_params.getlist(SPEC_PARAM):
+        spec_name, sep, value = item.partition(':')
+        if sep and spec_name and value:
+            filters['spec'].setdefault(spec_name, set()).add(value)
+    return filters
+
+
+# 进程内的分类筛选数据 {category_id: (CategoryFacets, 建立时间)}
+_categories = {}
+# (已应用的修改序号, 下次检查修改记录的时间)
+_changes_memo = (0, 0)
+# 是否有线程正在检查修改记录
+_checking = False
+# 正在建立的分类 {category_id: 建立完成时set的Event}
+_building = {}
+_lock = threading.Lock()
+
+
+def _load_changes(changes):
+    """
+    在_lock之外从主库读取修改过的商品
+    :return: (需要删除的sku_id集合, 上架商品 {sku_id: (category_id, price, brand_id)}, 商品规格 {sku_id: [...]},
+              品牌名称 {brand_id: name})
+    """
+    sku_ids = set(changes['sku'])
+    with use_primary():
+        rows = SKU.objects.filter(Q(id__in=changes['sku']) | Q(goods_id__in=changes['goods'])).values_list(
+            'id', 'category_id', 'is_launched', 'price', 'goods__brand_id')
+        added = {}
+        for sku_id, category_id, is_launched, price, brand_id in rows:
+            sku_ids.add(sku_id)
+            if is_launched:
+                added[sku_id] = (category_id, price, brand_id)
+
+        options = {}
+        for sku_id, spec_name, value in SKUSpecification.objects.filter(sku_id__in=added).values_list(
+                'sku_id', 'spec__name', 'option__value'):
+            options.setdefault(sku_id, []).append((spec_name, value))
+
+        brand_ids = set(changes['brand'])
+        brand_ids.update(row[2] for row in added.values())
+        brand_names = dict(Brand.objects.filter(id__in=brand_ids).values_list('id', 'name')) if brand_ids else {}
+    return sku_ids, added, options, brand_names
+
+
+def _apply_changes(changes, loaded, categories):
+    """
+    按修改记录更新分类筛选数据, 只修改内存中的位图, 需要持有_lock
+    :param loaded: _load_changes的返回值
+    :param categories: 需要更新的分类 {category_id: CategoryFacets}
+    """
+    sku_ids, added, options, brand_names = loaded
+    for facets in categories.values():
+        for sku_id in sku_ids:
+            facets.remove_sku(sku_id)
+        for brand_id in changes['brand']:
+            if brand_id in brand_names:
+                facets.brand_names[brand_id] = brand_names[brand_id]
+            else:
+                facets.brand_names.pop(brand_id, None)
+
+    for sku_id, (category_id, price, brand_id) in added.items():
+        facets = categories.get(category_id)
+        if facets is not None:
+            facets.add_sku(sku_id, price, brand_id, options.get(sku_id, ()))
+            if brand_id in brand_names:
+                facets.brand_names[brand_id] = brand_names[brand_id]
+
+
+def _check_changes(now):
+    """应用新的修改记录, 由一个请求在_lock之外读取数据库, 其他请求继续使用当前的数据"""
+    global _changes_memo, _checking
+
+    with _lock:
+        last_seq, check_at = _changes_memo
+        if now < check_at or _checking:
+            return
+        _checking = True
+
+    try:
+        seq, changes = read_changes(last_seq)
+        loaded = _load_changes(changes) if changes else None
+        with _lock:
+            if changes is None:
+                _categories.clear()
+            elif changes:
+                # 读取期间新放入的分类也要更新, 它们已应用到不小于last_seq的修改, 重复应用同一个修改没有影响
+                _apply_changes(changes, loaded, {category_id: item[0] for category_id, item in _categories.items()})
+            _changes_memo = (seq, now + constants.FACET_CHECK_INTERVAL)
+    finally:
+        with _lock:
+            _checking = False
+
+
+def _build(category_id, now):
+    """在_lock之外建立分类的筛选数据, 建立期间的修改在放入_categories前补上"""
+    start_seq = get_current_seq()
+    # 修改记录的序号已推进, 从库的旧数据会让这些修改一直缺失到下次重新建立
+    with use_primary():
+        facets = CategoryFacets.build(category_id)
+
+    while True:
+        seq, changes = read_changes(start_seq)
+        loaded = _load_changes(changes) if changes else None
+        with _lock:
+            # 读取期间其他请求已应用了更新的修改记录, 重新读取, 避免放入后缺少这部分修改
+            if _changes_memo[0] <= seq:
+                if changes:
+                    _apply_changes(changes, loaded, {category_id: facets})
+                _categories[category_id] = (facets, now)
+                return facets
+
+
+def query_category(category_id, filters):
+    """
+    筛选分类的上架商品
+    分类第一次使用时由一个请求建立, 其他请求等待建立完成; 需要重新建立时由一个请求建立, 其他请求继续使用旧的数据
+    :return: (符合条件的sku_id列表, 各选项的数量)
+    """
+    now = time.time()
+    _check_changes(now)
+
+    while True:
+        with _lock:
+            facets, built_at = _categories.get(category_id, (None, 0))
+            event = _building.get(category_id)
+            rebuild = event is None and (facets is None or now - built_at > constants.FACET_REBUILD_INTERVAL)
+            if rebuild:
+                event = _building[category_id] = threading.Event()
+            elif facets is not None:
+                return facets.query(filters)
+
+        if rebuild:
+            try:
+                facets = _build(category_id, now)
+            finally:
+                with _lock:
+                    del _building[category_id]
+                event.set()
+            with _lock:
+                return facets.query(filters)
+
+        # 其他请求正在第一次建立, 等待完成; 建立失败时由一个等待的请求重新建立
+        event.wait()
@@ -0,0 +1,268 @@
+"""
+redis预扣库存
+
+开启 settings.STOCK_REDIS_PREDECREMENT 后, 已镜像到redis的商品下单时由lua脚本在redis中原子地检查并扣减库存,
+扣减的数量累加到待同步销量hash中, 再由celery定时任务批量同步到tb_sku
+对于镜像的商品: 数据库库存 - 待同步销量 == redis库存
+"""
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from django_redis import get_redis_connection
+
+from goods import changes, constants
+from goods.models import SKU
+from meidou_mall.utils.db_router import use_primary
+
+logger = logging.getLogger('django')
+
+
+# KEYS[1]: 待同步销量hash, KEYS[2...]: 各商品的redis库存键
+# ARGV: sku_id_1, count_1, sku_id_2, count_2 ...
+# 返回 {-1, 库存不足商品的sku_id} 或 {0, 已在redis中扣减的sku_id...}, 未镜像的商品不处理
+RESERVE_SCRIPT = """
+for i = 2, #KEYS do
+    local stock = redis.call('GET', KEYS[i])
+    if stock and tonumber(stock) < tonumber(ARGV[2 * i - 2]) then
+        return {-1, ARGV[2 * i - 3]}
+    end
+end
+local mirrored = {0}
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('DECRBY', KEYS[i], ARGV[2 * i - 2])
+        redis.call('HINCRBY', KEYS[1], ARGV[2 * i - 3], ARGV[2 * i - 2])
+        table.insert(mirrored, ARGV[2 * i - 3])
+    end
+end
+return mirrored
+"""
+
+# 撤销预扣, 参数同RESERVE_SCRIPT
+# 若预扣的销量已经同步到数据库, 待同步销量变为负数, 下次同步时会把库存还给数据库
+RELEASE_SCRIPT = """
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('INCRBY', KEYS[i], ARGV[2 * i - 2])
+        redis.call('HINCRBY', KEYS[1], ARGV[2 * i - 3], -ARGV[2 * i - 2])
+    end
+end
+return 0
+"""
+
+# KEYS[1]: 待同步销量hash, KEYS[2]: 正在同步的销量hash
+# 上次同步未完成时继续同步上次的数据, 否则取出当前全部待同步销量
+TAKE_DELTA_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS[1]: 待同步销量hash, KEYS[2]: 正在同步的销量hash, KEYS[3...]: 各商品的redis库存键
+# ARGV: sku_id_1, db_stock_1, sku_id_2, db_stock_2 ...
+# redis库存 = 数据库库存 - 尚未同步的销量
+LOAD_SCRIPT = """
+for i = 3, #KEYS do
+    local sku_id = ARGV[2 * i - 5]
+    local pending = tonumber(redis.call('HGET', KEYS[1], sku_id) or 0) + tonumber(redis.call('HGET', KEYS[2], sku_id) or 0)
+    redis.call('SET', KEYS[i], tonumber(ARGV[2 * i - 4]) - pending)
+end
+return 0
+"""
+
+# KEYS[1]: 锁, ARGV[1]: 加锁时的标识, 只释放自己持有的锁
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _get_redis_conn():
+    return get_redis_connection('default')
+
+
+@contextmanager
+def _flush_lock(redis_conn):
+    """
+    同步销量与加载库存互斥
+    同步时数据库提交与移除正在同步的销量不是原子的, 加载库存若在两者之间读取数据库库存,
+    计算的redis库存会多减或少减这一批销量
+    """
+    token = uuid.uuid4().hex
+    deadline = time.time() + constants.STOCK_FLUSH_LOCK_WAIT
+    while not redis_conn.set(constants.STOCK_FLUSH_LOCK_KEY, token, ex=constants.STOCK_FLUSH_LOCK_EXPIRES, nx=True):
+        if time.time() > deadline:
+            raise RuntimeError('等待库存同步锁超时')
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        redis_conn.eval(UNLOCK_SCRIPT, 1, constants.STOCK_FLUSH_LOCK_KEY, token)
+
+
+def _script_args(cart):
+    """
+    构造脚本参数
+    :param cart: {sku_id: count}
+    :return: keys, args
+    """
+    keys = [constants.STOCK_SOLD_DELTA_KEY]
+    args = []
+    for sku_id, count in cart.items():
+        keys.append(constants.STOCK_REDIS_KEY % sku_id)
+        args.extend([sku_id, count])
+    return keys, args
+
+
+def reserve_stock(cart):
+    """
+    在redis中预扣订单商品的库存
+    :param cart: {sku_id: count}
+    :return: (已在redis中扣减的商品 {sku_id: count}, None), 未镜像到redis的商品需要由调用者扣减数据库库存
+             有商品库存不足时不扣减任何商品, 返回 (None, 库存不足商品的sku_id)
+    """
+    redis_conn = _get_redis_conn()
+    keys, args = _script_args(cart)
+    result = redis_conn.eval(RESERVE_SCRIPT, len(keys), *(keys + args))
+
+    if int(result[0]) < 0:
+        return None, int(result[1])
+
+    return {int(sku_id): cart[int(sku_id)] for sku_id in result[1:]}, None
+
+
+def release_stock(cart):
+    """
+    撤销预扣的库存, 用于预扣后订单保存失败
+    :param cart: reserve_stock返回的已扣减商品 {sku_id: count}
+    """
+    if not cart:
+        return
+    redis_conn = _get_redis_conn()
+    keys, args = _script_args(cart)
+    redis_conn.eval(RELEASE_SCRIPT, len(keys), *(keys + args))
+
+
+def load_stock(sku_ids=None):
+    """
+    把上架商品的数据库库存镜像到redis, 已镜像的商品按数据库库存重新校准
+    调整数据库库存(如补货)后需要重新调用
+    :param sku_ids: 需要镜像的商品, 默认全部上架商品
+    :return: 镜像的商品数量
+    """
+    queryset = SKU.objects.filter(is_launched=True)
+    if sku_ids is not None:
+        queryset = queryset.filter(id__in=sku_ids)
+    # 从库的库存可能是旧数据
+    with use_primary():
+        sku_id_list = list(queryset.values_list('id', flat=True))
+
+    redis_conn = _get_redis_conn()
+    for start in range(0, len(sku_id_list), constants.STOCK_FLUSH_BATCH_SIZE):
+        batch = sku_id_list[start:start + constants.STOCK_FLUSH_BATCH_SIZE]
+        # 读取数据库库存和执行脚本之间不能有销量同步
+        with _flush_lock(redis_conn), use_primary():
+            stock_dict = dict(SKU.objects.filter(id__in=batch).values_list('id', 'stock'))
+            keys = [constants.STOCK_SOLD_DELTA_KEY, constants.STOCK_SOLD_FLUSHING_KEY]
+            args = []
+            for sku_id in batch:
+                if sku_id in stock_dict:
+                    keys.append(constants.STOCK_REDIS_KEY % sku_id)
+                    args.extend([sku_id, stock_dict[sku_id]])
+            if args:
+                redis_conn.eval(LOAD_SCRIPT, len(keys), *(keys + args))
+
+    return len(sku_id_list)
+
+
+def unload_stock(sku_ids):
+    """取消商品的redis镜像, 之后这些商品直接扣减数据库库存(需先同步完待同步销量)"""
+    if not sku_ids:
+        return
+    redis_conn = _get_redis_conn()
+    redis_conn.delete(*[constants.STOCK_REDIS_KEY % sku_id for sku_id in sku_ids])
+
+
+def flush_sold_delta():
+    """
+    把redis中累计的销量批量同步到数据库: 库存减少, 销量增加
+    :return: 同步的商品数量
+    """
+    redis_conn = _get_redis_conn()
+    flat = redis_conn.eval(TAKE_DELTA_SCRIPT, 2, constants.STOCK_SOLD_DELTA_KEY, constants.STOCK_SOLD_FLUSHING_KEY)
+    delta = {}
+    for i in range(0, len(flat), 2):
+        count = int(flat[i + 1])
+        if count:
+            delta[int(flat[i])] = count
+
+    sku_id_list = list(delta.keys())
+    for start in range(0, len(sku_id_list), constants.STOCK_FLUSH_BATCH_SIZE):
+        batch = sku_id_list[start:start + constants.STOCK_FLUSH_BATCH_SIZE]
+        # 提交和移除之间不能加载库存
+        with _flush_lock(redis_conn):
+            with transaction.atomic():
+                SKU.objects.filter(id__in=batch).update(
+                    stock=Case(*[When(id=sku_id, then=F('stock') - delta[sku_id]) for sku_id in batch],
+                               output_field=IntegerField()),
+                    sales=Case(*[When(id=sku_id, then=F('sales') + delta[sku_id]) for sku_id in batch],
+                               output_field=IntegerField()),
+                )
+            # 每批提交后立即移除, 同步中途失败时只会重试未提交的批次
+            redis_conn.hdel(constants.STOCK_SOLD_FLUSHING_KEY, *batch)
+        # 搜索建议等进程内索引按销量排序
+        changes.record_changes('sku', batch)
+
+    redis_conn.delete(constants.STOCK_SOLD_FLUSHING_KEY)
+    return len(sku_id_list)
+
+
+def check_stock_drift(sku_ids=None):
+    """
+    比对redis库存与数据库库存
+    :param sku_ids: 需要比对的商品, 默认全部已镜像的上架商品
+    :return: 不一致的商品 [{'sku_id':, 'db_stock':, 'redis_stock':, 'pending':}, ...]
+    """
+    queryset = SKU.objects.filter(is_launched=True)
+    if sku_ids is not None:
+        queryset = queryset.filter(id__in=sku_ids)
+    # 从库的库存可能是旧数据
+    with use_primary():
+        stock_dict = dict(queryset.values_list('id', 'stock'))
+    sku_id_list = list(stock_dict.keys())
+    if not sku_id_list:
+        return []
+
+    redis_conn = _get_redis_conn()
+    pl = redis_conn.pipeline()
+    pl.hgetall(constants.STOCK_SOLD_DELTA_KEY)
+    pl.hgetall(constants.STOCK_SOLD_FLUSHING_KEY)
+    pl.mget([constants.STOCK_REDIS_KEY % sku_id for sku_id in sku_id_list])
+    delta_dict, flushing_dict, redis_stock_list = pl.execute()
+
+    drift = []
+    for sku_id, redis_stock in zip(sku_id_list, redis_stock_list):
+        if redis_stock is None:
+            # 未镜像
+            continue
+        field = str(sku_id).encode()
+        pending = int(delta_dict.get(field, 0)) + int(flushing_dict.get(field, 0))
+        if stock_dict[sku_id] - pending != int(redis_stock):
+            drift.append({
+                'sku_id': sku_id,
+                'db_stock': stock_dict[sku_id],
+                'redis_stock': int(redis_stock),
+                'pending': pending,
+            })
+
+    return drift
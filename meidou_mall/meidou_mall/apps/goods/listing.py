@@ -0,0 +1,158 @@
+"""
+分类商品列表索引
+
+每个分类为每种排序字段(create_time, price, sales)维护一个redis zset, 成员为上架商品的sku_id,
+分数为排序字段的值. 列表第N页为一次 ZRANGE/ZREVRANGE 加上一次商品摘要批量查询, 总数为 ZCARD,
+不需要 COUNT 和 OFFSET 查询. 商品保存/删除的事务提交后通过信号更新索引, 下单时增加销量分数
+索引不存在(冷启动或过期)时由一个请求从数据库建立, 其他请求在建立完成前查询数据库
+"""
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU
+from goods.summary import get_sku_summaries
+from meidou_mall.utils.db_router import use_primary
+
+# 索引支持的排序字段
+INDEX_FIELDS = ('create_time', 'price', 'sales')
+
+
+def _score(field, value):
+    if field == 'create_time':
+        return value.timestamp()
+    return float(value)
+
+
+def _zadd(pl, key, score_members):
+    # 直接使用ZADD命令, 兼容不同版本redis-py的zadd参数
+    args = []
+    for member, score in score_members:
+        args.extend((score, member))
+    if args:
+        pl.execute_command('ZADD', key, *args)
+
+
+def build_category_index(category_id, redis_conn=None):
+    """从数据库建立分类的列表索引, 固定查询1次数据库, 读主库以免丢失刚提交的修改"""
+    redis_conn = redis_conn or get_redis_connection('default')
+    with use_primary():
+        rows = list(SKU.objects.filter(category_id=category_id, is_launched=True).values_list('id', *INDEX_FIELDS))
+
+    pl = redis_conn.pipeline()
+    keys = [constants.SKU_LIST_INDEX_KEY % (category_id, field) for field in INDEX_FIELDS]
+    pl.delete(*keys)
+    for index, key in enumerate(keys):
+        field = INDEX_FIELDS[index]
+        _zadd(pl, key, [(row[0], _score(field, row[index + 1])) for row in rows])
+        pl.expire(key, constants.SKU_LIST_INDEX_EXPIRES * 2)
+    if rows:
+        pl.hmset(constants.SKU_LIST_SKU_CATEGORY_KEY, {row[0]: category_id for row in rows})
+    pl.set(constants.SKU_LIST_READY_KEY % category_id, 1, ex=constants.SKU_LIST_INDEX_EXPIRES)
+    pl.execute()
+
+
+def _ensure_index(category_id, redis_conn):
+    """
+    确保分类索引可用
+    :return: 索引是否可用, 其他请求正在建立索引时返回False
+    """
+    if redis_conn.exists(constants.SKU_LIST_READY_KEY % category_id):
+        return True
+
+    lock_key = constants.SKU_LIST_BUILD_LOCK_KEY % category_id
+    if not redis_conn.set(lock_key, 1, ex=constants.SKU_LIST_BUILD_LOCK_EXPIRES, nx=True):
+        return False
+    try:
+        build_category_index(category_id, redis_conn)
+    finally:
+        redis_conn.delete(lock_key)
+    return True
+
+
+def get_category_page(category_id, ordering, page, page_size):
+    """
+    从索引查询分类商品列表的一页
+    :param category_id: 三级分类id
+    :param ordering: 排序, 如 'price', '-sales'
+    :param page: 页码, 从1开始
+    :param page_size: 每页数量
+    :return: (总数, [商品摘要, ...]), 不支持的排序或索引不可用时返回None, 由调用者查询数据库
+    """
+    field = ordering.lstrip('-') if ordering else None
+    if field not in INDEX_FIELDS:
+        return None
+
+    redis_conn = get_redis_connection('default')
+    if not _ensure_index(category_id, redis_conn):
+        return None
+
+    key = constants.SKU_LIST_INDEX_KEY % (category_id, field)
+    start = (page - 1) * page_size
+    end = start + page_size - 1
+    pl = redis_conn.pipeline()
+    pl.zcard(key)
+    if ordering.startswith('-'):
+        pl.zrevrange(key, start, end)
+    else:
+        pl.zrange(key, start, end)
+    total, sku_ids = pl.execute()
+
+    sku_ids = [int(sku_id) for sku_id in sku_ids]
+    summaries = get_sku_summaries(sku_ids)
+    return total, [summaries[sku_id] for sku_id in sku_ids if sku_id in summaries]
+
+
+def update_sku_index(sku):
+    """
+    商品保存的事务提交后更新其所在分类的索引, 未建立索引的分类不处理
+    :return: 商品修改了分类时返回原分类id, 否则返回None
+    """
+    redis_conn = get_redis_connection('default')
+    old_category_id = redis_conn.hget(constants.SKU_LIST_SKU_CATEGORY_KEY, sku.id)
+
+    if old_category_id is not None:
+        old_category_id = int(old_category_id)
+        if old_category_id == sku.category_id:
+            old_category_id = None
+
+    pl = redis_conn.pipeline()
+    if old_category_id is not None:
+        for field in INDEX_FIELDS:
+            pl.zrem(constants.SKU_LIST_INDEX_KEY % (old_category_id, field), sku.id)
+
+    if sku.is_launched and redis_conn.exists(constants.SKU_LIST_READY_KEY % sku.category_id):
+        for field in INDEX_FIELDS:
+            key = constants.SKU_LIST_INDEX_KEY % (sku.category_id, field)
+            _zadd(pl, key, [(sku.id, _score(field, getattr(sku, field)))])
+        pl.hset(constants.SKU_LIST_SKU_CATEGORY_KEY, sku.id, sku.category_id)
+    else:
+        for field in INDEX_FIELDS:
+            pl.zrem(constants.SKU_LIST_INDEX_KEY % (sku.category_id, field), sku.id)
+        pl.hdel(constants.SKU_LIST_SKU_CATEGORY_KEY, sku.id)
+    pl.execute()
+
+    return old_category_id
+
+
+def remove_sku_index(sku):
+    """商品删除的事务提交后从索引中删除"""
+    redis_conn = get_redis_connection('default')
+    pl = redis_conn.pipeline()
+    for field in INDEX_FIELDS:
+        pl.zrem(constants.SKU_LIST_INDEX_KEY % (sku.category_id, field), sku.id)
+    pl.hdel(constants.SKU_LIST_SKU_CATEGORY_KEY, sku.id)
+    pl.execute()
+
+
+def incr_sales_index(sku_counts):
+    """
+    下单后增加商品在销量索引中的分数
+    :param sku_counts: {sku对象: 数量}
+    """
+    redis_conn = get_redis_connection('default')
+    pl = redis_conn.pipeline()
+    for sku, count in sku_counts.items():
+        key = constants.SKU_LIST_INDEX_KEY % (sku.category_id, 'sales')
+        # 只更新已在索引中的商品, 避免在未建立的索引中留下不完整的数据
+        pl.execute_command('ZADD', key, 'XX', 'INCR', count, sku.id)
+    pl.execute()
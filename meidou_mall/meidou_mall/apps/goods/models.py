@@ -136,6 +136,12 @@ class SKU(BaseModel):
         db_table = 'tb_sku'
         verbose_name = '商品SKU'
         verbose_name_plural = verbose_name
+        # 分类商品列表游标分页按 (排序字段, id) 定位
+        indexes = [
+            models.Index(fields=['category', 'is_launched', 'create_time', 'id'], name='tb_sku_list_time_idx'),
+            models.Index(fields=['category', 'is_launched', 'price', 'id'], name='tb_sku_list_price_idx'),
+            models.Index(fields=['category', 'is_launched', 'sales', 'id'], name='tb_sku_list_sales_idx'),
+        ]
 
     def __str__(self):
         return '%s: %s' % (self.id, self.name)
@@ -0,0 +1,129 @@
+"""
+商品搜索
+
+- 查询结果按 (规范化的查询内容, 页码, 每页数量) 缓存, 索引更新后通过版本号失效
+- 只使用搜索引擎中存储的字段返回结果(ValuesSearchQuerySet), 不查询数据库
+- 按查询类别记录耗时, 用于统计分位数
+"""
+import hashlib
+import re
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from haystack.inputs import AutoQuery
+from haystack.query import SearchQuerySet
+
+from goods import constants
+from goods.models import SKU
+
+# 搜索结果返回的字段, 与 SKUIndexSerializer 相同
+SEARCH_FIELDS = ('text', 'id', 'name', 'price', 'default_image_url', 'comments')
+
+# 查询类别
+QUERY_CLASSES = ('all', 'single', 'cjk', 'latin', 'mixed')
+
+CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+LATIN_RE = re.compile(r'[0-9a-zA-Z]')
+
+
+def normalize_query(text):
+    """大小写和空白不同的查询视为同一个查询"""
+    return ' '.join((text or '').lower().split())
+
+
+def classify_query(text):
+    if not text:
+        return 'all'
+    if len(text) == 1:
+        return 'single'
+    has_cjk = bool(CJK_RE.search(text))
+    has_latin = bool(LATIN_RE.search(text))
+    if has_cjk and has_latin:
+        return 'mixed'
+    return 'cjk' if has_cjk else 'latin'
+
+
+def _get_version():
+    version = cache.get(constants.SEARCH_CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(constants.SEARCH_CACHE_VERSION_KEY, 1, None)
+        version = cache.get(constants.SEARCH_CACHE_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_search_cache():
+    """索引更新后调用"""
+    try:
+        cache.incr(constants.SEARCH_CACHE_VERSION_KEY)
+    except ValueError:
+        # 版本号不存在
+        cache.add(constants.SEARCH_CACHE_VERSION_KEY, 1, None)
+
+
+def _format_result(values):
+    result = {field: values.get(field) for field in SEARCH_FIELDS}
+    # 与序列化器DecimalField的输出格式相同
+    if result['price'] is not None:
+        result['price'] = str(Decimal(str(result['price'])).quantize(Decimal('0.01')))
+    return result
+
+
+def _query_engine(text, page, page_size):
+    sqs = SearchQuerySet().models(SKU)
+    if text:
+        sqs = sqs.filter(content=AutoQuery(text))
+    sqs = sqs.values(*SEARCH_FIELDS)
+    start = (page - 1) * page_size
+    results = [_format_result(values) for values in sqs[start:start + page_size]]
+    return sqs.count(), results
+
+
+def record_latency(query_class, cached, seconds):
+    key = constants.SEARCH_LATENCY_KEY % ('%s.%s' % (query_class, 'hit' if cached else 'miss'))
+    pl = get_redis_connection('default').pipeline()
+    pl.lpush(key, round(seconds * 1000, 3))
+    pl.ltrim(key, 0, constants.SEARCH_LATENCY_SAMPLES - 1)
+    pl.execute()
+
+
+def get_latency_percentiles(percentiles=(50, 90, 99)):
+    """
+    :return: {'cjk.miss': {'count': 样本数, 50: 毫秒, 90: 毫秒, 99: 毫秒}, ...}
+    """
+    names = ['%s.%s' % (query_class, cached) for query_class in QUERY_CLASSES for cached in ('hit', 'miss')]
+    pl = get_redis_connection('default').pipeline()
+    for name in names:
+        pl.lrange(constants.SEARCH_LATENCY_KEY % name, 0, -1)
+
+    report = {}
+    for name, samples in zip(names, pl.execute()):
+        if not samples:
+            continue
+        samples = sorted(float(sample) for sample in samples)
+        item = {'count': len(samples)}
+        for p in percentiles:
+            item[p] = samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+        report[name] = item
+    return report
+
+
+def search_skus(text, page, page_size):
+    """
+    搜索商品
+    :return: (匹配的商品总数, [{'text':, 'id':, 'name':, 'price':, 'default_image_url':, 'comments':}, ...])
+    """
+    start_time = time.time()
+    text = normalize_query(text)
+    digest = hashlib.md5(('%s|%s|%s' % (text, page, page_size)).encode()).hexdigest()
+    key = constants.SEARCH_CACHE_KEY % (_get_version(), digest)
+
+    result = cache.get(key)
+    cached = result is not None
+    if not cached:
+        result = _query_engine(text, page, page_size)
+        cache.set(key, result, constants.SEARCH_CACHE_EXPIRES)
+
+    record_latency(classify_query(text), cached, time.time() - start_time)
+    return result
@@ -20,6 +20,9 @@ class SKUIndex(indexes.SearchIndex, indexes.Indexable):
     default_image_url = indexes.CharField(model_attr='default_image_url')
     comments = indexes.IntegerField(model_attr='comments')
 
+    # 只修改这些字段时不需要更新索引, 见 meidou_mall.utils.search_queue
+    non_indexed_fields = ('stock', 'sales', 'update_time')
+
     def get_model(self):
         """返回建立索引的模型类"""
         return SKU
@@ -0,0 +1,197 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from goods import changes, inventory, listing
+from goods.models import Brand, Goods, GoodsCategory, GoodsChannel, GoodsSpecification, SKU, SKUImage, SKUSpecification, \
+    SpecificationOption
+from goods.spec_matrix import invalidate_spec_matrix
+from goods.static_pipeline import mark_dirty
+from goods.summary import invalidate_sku_summaries
+from goods.utils import invalidate_categories
+from meidou_mall.utils.cache_response import invalidate_cache_tags
+
+
+@receiver(post_save, sender=SKU)
+def reload_sku_stock(sender, instance, **kwargs):
+    """后台修改商品库存(如补货)后, 按数据库库存重新校准redis中的预扣库存, 事务回滚时不校准"""
+    if settings.STOCK_REDIS_PREDECREMENT and instance.is_launched:
+        sku_id = instance.id
+        transaction.on_commit(lambda: inventory.load_stock([sku_id]))
+
+
+@receiver(post_save, sender=SKU)
+def update_sku_list_index(sender, instance, **kwargs):
+    """商品修改的事务提交后更新分类列表索引, 下架的商品从索引中删除, 事务回滚时不修改索引"""
+    def update():
+        old_category_id = listing.update_sku_index(instance)
+        if old_category_id is not None:
+            invalidate_cache_tags('sku_list:%s' % old_category_id)
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=SKU)
+def remove_sku_list_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: listing.remove_sku_index(instance))
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+def clear_sku_response_cache(sender, instance, **kwargs):
+    """商品修改后, 事务提交后所在分类的商品列表接口缓存失效, 搜索结果缓存在索引更新后失效"""
+    tag = 'sku_list:%s' % instance.category_id
+    transaction.on_commit(lambda: invalidate_cache_tags(tag))
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+def clear_sku_summary(sender, instance, **kwargs):
+    """商品修改或删除后(包括后台的修改), 事务提交后清除商品摘要缓存"""
+    sku_id = instance.id
+    transaction.on_commit(lambda: invalidate_sku_summaries([sku_id]))
+
+
+@receiver(post_save, sender=GoodsCategory)
+@receiver(post_delete, sender=GoodsCategory)
+@receiver(post_save, sender=GoodsChannel)
+@receiver(post_delete, sender=GoodsChannel)
+def clear_categories(sender, **kwargs):
+    """商品分类或频道修改后, 事务提交后分类菜单缓存失效"""
+    transaction.on_commit(invalidate_categories)
+
+
+@receiver(post_save, sender=SKU)
+def clear_sku_spec_matrix(sender, instance, created, **kwargs):
+    """新增SKU改变所在SPU的规格-sku字典, 事务提交后清除"""
+    if created:
+        goods_id = instance.goods_id
+        transaction.on_commit(lambda: invalidate_spec_matrix(goods_id))
+
+
+@receiver(post_delete, sender=SKU)
+@receiver(post_save, sender=GoodsSpecification)
+@receiver(post_delete, sender=GoodsSpecification)
+def clear_spec_matrix(sender, instance, **kwargs):
+    goods_id = instance.goods_id
+    transaction.on_commit(lambda: invalidate_spec_matrix(goods_id))
+
+
+@receiver(post_save, sender=SpecificationOption)
+@receiver(post_delete, sender=SpecificationOption)
+def clear_specification_option_spec_matrix(sender, instance, **kwargs):
+    goods_id = instance.spec.goods_id
+    transaction.on_commit(lambda: invalidate_spec_matrix(goods_id))
+
+
+@receiver(post_save, sender=SKUSpecification)
+@receiver(post_delete, sender=SKUSpecification)
+def clear_sku_specification_spec_matrix(sender, instance, **kwargs):
+    goods_id = instance.sku.goods_id
+    transaction.on_commit(lambda: invalidate_spec_matrix(goods_id))
+
+
+@receiver(post_save, sender=SKU)
+def mark_sku_page_dirty(sender, instance, created, **kwargs):
+    """SKU修改只影响自身详情页, 新增SKU会改变同SPU其他SKU页面上的规格链接"""
+    if created:
+        mark_dirty(spu_ids=[instance.goods_id])
+    else:
+        mark_dirty(sku_ids=[instance.id])
+
+
+@receiver(post_delete, sender=SKU)
+def mark_deleted_sku_pages_dirty(sender, instance, **kwargs):
+    """删除SKU后删除其详情页, 并更新同SPU其他SKU页面上的规格链接"""
+    mark_dirty(sku_ids=[instance.id], spu_ids=[instance.goods_id])
+
+
+@receiver(post_save, sender=SKUImage)
+@receiver(post_delete, sender=SKUImage)
+def mark_sku_image_page_dirty(sender, instance, **kwargs):
+    mark_dirty(sku_ids=[instance.sku_id])
+
+
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+def mark_goods_pages_dirty(sender, instance, **kwargs):
+    mark_dirty(spu_ids=[instance.id])
+
+
+@receiver(post_save, sender=GoodsSpecification)
+@receiver(post_delete, sender=GoodsSpecification)
+def mark_goods_specification_pages_dirty(sender, instance, **kwargs):
+    mark_dirty(spu_ids=[instance.goods_id])
+
+
+@receiver(post_save, sender=SpecificationOption)
+@receiver(post_delete, sender=SpecificationOption)
+def mark_specification_option_pages_dirty(sender, instance, **kwargs):
+    mark_dirty(spu_ids=[instance.spec.goods_id])
+
+
+@receiver(post_save, sender=SKUSpecification)
+@receiver(post_delete, sender=SKUSpecification)
+def mark_sku_specification_pages_dirty(sender, instance, **kwargs):
+    mark_dirty(spu_ids=[instance.sku.goods_id])
+
+
+@receiver(post_save, sender=GoodsCategory)
+@receiver(post_delete, sender=GoodsCategory)
+@receiver(post_save, sender=GoodsChannel)
+@receiver(post_delete, sender=GoodsChannel)
+def mark_all_pages_dirty(sender, **kwargs):
+    """分类菜单在每个页面中"""
+    mark_dirty(all_details=True, index=True)
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+def record_sku_change(sender, instance, **kwargs):
+    changes.record_changes('sku', [instance.id])
+
+
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+def record_goods_change(sender, instance, **kwargs):
+    """品牌在SPU上, SPU修改后重新加载其下的SKU"""
+    changes.record_changes('goods', [instance.id])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def record_brand_change(sender, instance, **kwargs):
+    changes.record_changes('brand', [instance.id])
+
+
+@receiver(post_save, sender=GoodsCategory)
+@receiver(post_delete, sender=GoodsCategory)
+def record_category_change(sender, instance, **kwargs):
+    changes.record_changes('category', [instance.id])
+
+
+@receiver(post_save, sender=SKUSpecification)
+@receiver(post_delete, sender=SKUSpecification)
+def record_sku_specification_change(sender, instance, **kwargs):
+    """分类筛选按商品规格建立"""
+    changes.record_changes('sku', [instance.sku_id])
+    tag = 'sku_list:%s' % instance.sku.category_id
+    transaction.on_commit(lambda: invalidate_cache_tags(tag))
+
+
+@receiver(post_save, sender=SpecificationOption)
+@receiver(post_delete, sender=SpecificationOption)
+def record_specification_option_change(sender, instance, **kwargs):
+    goods = instance.spec.goods
+    changes.record_changes('goods', [goods.id])
+    tag = 'sku_list:%s' % goods.category3_id
+    transaction.on_commit(lambda: invalidate_cache_tags(tag))
+
+
+@receiver(post_save, sender=GoodsSpecification)
+@receiver(post_delete, sender=GoodsSpecification)
+def record_goods_specification_change(sender, instance, **kwargs):
+    changes.record_changes('goods', [instance.goods_id])
+    tag = 'sku_list:%s' % instance.goods.category3_id
+    transaction.on_commit(lambda: invalidate_cache_tags(tag))
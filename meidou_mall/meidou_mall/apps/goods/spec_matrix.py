@@ -0,0 +1,107 @@
+"""
+SPU规格矩阵
+
+一个SPU的规格、规格选项、SKU规格固定查询3次数据库, 同时得到该SPU下所有SKU的规格键和
+规格-sku字典, 结果按SPU缓存, 规格或SKU增删的事务提交后通过信号清除, 清除后从主库重新构建
+"""
+from django.core.cache import cache
+
+from goods import constants
+from goods.models import GoodsSpecification, SKUSpecification, SpecificationOption
+from meidou_mall.utils.db_router import use_primary
+
+
+def build_spec_matrix(goods_id):
+    """
+    从数据库构建SPU的规格矩阵
+    :param goods_id: 商品SPU id
+    :return: {
+        'specs': [
+            {'id': 规格id, 'name': '颜色', 'options': [{'id': 13, 'value': '银色'}, ...]},
+            ...
+        ],
+        # 每个SKU的规格键, 按规格id排序 {sku_id: [规格1参数id, 规格2参数id, ...]}
+        'sku_keys': {sku_id: [...], ...},
+        # 规格参数-sku字典 {(规格1参数id, 规格2参数id, ...): sku_id}
+        'spec_sku_map': {(...): sku_id, ...},
+    }
+    """
+    # 结果会缓存 SPEC_MATRIX_CACHE_EXPIRES 秒, 读主库避免缓存从库的旧数据
+    with use_primary():
+        spec_rows = list(GoodsSpecification.objects.filter(goods_id=goods_id).order_by('id').values('id', 'name'))
+        options = SpecificationOption.objects.filter(spec__goods_id=goods_id).order_by('id')
+        option_rows = list(options.values('id', 'spec_id', 'value'))
+        sku_specs = SKUSpecification.objects.filter(sku__goods_id=goods_id).order_by('sku_id', 'spec_id')
+        sku_spec_rows = list(sku_specs.values_list('sku_id', 'option_id'))
+
+    specs = []
+    spec_dict = {}
+    for spec in spec_rows:
+        spec['options'] = []
+        specs.append(spec)
+        spec_dict[spec['id']] = spec
+
+    for option in option_rows:
+        spec_dict[option['spec_id']]['options'].append({'id': option['id'], 'value': option['value']})
+
+    sku_keys = {}
+    for sku_id, option_id in sku_spec_rows:
+        sku_keys.setdefault(sku_id, []).append(option_id)
+
+    spec_sku_map = {tuple(key): sku_id for sku_id, key in sku_keys.items()}
+
+    return {'specs': specs, 'sku_keys': sku_keys, 'spec_sku_map': spec_sku_map}
+
+
+def get_spec_matrix(goods_id):
+    """获取SPU的规格矩阵, 优先读取缓存, 返回的字典调用者不能修改"""
+    key = constants.SPEC_MATRIX_CACHE_KEY % goods_id
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_spec_matrix(goods_id)
+        cache.set(key, matrix, constants.SPEC_MATRIX_CACHE_EXPIRES)
+    return matrix
+
+
+def invalidate_spec_matrix(goods_id):
+    """在事务中修改时应在事务提交后调用"""
+    cache.delete(constants.SPEC_MATRIX_CACHE_KEY % goods_id)
+
+
+def get_sku_specs(matrix, sku_id):
+    """
+    SKU详情页上的规格, 每个选项带有切换到的sku_id
+    :return: sku_specs = [
+                {
+                    'name': '颜色',
+                    'options': [
+                        {'id': 13, 'value': '银色', 'sku_id': xxx},
+                        ...
+                    ]
+                },
+                ...
+            ]
+            规格信息不完整的SKU返回None
+    """
+    specs = matrix['specs']
+    sku_key = matrix['sku_keys'].get(sku_id, [])
+    if len(sku_key) < len(specs):
+        return None
+
+    spec_sku_map = matrix['spec_sku_map']
+    sku_specs = []
+    for index, spec in enumerate(specs):
+        # 复制当前sku的规格键
+        key = sku_key[:]
+        options = []
+        for option in spec['options']:
+            # 在规格参数sku字典中查找符合当前规格的sku
+            key[index] = option['id']
+            options.append({
+                'id': option['id'],
+                'value': option['value'],
+                'sku_id': spec_sku_map.get(tuple(key)),
+            })
+        sku_specs.append({'name': spec['name'], 'options': options})
+
+    return sku_specs
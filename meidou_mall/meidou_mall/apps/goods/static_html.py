@@ -0,0 +1,158 @@
+"""
+商品详情页静态化
+
+按SPU分组生成: 同一SPU的所有SKU共用一次加载的商品信息和规格矩阵,
+分类菜单与模板在每个进程中只加载一次, 全量生成时可以用多进程并行
+"""
+import logging
+import multiprocessing
+import time
+
+from django.db import connections
+from django.template import loader
+
+from goods.models import Goods, SKU
+from goods.spec_matrix import get_sku_specs, get_spec_matrix
+from goods.utils import get_categories
+from meidou_mall.utils.static_html import write_static_html
+
+logger = logging.getLogger('django')
+
+# 全量生成时每个子任务处理的SPU数量
+SPU_CHUNK_SIZE = 20
+
+# 进程内缓存的详情页模板
+_detail_template = None
+
+
+def get_detail_template():
+    global _detail_template
+    if _detail_template is None:
+        _detail_template = loader.get_template('detail.html')
+    return _detail_template
+
+
+def build_spu_contexts(goods, categories, sku_ids=None):
+    """
+    构建一个SPU下SKU详情页的模板上下文
+    :param goods: 商品SPU对象
+    :param categories: 商品分类菜单
+    :param sku_ids: 需要生成的sku_id, 默认为该SPU下全部SKU
+    :return: {sku_id: context}, 规格信息不完整的SKU不生成
+    """
+    # 面包屑导航信息中的频道
+    goods.channel = goods.category1.goodschannel_set.all()[0]
+
+    # 获取当前商品的所有SKU
+    skus = list(goods.sku_set.all())
+
+    # 规格信息整个SPU只加载一次
+    matrix = get_spec_matrix(goods.id)
+
+    contexts = {}
+    for sku in skus:
+        if sku_ids is not None and sku.id not in sku_ids:
+            continue
+
+        sku_specs = get_sku_specs(matrix, sku.id)
+        # 若当前sku的规格信息不完整，则不再继续
+        if sku_specs is None:
+            continue
+
+        contexts[sku.id] = {
+            'categories': categories,
+            'goods': goods,  # SPU
+            'specs': sku_specs,   # 规格
+            'sku': sku
+        }
+
+    return contexts
+
+
+def get_sku_detail_html_path(sku_id):
+    """静态详情页相对于GENERATED_STATIC_HTML_FILES_DIR的路径"""
+    return 'goods/' + str(sku_id) + '.html'
+
+
+def write_sku_detail_html(sku_id, html_text):
+    """保存静态详情页 front_end_pc/goods/<sku_id>.html, 内容未改变时不重写"""
+    return write_static_html(get_sku_detail_html_path(sku_id), html_text)
+
+
+def generate_spu_detail_html(goods_id, sku_ids=None):
+    """
+    生成一个SPU下SKU的静态详情页
+    :param goods_id: 商品SPU id
+    :param sku_ids: 需要生成的sku_id, 默认为该SPU下全部SKU
+    :return: 生成的页面数量
+    """
+    goods = Goods.objects.select_related('category1', 'category2', 'category3').get(id=goods_id)
+    contexts = build_spu_contexts(goods, get_categories(), sku_ids)
+
+    template = get_detail_template()
+    for sku_id, context in contexts.items():
+        write_sku_detail_html(sku_id, template.render(context))
+
+    return len(contexts)
+
+
+def _generate_spu_chunk(spu_items):
+    """
+    子进程任务, spu_items = [(goods_id, sku_ids或None), ...]
+    :return: (生成的页面数量, 生成失败的spu_items)
+    """
+    pages = 0
+    failed = []
+    for goods_id, sku_ids in spu_items:
+        try:
+            pages += generate_spu_detail_html(goods_id, sku_ids)
+        except Exception as e:
+            logger.error('生成静态详情页[异常][ goods: %s, message: %s]' % (goods_id, e))
+            failed.append((goods_id, sku_ids))
+    return pages, failed
+
+
+def _init_worker():
+    # 不能使用父进程的数据库连接, 子进程各自重新连接
+    connections.close_all()
+
+
+def generate_detail_html_bulk(sku_ids=None, workers=1, failed=None):
+    """
+    批量生成静态详情页
+    :param sku_ids: 需要生成的sku_id, 默认全部SKU
+    :param workers: 并行的进程数
+    :param failed: 列表, 传入时向其中添加生成失败的 (goods_id, sku_ids或None)
+    :return: (生成的页面数量, 耗时秒数)
+    """
+    start = time.time()
+
+    queryset = SKU.objects.all()
+    if sku_ids is not None:
+        queryset = queryset.filter(id__in=sku_ids)
+
+    # 按SPU分组 {goods_id: [sku_id, ...]}
+    spu_dict = {}
+    for sku_id, goods_id in queryset.values_list('id', 'goods_id'):
+        spu_dict.setdefault(goods_id, set()).add(sku_id)
+    spu_items = [(goods_id, None if sku_ids is None else spu_sku_ids) for goods_id, spu_sku_ids in sorted(spu_dict.items())]
+    chunks = [spu_items[i:i + SPU_CHUNK_SIZE] for i in range(0, len(spu_items), SPU_CHUNK_SIZE)]
+
+    if workers > 1 and len(chunks) > 1:
+        # fork前关闭数据库连接, 避免子进程共用父进程的连接
+        connections.close_all()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        try:
+            results = list(pool.imap_unordered(_generate_spu_chunk, chunks))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_generate_spu_chunk(chunk) for chunk in chunks]
+
+    pages = sum(chunk_pages for chunk_pages, _ in results)
+    if failed is not None:
+        for _, chunk_failed in results:
+            failed.extend(chunk_failed)
+
+    return pages, time.time() - start
@@ -0,0 +1,130 @@
+"""
+静态页面增量生成
+
+模型信号记录有修改的SKU/SPU/分类/广告内容到redis, 并在防抖时间后安排一次celery任务,
+任务取出全部修改, 计算受影响的页面后批量生成, 内容未改变的页面不重写
+
+    SKU修改、SKU图片         -> 该SKU详情页
+    新增/删除SKU、SPU、规格   -> 该SPU下全部SKU详情页(规格选项链接到同SPU的其他SKU)
+    分类、频道               -> 全部详情页和首页(页面中的分类菜单)
+    广告内容                 -> 首页
+"""
+import logging
+
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU
+from goods.static_html import generate_detail_html_bulk, get_sku_detail_html_path
+from meidou_mall.utils.static_html import remove_static_html
+
+logger = logging.getLogger('django')
+
+
+def mark_dirty(sku_ids=(), spu_ids=(), all_details=False, index=False):
+    """
+    记录需要重新生成的页面, 并安排生成任务
+    :param sku_ids: 需要重新生成详情页的SKU
+    :param spu_ids: 需要重新生成全部SKU详情页的SPU
+    :param all_details: 是否重新生成全部详情页
+    :param index: 是否重新生成首页
+    """
+    redis_conn = get_redis_connection('default')
+    pl = redis_conn.pipeline()
+    if sku_ids:
+        pl.sadd(constants.STATIC_DIRTY_SKUS_KEY, *sku_ids)
+    if spu_ids:
+        pl.sadd(constants.STATIC_DIRTY_SPUS_KEY, *spu_ids)
+    if all_details:
+        pl.set(constants.STATIC_DIRTY_ALL_KEY, 1)
+    if index:
+        pl.set(constants.STATIC_DIRTY_INDEX_KEY, 1)
+    # 防抖期内只安排一次任务
+    pl.set(constants.STATIC_REBUILD_SCHEDULED_KEY, 1, ex=constants.STATIC_REBUILD_SCHEDULED_EXPIRES, nx=True)
+    scheduled = pl.execute()[-1]
+
+    if scheduled:
+        from celery_tasks.html.tasks import rebuild_static_pages
+        try:
+            rebuild_static_pages.apply_async(countdown=constants.STATIC_REBUILD_DEBOUNCE)
+        except Exception as e:
+            # 任务安排失败时由定时任务兜底
+            logger.error('安排静态页面生成任务失败: %s' % e)
+
+
+def take_dirty():
+    """
+    取出并清空全部修改记录, 生成失败的部分由调用者通过mark_dirty放回
+    :return: (sku_id集合, spu_id集合, 是否生成全部详情页, 是否生成首页)
+    """
+    redis_conn = get_redis_connection('default')
+    pl = redis_conn.pipeline()  # 事务管道, 取出与清空是原子的
+    # 先清除任务标记, 生成过程中的新修改会安排新的任务
+    pl.delete(constants.STATIC_REBUILD_SCHEDULED_KEY)
+    pl.smembers(constants.STATIC_DIRTY_SKUS_KEY)
+    pl.smembers(constants.STATIC_DIRTY_SPUS_KEY)
+    pl.get(constants.STATIC_DIRTY_ALL_KEY)
+    pl.get(constants.STATIC_DIRTY_INDEX_KEY)
+    pl.delete(constants.STATIC_DIRTY_SKUS_KEY, constants.STATIC_DIRTY_SPUS_KEY,
+              constants.STATIC_DIRTY_ALL_KEY, constants.STATIC_DIRTY_INDEX_KEY)
+    _, sku_ids, spu_ids, all_details, index, _ = pl.execute()
+
+    return (
+        {int(sku_id) for sku_id in sku_ids},
+        {int(spu_id) for spu_id in spu_ids},
+        bool(all_details),
+        bool(index),
+    )
+
+
+def rebuild_dirty_pages(workers=1):
+    """
+    重新生成有修改的页面, 生成失败的页面重新记录为有修改, 由之后的任务重试
+    :return: 生成的详情页数量
+    """
+    sku_ids, spu_ids, all_details, index = take_dirty()
+    if not (sku_ids or spu_ids or all_details or index):
+        return 0
+
+    pages = 0
+    failed = []
+    try:
+        if all_details:
+            pages, _ = generate_detail_html_bulk(None, workers, failed)
+        elif sku_ids or spu_ids:
+            affected = set(sku_ids)
+            if spu_ids:
+                affected.update(SKU.objects.filter(goods_id__in=spu_ids).values_list('id', flat=True))
+
+            # 已删除的SKU删除其详情页
+            existing = set(SKU.objects.filter(id__in=affected).values_list('id', flat=True))
+            for sku_id in affected - existing:
+                remove_static_html(get_sku_detail_html_path(sku_id))
+
+            if existing:
+                pages, _ = generate_detail_html_bulk(existing, workers, failed)
+    except Exception:
+        # 取出的修改全部放回
+        mark_dirty(sku_ids, spu_ids, all_details, index)
+        raise
+
+    if failed:
+        failed_sku_ids = set()
+        failed_spu_ids = set()
+        for goods_id, goods_sku_ids in failed:
+            if goods_sku_ids is None:
+                failed_spu_ids.add(goods_id)
+            else:
+                failed_sku_ids.update(goods_sku_ids)
+        mark_dirty(failed_sku_ids, failed_spu_ids)
+
+    if index:
+        from contents.crons import generate_static_index_html
+        try:
+            generate_static_index_html()
+        except Exception:
+            mark_dirty(index=True)
+            raise
+
+    logger.info('增量生成静态页面[ 详情页: %s, 首页: %s, 失败的SPU: %s]' % (pages, index, len(failed)))
+    return pages
@@ -0,0 +1,324 @@
+"""
+搜索建议(输入提示)
+
+每个进程在内存中保存一棵前缀树, 建议项为上架商品的名称、品牌和三级分类, 按销量排序
+(品牌和分类为其上架商品的销量之和)
+- 建议项文本在每个词的开头(空格后, 中文与字母数字交界处)都插入前缀树, 最大深度 SUGGEST_MAX_PREFIX_LENGTH
+- 每个节点保存其下销量最高的 SUGGEST_TOP_K 个建议项, 查询只需沿输入走到对应节点, 不访问数据库和搜索引擎
+- 商品、品牌、分类修改后写入商品数据修改记录(goods.changes), 各进程每隔 SUGGEST_CHECK_INTERVAL 秒
+  读取新的修改记录, 只重新加载修改过的数据并更新前缀树; 落后太多或每隔 SUGGEST_REBUILD_INTERVAL 秒重新建立
+"""
+import logging
+import threading
+import time
+
+from django.db.models import Q
+
+from goods import constants
+from goods.changes import read_changes
+from goods.models import SKU, Brand, GoodsCategory
+from meidou_mall.utils.db_router import use_primary
+
+logger = logging.getLogger('django')
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def _char_class(ch):
+    if '\u4e00' <= ch <= '\u9fff':
+        return 'cjk'
+    if ch.isalnum():
+        return 'alnum'
+    return 'other'
+
+
+def _word_starts(text):
+    """规范化文本中每个词开头的下标"""
+    starts = []
+    prev = None
+    for i, ch in enumerate(text):
+        if ch == ' ':
+            prev = None
+            continue
+        cls = _char_class(ch)
+        if prev is None or (cls != prev and 'other' not in (cls, prev)):
+            starts.append(i)
+        prev = cls
+    return starts
+
+
+def _new_node():
+    # [下级节点 {字符: 节点} 或None, 在此结束的建议项 set 或None, 销量最高的建议项 tuple]
+    return [None, None, ()]
+
+
+class SuggestIndex(object):
+    """建议项前缀树"""
+
+    def __init__(self):
+        self.root = _new_node()
+        # 建议项 {(类型, id): (显示文本, 规范化文本, 销量)}
+        self.entries = {}
+        # 上架商品 {sku_id: (brand_id, category_id, sales)}
+        self.skus = {}
+        self.brand_names = {}
+        self.category_names = {}
+        # 品牌/分类的 [上架商品数量, 销量之和]
+        self.brand_stats = {}
+        self.category_stats = {}
+
+    def _rank(self, key):
+        return -self.entries[key][2], key
+
+    def _keys(self, text):
+        max_length = constants.SUGGEST_MAX_PREFIX_LENGTH
+        return {text[start:start + max_length] for start in _word_starts(text)}
+
+    def _insert(self, key, text, weight):
+        self.entries[key] = (text, normalize(text), weight)
+        top_k = constants.SUGGEST_TOP_K
+        for prefix in self._keys(self.entries[key][1]):
+            node = self.root
+            for ch in prefix:
+                if node[0] is None:
+                    node[0] = {}
+                child = node[0].get(ch)
+                if child is None:
+                    child = node[0][ch] = _new_node()
+                node = child
+                if key not in node[2]:
+                    node[2] = tuple(sorted(node[2] + (key,), key=self._rank)[:top_k])
+            if node[1] is None:
+                node[1] = set()
+            node[1].add(key)
+
+    def _compute_top(self, node):
+        candidates = set(key for key in (node[1] or ()) if key in self.entries)
+        for child in (node[0] or {}).values():
+            candidates.update(key for key in child[2] if key in self.entries)
+        return tuple(sorted(candidates, key=self._rank)[:constants.SUGGEST_TOP_K])
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        # {id(节点): (深度, 节点, 上级节点, 字符)}
+        nodes = {}
+        for prefix in self._keys(entry[1]):
+            node = self.root
+            for depth, ch in enumerate(prefix):
+                parent, node = node, (node[0] or {}).get(ch)
+                if node is None:
+                    break
+                nodes[id(node)] = (depth, node, parent, ch)
+            else:
+                if node[1] is not None:
+                    node[1].discard(key)
+
+        # 从下往上重新计算, 删除空节点
+        for depth, node, parent, ch in sorted(nodes.values(), key=lambda item: -item[0]):
+            if key in node[2]:
+                node[2] = self._compute_top(node)
+            if not node[0] and not node[1]:
+                del parent[0][ch]
+                if not parent[0]:
+                    parent[0] = None
+
+    def _set_entry(self, key, text, weight):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] == text and entry[2] == weight:
+                return
+            self._remove(key)
+        self._insert(key, text, weight)
+
+    def _refresh_group(self, kind, group_id, stats, names):
+        count, sales = stats.get(group_id, (0, 0))
+        name = names.get(group_id)
+        if count and name:
+            self._set_entry((kind, group_id), name, sales)
+        else:
+            self._remove((kind, group_id))
+        if not count:
+            stats.pop(group_id, None)
+
+    def _update_sku(self, sku_id, row):
+        """
+        :param row: (name, sales, brand_id, category_id), 下架或删除时为None
+        :return: 受影响的品牌和分类 ({brand_id, ...}, {category_id, ...})
+        """
+        brands, categories = set(), set()
+        old = self.skus.pop(sku_id, None)
+        if old is not None:
+            brand_id, category_id, sales = old
+            for stats, group_id in ((self.brand_stats, brand_id), (self.category_stats, category_id)):
+                stats[group_id][0] -= 1
+                stats[group_id][1] -= sales
+            brands.add(brand_id)
+            categories.add(category_id)
+
+        if row is None:
+            self._remove(('sku', sku_id))
+        else:
+            name, sales, brand_id, category_id = row
+            self.skus[sku_id] = (brand_id, category_id, sales)
+            for stats, group_id in ((self.brand_stats, brand_id), (self.category_stats, category_id)):
+                group = stats.setdefault(group_id, [0, 0])
+                group[0] += 1
+                group[1] += sales
+            brands.add(brand_id)
+            categories.add(category_id)
+            self._set_entry(('sku', sku_id), name, sales)
+        return brands, categories
+
+    def load(self, changes=None):
+        """
+        从数据库加载
+        :param changes: 修改记录 {类型: {id, ...}}, None表示全部加载
+        """
+        queryset = SKU.objects.values_list('id', 'name', 'sales', 'goods__brand_id', 'category_id', 'is_launched')
+        if changes is None:
+            queryset = queryset.filter(is_launched=True)
+        else:
+            queryset = queryset.filter(Q(id__in=changes['sku']) | Q(goods_id__in=changes['goods']))
+
+        with use_primary():
+            rows = {row[0]: row[1:5] if row[5] else None for row in queryset}
+            if changes is not None:
+                for sku_id in changes['sku']:
+                    rows.setdefault(sku_id, None)
+                brand_ids = set(changes['brand'])
+                category_ids = set(changes['category'])
+            else:
+                brand_ids = set()
+                category_ids = set()
+            brand_ids.update(row[2] for row in rows.values() if row and row[2] not in self.brand_names)
+            category_ids.update(row[3] for row in rows.values() if row and row[3] not in self.category_names)
+            brand_names = dict(Brand.objects.filter(id__in=brand_ids).values_list('id', 'name'))
+            category_names = dict(GoodsCategory.objects.filter(id__in=category_ids).values_list('id', 'name'))
+
+        for group_id in brand_ids:
+            self.brand_names.pop(group_id, None)
+        self.brand_names.update(brand_names)
+        for group_id in category_ids:
+            self.category_names.pop(group_id, None)
+        self.category_names.update(category_names)
+
+        for sku_id, row in rows.items():
+            brands, categories = self._update_sku(sku_id, row)
+            brand_ids.update(brands)
+            category_ids.update(categories)
+
+        for brand_id in brand_ids:
+            self._refresh_group('brand', brand_id, self.brand_stats, self.brand_names)
+        for category_id in category_ids:
+            self._refresh_group('category', category_id, self.category_stats, self.category_names)
+
+    def suggest(self, text, limit=constants.SUGGEST_TOP_K):
+        """
+        :return: [{'text': 显示文本, 'type': 'sku'/'brand'/'category', 'id': id}, ...]
+        """
+        text = normalize(text)
+        if not text:
+            return []
+
+        node = self.root
+        for ch in text[:constants.SUGGEST_MAX_PREFIX_LENGTH]:
+            node = (node[0] or {}).get(ch)
+            if node is None:
+                return []
+
+        if len(text) <= constants.SUGGEST_MAX_PREFIX_LENGTH:
+            keys = node[2][:limit]
+        else:
+            # 超过最大深度, 逐个匹配在此结束的建议项
+            matched = []
+            for key in tuple(node[1] or ()):
+                entry = self.entries.get(key)
+                if entry and any(entry[1].startswith(text, start) for start in _word_starts(entry[1])):
+                    matched.append(key)
+            keys = sorted(matched, key=self._rank)[:limit]
+
+        result = []
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result.append({'text': entry[0], 'type': key[0], 'id': key[1]})
+        return result
+
+
+# 进程内的前缀树 (前缀树, 已应用的修改序号, 下次检查修改记录的时间, 建立时间)
+_index_memo = (None, 0, 0, 0)
+_index_lock = threading.Lock()
+# 是否有线程正在重新建立前缀树
+_rebuilding = False
+
+
+def _rebuild(start_seq, now):
+    """在锁外重新建立前缀树, 期间继续使用旧的前缀树, 建立期间的修改在替换前补上"""
+    global _index_memo, _rebuilding
+
+    try:
+        new_index = SuggestIndex()
+        new_index.load()
+        with _index_lock:
+            seq, changes = read_changes(start_seq)
+            if changes:
+                new_index.load(changes)
+            # 修改记录不完整时下次检查会再次重新建立
+            _index_memo = (new_index, seq if changes is not None else start_seq,
+                           now + constants.SUGGEST_CHECK_INTERVAL, now)
+    except Exception as e:
+        # 继续使用旧的前缀树, 下次检查时再次重新建立
+        logger.error('重新建立搜索建议前缀树失败: %s' % e)
+    finally:
+        with _index_lock:
+            _rebuilding = False
+
+
+def get_suggest_index():
+    """获取进程内的前缀树, 每隔 SUGGEST_CHECK_INTERVAL 秒应用新的修改记录"""
+    global _index_memo, _rebuilding
+
+    index, last_seq, check_at, built_at = _index_memo
+    now = time.time()
+    if index is not None and now < check_at:
+        return index
+
+    with _index_lock:
+        index, last_seq, check_at, built_at = _index_memo
+        if index is not None and now < check_at:
+            return index
+
+        # 先读取序号再加载数据, 加载过程中的修改在下次检查时再次应用
+        seq, changes = read_changes(last_seq)
+        if index is None:
+            # 第一次使用, 没有旧的前缀树可用
+            index = SuggestIndex()
+            index.load()
+            _index_memo = (index, seq, now + constants.SUGGEST_CHECK_INTERVAL, now)
+            return index
+
+        rebuild = changes is None or now - built_at > constants.SUGGEST_REBUILD_INTERVAL
+        if rebuild:
+            if _rebuilding:
+                rebuild = False
+            else:
+                _rebuilding = True
+        if changes:
+            index.load(changes)
+        if changes is not None:
+            last_seq = seq
+        _index_memo = (index, last_seq, now + constants.SUGGEST_CHECK_INTERVAL, built_at)
+
+    if rebuild:
+        _rebuild(seq, now)
+        return _index_memo[0]
+    return index
+
+
+def suggest(text, limit=constants.SUGGEST_TOP_K):
+    return get_suggest_index().suggest(text, limit)
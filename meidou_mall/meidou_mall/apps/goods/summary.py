@@ -0,0 +1,136 @@
+"""
+商品摘要缓存
+
+购物车、结算、浏览记录只需要商品的 id, name, price, default_image_url, comments,
+读取时依次查询 进程内LRU缓存 -> redis(每个商品一个hash, 一次管道批量读取) -> 数据库(一次批量查询)
+商品保存/删除的事务提交后通过信号清除缓存, 回填时从主库读取, 避免把修改前的数据重新写入缓存
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU
+from meidou_mall.utils.db_router import use_primary
+
+# 摘要包含的商品字段
+SUMMARY_FIELDS = ('id', 'name', 'price', 'default_image_url', 'comments')
+
+
+class LocalLRUCache(object):
+    """进程内的LRU缓存, 数据带有效期"""
+
+    def __init__(self, max_size, expires):
+        self.max_size = max_size
+        self.expires = expires
+        self._data = OrderedDict()  # {key: (过期时间, value)}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        result = {}
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                if item[0] < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                result[key] = item[1]
+        return result
+
+    def set_many(self, data):
+        expire_at = time.time() + self.expires
+        with self._lock:
+            for key, value in data.items():
+                self._data[key] = (expire_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = LocalLRUCache(constants.SKU_SUMMARY_LOCAL_MAX_SIZE, constants.SKU_SUMMARY_LOCAL_EXPIRES)
+
+
+def _from_redis(redis_dict):
+    summary = {
+        'id': int(redis_dict[b'id']),
+        'name': redis_dict[b'name'].decode(),
+        'price': redis_dict[b'price'].decode(),
+        'comments': int(redis_dict[b'comments']),
+        # 默认图片可以为空, 为空时redis中没有该字段
+        'default_image_url': None,
+    }
+    if b'default_image_url' in redis_dict:
+        summary['default_image_url'] = redis_dict[b'default_image_url'].decode()
+    return summary
+
+
+def get_sku_summaries(sku_ids):
+    """
+    批量查询商品摘要
+    :param sku_ids: sku_id列表
+    :return: {sku_id: {'id':, 'name':, 'price':, 'default_image_url':, 'comments':}}, 不存在的商品不包含在内
+             每次返回新的字典, 调用者可以直接向其中添加数据
+    """
+    sku_ids = [int(sku_id) for sku_id in sku_ids]
+    summaries = _local_cache.get_many(sku_ids)
+
+    missing = [sku_id for sku_id in sku_ids if sku_id not in summaries]
+    if missing:
+        redis_conn = get_redis_connection('default')
+        pl = redis_conn.pipeline()
+        for sku_id in missing:
+            pl.hgetall(constants.SKU_SUMMARY_REDIS_KEY % sku_id)
+        redis_summaries = {}
+        for sku_id, redis_dict in zip(missing, pl.execute()):
+            if redis_dict:
+                redis_summaries[sku_id] = _from_redis(redis_dict)
+
+        missing = [sku_id for sku_id in missing if sku_id not in redis_summaries]
+        if missing:
+            db_summaries = {}
+            # 回填的数据在redis中保存较长时间, 不能读取从库的旧数据
+            with use_primary():
+                rows = list(SKU.objects.filter(id__in=missing).values(*SUMMARY_FIELDS))
+            for summary in rows:
+                summary['price'] = str(summary['price'])
+                db_summaries[summary['id']] = summary
+
+            # 回填redis
+            if db_summaries:
+                pl = redis_conn.pipeline()
+                for sku_id, summary in db_summaries.items():
+                    key = constants.SKU_SUMMARY_REDIS_KEY % sku_id
+                    pl.hmset(key, {field: value for field, value in summary.items() if value is not None})
+                    pl.expire(key, constants.SKU_SUMMARY_REDIS_EXPIRES)
+                pl.execute()
+            redis_summaries.update(db_summaries)
+
+        _local_cache.set_many(redis_summaries)
+        summaries.update(redis_summaries)
+
+    return {sku_id: dict(summary) for sku_id, summary in summaries.items()}
+
+
+def invalidate_sku_summaries(sku_ids):
+    """清除商品摘要缓存, 其他进程的进程内缓存在SKU_SUMMARY_LOCAL_EXPIRES秒内过期"""
+    sku_ids = [int(sku_id) for sku_id in sku_ids]
+    if not sku_ids:
+        return
+    _local_cache.delete_many(sku_ids)
+    redis_conn = get_redis_connection('default')
+    redis_conn.delete(*[constants.SKU_SUMMARY_REDIS_KEY % sku_id for sku_id in sku_ids])
@@ -1,3 +1,186 @@
-from django.test import TestCase
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.http import QueryDict
+from django.test import SimpleTestCase
+
+from goods import constants
+from goods.facets import CategoryFacets, _price_bounds, _round_down, parse_filters
+from goods.suggest import SuggestIndex, normalize
+
+
+class SuggestIndexTest(SimpleTestCase):
+    """搜索建议前缀树"""
+
+    def setUp(self):
+        self.index = SuggestIndex()
+
+    def texts(self, text, limit=10):
+        return [item['text'] for item in self.index.suggest(text, limit)]
+
+    def test_word_starts(self):
+        self.index._set_entry(('sku', 1), 'Apple iPhone 8 Plus', 10)
+        self.index._set_entry(('sku', 2), '华为P10 手机', 5)
+        self.assertEqual(self.texts('iph'), ['Apple iPhone 8 Plus'])
+        self.assertEqual(self.texts('  APPLE   iphone'), ['Apple iPhone 8 Plus'])
+        self.assertEqual(self.texts('phone'), [])
+        self.assertEqual(self.texts('p10'), ['华为P10 手机'])
+        self.assertEqual(self.texts('手机'), ['华为P10 手机'])
+        self.assertEqual(self.texts(''), [])
+
+    def test_top_k(self):
+        with mock.patch.object(constants, 'SUGGEST_TOP_K', 2):
+            self.index._set_entry(('sku', 1), 'iPad', 10)
+            self.index._set_entry(('sku', 2), 'iPhone', 30)
+            self.index._set_entry(('sku', 3), 'iPod', 20)
+            self.assertEqual(self.texts('ip'), ['iPhone', 'iPod'])
+
+            # 删除后由下级节点补上
+            self.index._remove(('sku', 2))
+            self.assertEqual(self.texts('ip'), ['iPod', 'iPad'])
+
+            # 修改销量后重新排序
+            self.index._set_entry(('sku', 1), 'iPad', 50)
+            self.assertEqual(self.texts('ip'), ['iPad', 'iPod'])
+            self.assertEqual(self.texts('ip', 1), ['iPad'])
+
+    def test_remove_prunes_nodes(self):
+        self.index._set_entry(('sku', 1), 'iPhone', 10)
+        self.index._set_entry(('brand', 2), 'Apple', 10)
+        self.index._remove(('sku', 1))
+        self.index._remove(('brand', 2))
+        self.index._remove(('brand', 3))
+        self.assertEqual(self.texts('i'), [])
+        self.assertEqual(self.index.entries, {})
+        self.assertIsNone(self.index.root[0])
+
+    def test_longer_than_max_prefix(self):
+        with mock.patch.object(constants, 'SUGGEST_MAX_PREFIX_LENGTH', 3):
+            self.index._set_entry(('sku', 1), 'iPhone X', 10)
+            self.index._set_entry(('sku', 2), 'iPhoto', 20)
+            self.index._set_entry(('sku', 3), 'iPad', 30)
+            self.assertEqual(self.texts('iph'), ['iPhoto', 'iPhone X'])
+            self.assertEqual(self.texts('iphone'), ['iPhone X'])
+            self.assertEqual(self.texts('iphones'), [])
+
+    def test_brand_and_category_entries(self):
+        self.index.brand_names = {1: 'Apple'}
+        self.index.category_names = {115: '手机'}
+        for sku_id, sales in ((1, 10), (2, 5)):
+            self.index._update_sku(sku_id, ('iPhone %s' % sku_id, sales, 1, 115))
+        self.index._refresh_group('brand', 1, self.index.brand_stats, self.index.brand_names)
+        self.index._refresh_group('category', 115, self.index.category_stats, self.index.category_names)
+        self.assertEqual(self.index.suggest('app'), [{'text': 'Apple', 'type': 'brand', 'id': 1}])
+        self.assertEqual(self.index.entries[('category', 115)][2], 15)
+
+        # 下架全部商品后品牌和分类不再出现
+        for sku_id in (1, 2):
+            self.index._update_sku(sku_id, None)
+        self.index._refresh_group('brand', 1, self.index.brand_stats, self.index.brand_names)
+        self.index._refresh_group('category', 115, self.index.category_stats, self.index.category_names)
+        self.assertEqual(self.index.entries, {})
+        self.assertEqual(self.index.brand_stats, {})
+
+    def test_matches_brute_force(self):
+        rand = random.Random(1)
+        words = ['apple', 'iphone', 'ipad', '华为', '手机', 'p10', 'mate', '小米', 'note', 'pro']
+        entries = {}
+        with mock.patch.object(constants, 'SUGGEST_TOP_K', 3), \
+                mock.patch.object(constants, 'SUGGEST_MAX_PREFIX_LENGTH', 4):
+            for _ in range(300):
+                key = ('sku', rand.randint(1, 40))
+                if rand.random() < 0.3:
+                    self.index._remove(key)
+                    entries.pop(key, None)
+                else:
+                    text = ' '.join(rand.sample(words, rand.randint(1, 3)))
+                    weight = rand.randint(0, 5)
+                    self.index._set_entry(key, text, weight)
+                    entries[key] = (text, weight)
+
+                query = normalize(rand.choice(words)[:rand.randint(1, 5)])
+                expected = sorted(
+                    (key for key, (text, _) in entries.items()
+                     if any(word.startswith(query) for word in normalize(text).split())),
+                    key=lambda key: (-entries[key][1], key))[:3]
+                self.assertEqual([(item['type'], item['id']) for item in self.index.suggest(query, 3)], expected)
+
+
+class CategoryFacetsTest(SimpleTestCase):
+    """分类筛选位图"""
+
+    def setUp(self):
+        self.facets = CategoryFacets(115, [0, 1000, 3000])
+        self.facets.brand_names = {1: 'Apple', 2: '华为'}
+        self.facets.add_sku(1, 500, 1, [('颜色', '金色'), ('内存', '64GB')])
+        self.facets.add_sku(2, 1500, 1, [('颜色', '银色'), ('内存', '64GB')])
+        self.facets.add_sku(3, 3500, 2, [('颜色', '金色'), ('内存', '256GB')])
+        self.facets.add_sku(4, 2000, 2, [('颜色', '金色'), ('内存', '64GB')])
+
+    def query(self, brand=(), price=(), spec=None):
+        sku_ids, facets = self.facets.query({'brand': set(brand), 'price': set(price), 'spec': spec or {}})
+        counts = {
+            'brand': {item['id']: item['count'] for item in facets['brand']},
+            'price': {item['value']: item['count'] for item in facets['price']},
+            'specs': {(spec['name'], option['value']): option['count']
+                      for spec in facets['specs'] for option in spec['options']},
+        }
+        return sorted(sku_ids), counts
+
+    def test_no_filters(self):
+        sku_ids, counts = self.query()
+        self.assertEqual(sku_ids, [1, 2, 3, 4])
+        self.assertEqual(counts['brand'], {1: 2, 2: 2})
+        self.assertEqual(counts['price'], {'0-1000': 1, '1000-3000': 2, '3000-': 1})
+        self.assertEqual(counts['specs'], {
+            ('内存', '256GB'): 1, ('内存', '64GB'): 3, ('颜色', '金色'): 3, ('颜色', '银色'): 1})
+
+    def test_filters(self):
+        sku_ids, counts = self.query(brand=[2], spec={'颜色': {'金色'}})
+        self.assertEqual(sku_ids, [3, 4])
+        # 每组的数量不受本组筛选条件影响
+        self.assertEqual(counts['brand'], {1: 1, 2: 2})
+        self.assertEqual(counts['specs'][('颜色', '金色')], 2)
+        self.assertEqual(counts['specs'][('颜色', '银色')], 0)
+        self.assertEqual(counts['specs'][('内存', '64GB')], 1)
+
+        self.assertEqual(self.query(price=['1000-3000'])[0], [2, 4])
+        self.assertEqual(self.query(brand=[1, 2], price=['0-1000', '3000-'])[0], [1, 3])
+        self.assertEqual(self.query(spec={'颜色': {'金色', '银色'}, '内存': {'256GB'}})[0], [3])
+        self.assertEqual(self.query(brand=[9])[0], [])
+
+    def test_remove_and_reuse_position(self):
+        self.facets.remove_sku(2)
+        self.facets.remove_sku(2)
+        sku_ids, counts = self.query()
+        self.assertEqual(sku_ids, [1, 3, 4])
+        self.assertNotIn(('颜色', '银色'), counts['specs'])
+
+        self.facets.add_sku(5, 100, 3, [('颜色', '黑色')])
+        self.assertEqual(self.facets.positions[5], 1)
+        sku_ids, counts = self.query(brand=[3])
+        self.assertEqual(sku_ids, [5])
+        self.assertEqual(counts['specs'][('颜色', '黑色')], 1)
+
+    def test_update_sku(self):
+        self.facets.add_sku(1, 3200, 2, [('颜色', '银色')])
+        sku_ids, counts = self.query(price=['3000-'])
+        self.assertEqual(sku_ids, [1, 3])
+        self.assertEqual(counts['brand'], {1: 0, 2: 2})
+        self.assertEqual(counts['price']['0-1000'], 0)
+
+    def test_price_bounds(self):
+        self.assertEqual(_round_down(1234), 1200)
+        self.assertEqual(_round_down(56), 56)
+        self.assertEqual(_price_bounds([]), [0])
+        with mock.patch.object(constants, 'FACET_PRICE_BUCKETS', 2):
+            self.assertEqual(_price_bounds([100, 200, 3456, 4000]), [0, 3400])
+
+    def test_parse_filters(self):
+        self.assertIsNone(parse_filters(QueryDict('ordering=price')))
+        self.assertEqual(parse_filters(QueryDict('facets=1')), {'brand': set(), 'price': set(), 'spec': {}})
+        self.assertEqual(parse_filters(QueryDict('brand=1,2,x&price=0-1000,&spec=颜色:金色&spec=内存:64GB&spec=bad')), {
+            'brand': {1, 2},
+            'price': {'0-1000'},
+            'spec': {'颜色': {'金色'}, '内存': {'64GB'}},
+        })
@@ -6,6 +6,7 @@ from . import views
 
 urlpatterns = [
     url(r'^categories/(?P<category_id>\d+)/skus/$', views.SKUListView.as_view()),
+    url(r'^skus/suggest/$', views.SKUSuggestView.as_view()),
 ]
 
 router = DefaultRouter()
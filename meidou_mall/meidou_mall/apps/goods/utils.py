@@ -1,15 +1,41 @@
+import time
 from collections import OrderedDict
 
-from .models import GoodsChannel
+from django.core.cache import cache
 
+from goods import constants
+from meidou_mall.utils.db_router import use_primary
+from .models import GoodsCategory, GoodsChannel
 
-def get_categories():
+
+# 进程内缓存的分类菜单 (版本号, 菜单字典)
+_categories_memo = (None, None)
+
+
+def build_categories():
     """
-    获取商城商品分类菜单
+    从数据库构建商城商品分类菜单, 固定查询2次数据库
+    读主库: 修改后新版本号下的菜单会缓存 CATEGORIES_CACHE_EXPIRES 秒, 不能是从库的旧数据
     :return: 菜单字典
+    categories = {
+        1: { # 组1
+            'channels': [{'id':, 'name':, 'url':},{}, {}...],
+            'sub_cats': [{'id':, 'name':, 'sub_cats':[{'id':, 'name':},{}]}, {}, {}, ..]
+        },
+        2: { # 组2
+
+        }
+    }
     """
+    # 所有的二级和三级类别, 按上级类别分组
+    sub_cats_dict = {}
+    with use_primary():
+        cats = list(GoodsCategory.objects.filter(parent__isnull=False).order_by('id').values('id', 'name', 'parent_id'))
+        channels = list(GoodsChannel.objects.select_related('category').order_by('group_id', 'sequence'))
+    for cat in cats:
+        sub_cats_dict.setdefault(cat['parent_id'], []).append({'id': cat['id'], 'name': cat['name']})
+
     categories = OrderedDict()
-    channels = GoodsChannel.objects.order_by('group_id', 'sequence')
     for channel in channels:
         group_id = channel.group_id  # 当前组
 
@@ -26,10 +52,53 @@ def get_categories():
         })
 
         # 构建当前类别的子类别
-        for cat2 in cat1.goodscategory_set.all():
-            cat2.sub_cats = []
-            for cat3 in cat2.goodscategory_set.all():
-                cat2.sub_cats.append(cat3)
+        for cat2 in sub_cats_dict.get(cat1.id, []):
+            cat2['sub_cats'] = sub_cats_dict.get(cat2['id'], [])
             categories[group_id]['sub_cats'].append(cat2)
 
     return categories
+
+
+def _new_version():
+    """
+    版本号键不存在(被淘汰)时的初始版本号, 按时间取值
+    如果从1重新开始, 旧的 categories_1 仍在缓存中时会被再次使用
+    """
+    return int(time.time() * 1000)
+
+
+def get_categories():
+    """
+    获取商城商品分类菜单
+    依次查询进程内缓存和redis缓存, 都没有时从数据库构建, 每次调用只需读取一次缓存版本号
+    返回的字典在多次调用间共享, 调用者不能修改
+    :return: 菜单字典
+    """
+    global _categories_memo
+
+    version = cache.get(constants.CATEGORIES_VERSION_CACHE_KEY)
+    if version is None:
+        version = _new_version()
+        cache.add(constants.CATEGORIES_VERSION_CACHE_KEY, version, None)
+        version = cache.get(constants.CATEGORIES_VERSION_CACHE_KEY, version)
+
+    memo_version, categories = _categories_memo
+    if memo_version == version:
+        return categories
+
+    categories = cache.get(constants.CATEGORIES_CACHE_KEY % version)
+    if categories is None:
+        categories = build_categories()
+        cache.set(constants.CATEGORIES_CACHE_KEY % version, categories, constants.CATEGORIES_CACHE_EXPIRES)
+
+    _categories_memo = (version, categories)
+    return categories
+
+
+def invalidate_categories():
+    """商品分类或频道修改后, 使分类菜单缓存失效, 在事务中修改时应在事务提交后调用"""
+    try:
+        cache.incr(constants.CATEGORIES_VERSION_CACHE_KEY)
+    except ValueError:
+        # 版本号不存在
+        cache.add(constants.CATEGORIES_VERSION_CACHE_KEY, _new_version(), None)
@@ -2,9 +2,15 @@ from django.shortcuts import render
 from drf_haystack.viewsets import HaystackViewSet
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from goods import constants, facets, listing, suggest
 from goods.models import SKU
+from goods.search import search_skus
 from goods.serializers import SKUIndexSerializer
+from meidou_mall.utils.cache_response import cache_response
+from meidou_mall.utils.pagination import KeysetPagination
 from users.serializers import SKUserializer
 
 # Create your views here.
@@ -18,9 +24,51 @@ class SKUListView(ListAPIView):
     filter_backends = (OrderingFilter,)
     ordering_fields = ('create_time', 'price', 'sales')
 
+    # 按品牌、价格、规格筛选后的sku_id, None表示不筛选
+    facet_sku_ids = None
+
     def get_queryset(self):
         category_id = self.kwargs['category_id']
-        return SKU.objects.filter(category_id=category_id, is_launched=True)
+        queryset = SKU.objects.filter(category_id=category_id, is_launched=True)
+        if self.facet_sku_ids is not None:
+            queryset = queryset.filter(id__in=self.facet_sku_ids)
+        return queryset
+
+    def get_count_cache_key(self):
+        """游标分页的近似总数按分类缓存, 筛选时不缓存"""
+        if self.facet_sku_ids is not None:
+            return None
+        return 'sku_list_count_%s' % self.kwargs['category_id']
+
+    @cache_response(tags=('sku_list:{category_id}',))
+    def list(self, request, *args, **kwargs):
+        # 带有cursor参数时使用游标分页
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self._paginator = KeysetPagination()
+
+        # 带有筛选参数时从进程内的筛选数据取得符合条件的商品, 并返回各选项的数量
+        filters = facets.parse_filters(request.query_params)
+        if filters is not None:
+            self.facet_sku_ids, facet_counts = facets.query_category(int(self.kwargs['category_id']), filters)
+            response = super().list(request, *args, **kwargs)
+            response.data['facets'] = facet_counts
+            return response
+
+        if KeysetPagination.cursor_query_param in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        # 按create_time, price, sales排序时从redis索引查询, 否则查询数据库
+        paginator = self.paginator
+        page_size = paginator.get_page_size(request)
+        page = paginator.get_requested_page(request)
+
+        result = listing.get_category_page(
+            int(self.kwargs['category_id']), request.query_params.get('ordering'), page, page_size)
+        if result is None:
+            return super().list(request, *args, **kwargs)
+
+        total, results = result
+        return paginator.build_paginated_response(request, page, page_size, total, results)
 
 
 class SKUSearchViewSet(HaystackViewSet):
@@ -29,4 +77,24 @@ class SKUSearchViewSet(HaystackViewSet):
     """
     index_models = [SKU]
 
-    serializer_class = SKUIndexSerializer
\ No newline at end of file
+    serializer_class = SKUIndexSerializer
+
+    def list(self, request, *args, **kwargs):
+        # 使用搜索结果缓存, 只返回索引中存储的字段
+        paginator = self.paginator
+        page_size = paginator.get_page_size(request)
+        page = paginator.get_requested_page(request)
+        count, results = search_skus(request.query_params.get('text', ''), page, page_size)
+        return paginator.build_paginated_response(request, page, page_size, count, results)
+
+
+class SKUSuggestView(APIView):
+    """
+    搜索建议
+    """
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', constants.SUGGEST_TOP_K)), constants.SUGGEST_TOP_K))
+        except ValueError:
+            limit = constants.SUGGEST_TOP_K
+        return Response(suggest.suggest(request.query_params.get('q', ''), limit))
@@ -0,0 +1,9 @@
+# 扣减库存遇到锁冲突(死锁/锁等待超时)时的最大尝试次数
+STOCK_RESERVE_MAX_ATTEMPTS = 3
+
+# 锁冲突重试的退避基数, 单位秒, 第n次重试等待 基数 * 2^n (附带随机抖动)
+STOCK_RESERVE_BACKOFF = 0.05
+
+# 库存争用计数保存在redis中的键, 按sku_id分别计数
+STOCK_CONTENTION_RETRY_KEY = 'stock_contention_retry'
+STOCK_CONTENTION_SOLDOUT_KEY = 'stock_contention_soldout'
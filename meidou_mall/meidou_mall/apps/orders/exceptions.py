@@ -0,0 +1,5 @@
+class StockInsufficientError(Exception):
+    """商品库存不足"""
+    def __init__(self, sku=None):
+        super().__init__(sku)
+        self.sku = sku  # 库存不足的商品, 无法确定时为None
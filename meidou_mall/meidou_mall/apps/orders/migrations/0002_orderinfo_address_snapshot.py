@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_address_snapshot(apps, schema_editor):
+    """为已有订单填写收货地址快照"""
+    OrderInfo = apps.get_model('orders', 'OrderInfo')
+    orders = OrderInfo.objects.select_related('address__province', 'address__city', 'address__district')
+    for order in orders.iterator():
+        address = order.address
+        order.receiver = address.receiver
+        order.receiver_mobile = address.mobile
+        order.receiver_address = ' '.join([
+            address.province.name, address.city.name, address.district.name, address.place
+        ])
+        order.save(update_fields=['receiver', 'receiver_mobile', 'receiver_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('users', '0003_auto_20190707_2110'),
+        ('areas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderinfo',
+            name='receiver',
+            field=models.CharField(default='', max_length=20, verbose_name='收货人'),
+        ),
+        migrations.AddField(
+            model_name='orderinfo',
+            name='receiver_mobile',
+            field=models.CharField(default='', max_length=11, verbose_name='收货人手机'),
+        ),
+        migrations.AddField(
+            model_name='orderinfo',
+            name='receiver_address',
+            field=models.CharField(default='', max_length=120, verbose_name='收货地址'),
+        ),
+        migrations.RunPython(fill_address_snapshot, migrations.RunPython.noop),
+    ]
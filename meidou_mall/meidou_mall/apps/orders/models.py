@@ -39,6 +39,10 @@ class OrderInfo(BaseModel):
     order_id = models.CharField(max_length=64, primary_key=True, verbose_name="订单号")
     user = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name="下单用户")
     address = models.ForeignKey(Address, on_delete=models.PROTECT, verbose_name="收获地址")
+    # 下单时的收货地址快照, 查看订单时不需要再查询地址表和省市区表, 用户之后修改地址也不影响订单
+    receiver = models.CharField(max_length=20, default='', verbose_name="收货人")
+    receiver_mobile = models.CharField(max_length=11, default='', verbose_name="收货人手机")
+    receiver_address = models.CharField(max_length=120, default='', verbose_name="收货地址")
     total_count = models.IntegerField(default=1, verbose_name="商品总数")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="商品总金额")
     freight = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="运费")
@@ -1,12 +1,19 @@
 import logging
 from decimal import Decimal
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
-from django_redis import get_redis_connection
 from rest_framework import serializers
 
+from carts.store import RedisCartStore
+from goods import changes, inventory, listing
 from goods.models import SKU
+from meidou_mall.utils.db_router import use_primary
+from orders import constants
+from orders.exceptions import StockInsufficientError
 from orders.models import OrderInfo, OrderGoods
+from orders.utils import decrement_stock, record_stock_contention, retry_on_lock_conflict
+from users.utils import format_address
 
 logger = logging.getLogger('django')
 
@@ -54,30 +61,45 @@ class SaveOrderSerializer(serializers.ModelSerializer):
         # 获取用户对象  user
         user = self.context['request'].user
 
-        # 查询购物车redis  sku_id  count  selected
-        redis_conn = get_redis_connection('cart')
-        # hash 商品数量
-        redis_cart_dict = redis_conn.hgetall('cart_%s' % user.id)
-        # set 勾选商品
-        redis_cart_selected = redis_conn.smembers('cart_selected_%s' % user.id)
-
-        # 勾选商品的信息
-        cart = {}
+        # 查询购物车redis中勾选的商品
+        cart_store = RedisCartStore(user.id)
+        cart = cart_store.get_selected()
         # cart = {
         #     sku_id: count
         # }
-        for sku_id in redis_cart_selected:
-            cart[int(sku_id)] = int(redis_cart_dict[sku_id])
 
         if not cart:
             raise serializers.ValidationError('没有需要结算的商品')
 
-        # 创建事务  开启一个事务
-        with transaction.atomic():
-            try:
-                # 创建保存点
-                save_id = transaction.savepoint()
-
+        # 查询商品数据库, 获取商品数据(价格), 库存以扣减时的条件更新为准
+        with use_primary():
+            sku_obj_list = list(SKU.objects.filter(id__in=cart.keys()))
+        if len(sku_obj_list) != len(cart):
+            raise serializers.ValidationError('商品不存在')
+
+        # 订单商品总数和总金额
+        total_count = 0
+        total_amount = Decimal('0')
+        for sku in sku_obj_list:
+            total_count += cart[sku.id]
+            total_amount += sku.price * cart[sku.id]
+
+        # 需要扣减数据库库存的商品
+        db_cart = cart
+        # 已在redis中预扣库存的商品
+        redis_reserved = {}
+        if settings.STOCK_REDIS_PREDECREMENT:
+            redis_reserved, short_sku_id = inventory.reserve_stock(cart)
+            if redis_reserved is None:
+                record_stock_contention(constants.STOCK_CONTENTION_SOLDOUT_KEY, [short_sku_id])
+                sku_name = {sku.id: sku.name for sku in sku_obj_list}[short_sku_id]
+                raise serializers.ValidationError('商品%s库存不足' % sku_name)
+            # 未镜像到redis的商品仍然扣减数据库库存
+            db_cart = {sku_id: count for sku_id, count in cart.items() if sku_id not in redis_reserved}
+
+        def save_order():
+            # 创建事务  开启一个事务, 出现异常时整体回滚
+            with transaction.atomic():
                 # 保存订单
                 # 生成订单编号order_id   20190716175830 + 9位用户id
                 order_id = timezone.now().strftime('%Y%m%d%H%M%S') + ('%09d' % user.id)
@@ -87,83 +109,53 @@ class SaveOrderSerializer(serializers.ModelSerializer):
                     order_id = order_id,
                     user = user,
                     address = address,
-                    total_count = 0,
-                    total_amount = 0,
+                    receiver = address.receiver,
+                    receiver_mobile = address.mobile,
+                    receiver_address = format_address(address),
+                    total_count = total_count,
+                    total_amount = total_amount,
                     freight = Decimal('10.00'),
                     pay_method = pay_method,
                     # 如果pay_method支付方式等于1(货到付款),status就等于2,待发货
                     status = OrderInfo.ORDER_STATUS_ENUM['UNSEND'] if pay_method==OrderInfo.PAY_METHODS_ENUM['CASH'] else OrderInfo.ORDER_STATUS_ENUM['UNPAID']
                 )
 
-                # 查询商品数据库, 获取商品数据(库存)
-                sku_id_list = cart.keys()
-                # sku_obj_list = SKU.objects.filter(id__in=sku_id_list)
-
-                # 遍历需要结算的商品数据
-                for sku_id in sku_id_list:
-                    while True:
-                        # 查询商品的最新库存信息
-                        sku = SKU.objects.get(id=sku_id)
-
-                        # 用户需要购买的数量
-                        sku_count = cart[sku.id]
-                        origin_stock = sku.stock
-                        origin_sales = sku.sales
-
-                        # 判断库存
-                        if origin_stock < sku_count:
-                            # 回滚到保存点
-                            transaction.savepoint_rollback(save_id)
-                            raise serializers.ValidationError('商品%s库存不足' % sku.name)
-
-                        # 库存减少 销量增加
-                        # sku.stock -= sku_count
-                        # sku.sales += sku_count
-                        # sku.save()
-                        # 解决并发问题
-                        new_stock = origin_stock - sku_count
-                        new_sales = origin_sales + sku_count
-
-                        # update返回影响的行数
-                        result = SKU.objects.filter(id=sku.id, stock=origin_stock).update(stock=new_stock, sales=new_sales)
-
-                        if result == 0:
-                            # 表示更新失败, 有人抢了商品
-                            # 结束本次while循环,进行下一次while循环
-                            continue
-
-                        order.total_count += sku_count
-                        order.total_amount += (sku.price * sku_count)
-
-                        # 创建订单商品信息 表记录OrderGoods
-                        OrderGoods.objects.create(
-                            order = order,
-                            sku = sku,
-                            count = sku_count,
-                            price = sku.price,
-                        )
-                        #　跳出ｗｈｉｌｅ循环，进行ｆｏｒ循环
-                        break
-
-                order.save()   # 更新订单基本信息中的总商品数和总金额
-            except serializers.ValidationError:
-                raise   # 直接抛出
-            except Exception as e:
-                logger.error(e)
-                transaction.savepoint_rollback(save_id)
-                raise  # 捕获完非验证错误,记录完日志,页抛出
-            else:
-                # 提交事务
-                transaction.savepoint_commit(save_id)
+                # 一条语句扣减所有商品的库存, 增加销量
+                if db_cart:
+                    decrement_stock(db_cart)
+
+                # 批量创建订单商品信息 表记录OrderGoods
+                OrderGoods.objects.bulk_create([
+                    OrderGoods(
+                        order = order,
+                        sku = sku,
+                        count = cart[sku.id],
+                        price = sku.price,
+                    ) for sku in sku_obj_list
+                ])
+
+            return order
+
+        try:
+            # 遇到锁冲突时整个事务退避重试
+            order = retry_on_lock_conflict(save_order, db_cart.keys())
+        except StockInsufficientError as e:
+            inventory.release_stock(redis_reserved)
+            record_stock_contention(constants.STOCK_CONTENTION_SOLDOUT_KEY, [e.sku.id] if e.sku else db_cart.keys())
+            raise serializers.ValidationError('商品%s库存不足' % (e.sku.name if e.sku else ''))
+        except Exception as e:
+            logger.error(e)
+            # 订单保存失败, 归还redis中预扣的库存
+            inventory.release_stock(redis_reserved)
+            raise  # 捕获完非验证错误,记录完日志,页抛出
+
+        # 更新分类列表的销量排序
+        listing.incr_sales_index({sku: cart[sku.id] for sku in sku_obj_list})
+        # 搜索建议等进程内索引按销量排序
+        changes.record_changes('sku', cart.keys())
 
         # 删除购物车中已结算的商品
-        pl = redis_conn.pipeline()
-        # hash
-        pl.hdel('cart_%s' % user.id, *redis_cart_selected)
-        # set
-        pl.srem('cart_selected_%s' % user.id, *redis_cart_selected)
-
-        pl.execute()
+        cart_store.remove_many(list(cart.keys()))
 
         # 返回OrderInfo对象
         return order
\ No newline at end of file
@@ -0,0 +1,113 @@
+import logging
+import random
+import time
+
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django_redis import get_redis_connection
+
+from goods.models import SKU
+from orders import constants
+from orders.exceptions import StockInsufficientError
+
+logger = logging.getLogger('django')
+
+# MySQL锁等待超时与死锁的错误码, 出现时数据库已回滚, 整个事务可以安全重试
+LOCK_CONFLICT_ERROR_CODES = (1205, 1213)
+
+
+def decrement_stock(cart):
+    """
+    用一条条件更新语句扣减订单中所有商品的库存并增加销量
+    UPDATE tb_sku SET stock = CASE WHEN id=1 THEN stock-2 ... END, sales = CASE ... END
+    WHERE (id=1 AND stock>=2) OR (id=3 AND stock>=1) ...
+    必须在事务中调用
+    :param cart: 需要扣减的商品 {sku_id: count}
+    :return: None, 有商品库存不足时抛出StockInsufficientError, 此时本次扣减已全部回滚
+    """
+    condition = Q()
+    stock_cases = []
+    sales_cases = []
+    for sku_id, count in cart.items():
+        condition |= Q(id=sku_id, stock__gte=count)
+        stock_cases.append(When(id=sku_id, then=F('stock') - count))
+        sales_cases.append(When(id=sku_id, then=F('sales') + count))
+
+    try:
+        # 保存点, 部分商品库存不足时撤销其他商品已经扣减的库存
+        with transaction.atomic():
+            # update返回影响的行数, 只有所有商品库存都充足时才等于商品种数
+            result = SKU.objects.filter(condition).update(
+                stock=Case(*stock_cases, output_field=IntegerField()),
+                sales=Case(*sales_cases, output_field=IntegerField()),
+            )
+            if result != len(cart):
+                raise StockInsufficientError()
+    except StockInsufficientError:
+        # 找出库存不足的商品, 用于提示用户
+        for sku in SKU.objects.filter(id__in=cart.keys()):
+            if sku.stock < cart[sku.id]:
+                raise StockInsufficientError(sku)
+        raise
+
+
+def is_lock_conflict(error):
+    """判断数据库异常是否为锁冲突"""
+    return bool(error.args) and error.args[0] in LOCK_CONFLICT_ERROR_CODES
+
+
+def retry_on_lock_conflict(func, sku_ids):
+    """
+    执行包含库存扣减的事务, 遇到锁冲突时有限次退避重试
+    :param func: 执行完整事务的函数, 每次尝试都会重新调用
+    :param sku_ids: 事务中扣减库存的商品, 用于记录争用次数
+    :return: func的返回值
+    """
+    for attempt in range(constants.STOCK_RESERVE_MAX_ATTEMPTS):
+        try:
+            return func()
+        except OperationalError as e:
+            if not is_lock_conflict(e) or attempt == constants.STOCK_RESERVE_MAX_ATTEMPTS - 1:
+                raise
+
+            logger.warning('扣减库存锁冲突[重试][ sku: %s, 第%d次, message: %s]' % (list(sku_ids), attempt + 1, e))
+            record_stock_contention(constants.STOCK_CONTENTION_RETRY_KEY, sku_ids)
+
+            # 指数退避, 加随机抖动避免冲突的请求同时重试
+            backoff = constants.STOCK_RESERVE_BACKOFF * (2 ** attempt)
+            time.sleep(backoff + random.uniform(0, backoff))
+
+
+def record_stock_contention(key, sku_ids):
+    """
+    累加商品的库存争用次数
+    :param key: 计数类型对应的redis hash键
+    :param sku_ids: 发生争用的商品
+    """
+    try:
+        redis_conn = get_redis_connection('default')
+        pl = redis_conn.pipeline()
+        for sku_id in sku_ids:
+            pl.hincrby(key, sku_id, 1)
+        pl.execute()
+    except Exception as e:
+        # 计数失败不影响下单
+        logger.error('记录库存争用次数失败: %s' % e)
+
+
+def get_stock_contention():
+    """
+    查询各商品的库存争用次数
+    :return: {sku_id: {'retry': 锁冲突重试次数, 'soldout': 库存不足次数}}
+    """
+    redis_conn = get_redis_connection('default')
+    pl = redis_conn.pipeline()
+    pl.hgetall(constants.STOCK_CONTENTION_RETRY_KEY)
+    pl.hgetall(constants.STOCK_CONTENTION_SOLDOUT_KEY)
+    retry_dict, soldout_dict = pl.execute()
+
+    contention = {}
+    for name, counts in (('retry', retry_dict), ('soldout', soldout_dict)):
+        for sku_id, count in counts.items():
+            contention.setdefault(int(sku_id), {'retry': 0, 'soldout': 0})[name] = int(count)
+    return contention
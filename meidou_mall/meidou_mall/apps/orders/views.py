@@ -1,6 +1,5 @@
 from decimal import Decimal
 from django.shortcuts import render
-from django_redis import get_redis_connection
 from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -8,7 +7,8 @@ from rest_framework.views import APIView
 
 # Create your views here.
 from carts.serializers import CartSKUSerializer
-from goods.models import SKU
+from carts.store import RedisCartStore
+from goods.summary import get_sku_summaries
 from orders.serializers import OrderSettlementSerializer, SaveOrderSerializer
 
 
@@ -22,24 +22,18 @@ class OrderSettlementView(APIView):
         # 获取用户对象 user
         user = request.user
 
-        # 从redis中查询购物车  sku_id   count  selected
-        # 1.创建redis连接对象
-        redis_conn = get_redis_connection('cart')
-        # 2. hash  商品数量
-        redis_cart_dict = redis_conn.hgetall('cart_%s' % user.id)
-        # 3.set  勾选商品
-        redis_cart_selected = redis_conn.smembers('cart_selected_%s' % user.id)
+        # 从redis中查询购物车勾选的商品  {sku_id: count}
+        cart = RedisCartStore(user.id).get_selected()
 
-        cart = {}
-        for sku_id in redis_cart_selected:
-            cart[int(sku_id)] = int(redis_cart_dict[sku_id])
+        # 查询商品摘要缓存
+        sku_summaries = get_sku_summaries(cart.keys())
 
-        # 查询数据库
-        sku_id_list = cart.keys()
-        sku_obj_list = SKU.objects.filter(id__in=sku_id_list)
-
-        for sku in sku_obj_list:
-            sku.count = cart[sku.id]
+        sku_obj_list = []
+        for sku_id, count in cart.items():
+            sku = sku_summaries.get(sku_id)
+            if sku is not None:
+                sku['count'] = count
+                sku_obj_list.append(sku)
 
         # 运费
         freight = Decimal('10.00')
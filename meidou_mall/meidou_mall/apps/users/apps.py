@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     name = 'users'
     verbose_name = '用户'
+
+    def ready(self):
+        # 注册信号处理函数
+        from users import signals
@@ -3,5 +3,8 @@ VERIFY_EMAIL_TOKEN_EXPIRES = 24 * 60 * 60
 # 用户收货地址保存上限数量
 USER_ADDRESS_COUNTS_LIMIT = 20
 
-# 历史浏览保存数量
-USER_BROWSING_HISTORY_COUNTS_LIMIT = 5
\ No newline at end of file
+# 历史浏览保存数量, 可在配置文件中用同名配置项修改
+USER_BROWSING_HISTORY_COUNTS_LIMIT = 5
+
+# 浏览记录redis list键, 只保存sku_id整数, 短列表由redis紧凑编码(listpack)保存
+USER_BROWSING_HISTORY_KEY = 'history_%s'
\ No newline at end of file
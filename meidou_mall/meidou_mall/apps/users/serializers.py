@@ -4,10 +4,13 @@ from django_redis import get_redis_connection
 from rest_framework import serializers
 from rest_framework_jwt.settings import api_settings
 
+from areas.tree import get_area_tree
 from celery_tasks.email.task import send_active_email
 from goods.models import SKU
+from goods.summary import get_sku_summaries
 from users import constants
 from users.models import User, Address
+from users.utils import get_browsing_history_limit
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -121,11 +124,17 @@ class EmailSerializer(serializers.ModelSerializer):
         return instance
 
 
+class AreaNameField(serializers.ReadOnlyField):
+    '''省市区名称, 从进程内省市区树查询, 不查询数据库'''
+    def to_representation(self, value):
+        return get_area_tree().get_name(value)
+
+
 class UserAddressSerializer(serializers.ModelSerializer):
     '''用户地址序列化器'''
-    province = serializers.StringRelatedField(read_only=True)
-    city = serializers.StringRelatedField(read_only=True)
-    district = serializers.StringRelatedField(read_only=True)
+    province = AreaNameField(source='province_id')
+    city = AreaNameField(source='city_id')
+    district = AreaNameField(source='district_id')
     province_id = serializers.IntegerField(label='省ID', required=True)
     city_id = serializers.IntegerField(label='市ID', required=True)
     district_id = serializers.IntegerField(label='区ID', required=True)
@@ -167,9 +176,8 @@ class AddUserBrowsingHistorySerializer(serializers.Serializer):
         :param value:
         :return:
         """
-        try:
-            SKU.objects.get(id=value)
-        except SKU.DoesNotExit:
+        # 商品摘要有缓存, 不必每次查询数据库
+        if not get_sku_summaries([value]):
             raise serializers.ValidationError('该商品不存在')
         return value
 
@@ -187,13 +195,14 @@ class AddUserBrowsingHistorySerializer(serializers.Serializer):
         # Pipeline < ConnectionPool < Connection < host = 127.0.0.1, port = 6379, db = 3 >> > 2222222222222
         
         # 移除已存在的本商品浏览记录
-        pl.lrem('history_%s' % user_id, 0, sku_id)
+        history_key = constants.USER_BROWSING_HISTORY_KEY % user_id
+        pl.lrem(history_key, 0, sku_id)
 
         # 添加新的浏览记录
-        pl.lpush('history_%s' % user_id, sku_id)
+        pl.lpush(history_key, sku_id)
 
-        # 只保存最多5条记录
-        pl.ltrim('history_%s' % user_id, 0, constants.USER_BROWSING_HISTORY_COUNTS_LIMIT - 1)
+        # 只保存最多 USER_BROWSING_HISTORY_COUNTS_LIMIT 条记录
+        pl.ltrim(history_key, 0, get_browsing_history_limit() - 1)
 
         pl.execute()
         # print(validated_data, 33333333333333)
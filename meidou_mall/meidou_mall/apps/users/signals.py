@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from meidou_mall.utils.cache_response import invalidate_cache_tags
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+def clear_user_detail_cache(sender, instance, **kwargs):
+    """用户信息修改(如邮箱验证)后, 事务提交后用户详情接口缓存失效"""
+    tag = 'user:%s' % instance.id
+    transaction.on_commit(lambda: invalidate_cache_tags(tag))
@@ -1,7 +1,10 @@
 import re
 
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 
+from areas.tree import get_area_tree
+from users import constants
 from users.models import User
 
 
@@ -13,6 +16,22 @@ def jwt_response_payload_handler(token, user=None, request=None):
         'username': user.username
     }
 
+def get_browsing_history_limit():
+    '''浏览记录保存数量, 配置文件中可以修改, 默认使用constants中的数量'''
+    return getattr(settings, 'USER_BROWSING_HISTORY_COUNTS_LIMIT', constants.USER_BROWSING_HISTORY_COUNTS_LIMIT)
+
+
+def format_address(address):
+    '''完整的收货地址文字: 省 市 区 详细地址, 省市区名称从进程内省市区树查询'''
+    tree = get_area_tree()
+    return ' '.join([
+        tree.get_name(address.province_id) or '',
+        tree.get_name(address.city_id) or '',
+        tree.get_name(address.district_id) or '',
+        address.place,
+    ])
+
+
 def get_user_by_account(account):
     """
     根据账号获取user对象
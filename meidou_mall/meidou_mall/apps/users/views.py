@@ -13,9 +13,11 @@ from rest_framework.viewsets import GenericViewSet
 from rest_framework_jwt.views import ObtainJSONWebToken
 
 from carts.utils import merge_cart_cookie_to_redis
-from goods.models import SKU
+from goods.summary import get_sku_summaries
+from meidou_mall.utils.cache_response import cache_response, user_key_func
 from users import constants
 from users.models import User
+from users.utils import get_browsing_history_limit
 from users.serializers import CreateUserSerializer, UserDetailSerializer, EmailSerializer, UserAddressSerializer, AddressTitleSerializer, AddUserBrowsingHistorySerializer, SKUserializer
 
 
@@ -75,6 +77,10 @@ class UserDetailView(RetrieveAPIView):
         # 在django的请求request对象中,user属性表明当前请求的用户
         return self.request.user
 
+    @cache_response(timeout=5 * 60, key_func=user_key_func, tags=('user:{user_id}',))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 # PUT /email/
 class EmailView(UpdateAPIView):
@@ -174,14 +180,20 @@ class UserBrowsingHistoryView(CreateAPIView):
     def get(self, request):
         user_id = request.user.id
 
-        # 查询redis list
+        # 返回的记录数量, 可以通过limit参数减少, 最多为保存的数量
+        history_limit = get_browsing_history_limit()
+        try:
+            limit = min(int(request.query_params.get('limit', history_limit)), history_limit)
+        except ValueError:
+            limit = history_limit
+
+        # 查询redis list, 一次取出全部sku_id
         redis_conn = get_redis_connection('history')
-        sku_id_list = redis_conn.lrange('history_%s' % user_id, 0, constants.USER_BROWSING_HISTORY_COUNTS_LIMIT-1)
+        sku_id_list = redis_conn.lrange(constants.USER_BROWSING_HISTORY_KEY % user_id, 0, limit - 1) if limit > 0 else []
 
-        skus =[]
-        for sku_id in sku_id_list:
-            sku = SKU.objects.get(id=sku_id)
-            skus.append(sku)
+        # 批量查询商品摘要缓存, 按浏览记录的顺序返回
+        sku_summaries = get_sku_summaries(sku_id_list)
+        skus = [sku_summaries[int(sku_id)] for sku_id in sku_id_list if int(sku_id) in sku_summaries]
 
         # 序列化 返回
         serializer = SKUserializer(skus, many=True)
@@ -0,0 +1,18 @@
+"""
+ASGI config for the async cart API, see carts/asgi.py
+Requires redis-py >= 4.2 (redis.asyncio) and an ASGI server such as uvicorn.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meidou_mall.settings.prod")
+
+django.setup()
+
+from carts.asgi import CartApplication  # noqa: E402
+
+application = CartApplication()
@@ -73,6 +73,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'meidou_mall.utils.db_router.PrimaryPinMiddleware',  # 写入数据库后一段时间内读主库
+    'meidou_mall.utils.db_connections.DBConnectionHealthMiddleware',  # 检查空闲的持久连接
 ]
 
 ROOT_URLCONF = 'meidou_mall.urls'
@@ -107,6 +109,7 @@ DATABASES = {
         'USER':'meiduo',
         'PASSWORD':'meiduo',
         'NAME': 'meiduo_mall',
+        'CONN_MAX_AGE': 5 * 60,  # 持久连接的最长使用时间, 单位秒
     },
     'slave': {
         'ENGINE': 'django.db.backends.mysql',
@@ -114,9 +117,15 @@ DATABASES = {
         'PORT': 8306,
         'USER': 'root',
         'PASSWORD': 'mysql',
-        'NAME': 'meiduo_mall'
+        'NAME': 'meiduo_mall',
+        'CONN_MAX_AGE': 5 * 60,
     }
 }
+# 多线程运行时可以使用带连接池的后端: 'ENGINE': 'meidou_mall.utils.db_pool', 'CONN_MAX_AGE': 0,
+# 'POOL': {'MAX_SIZE': 10, 'RECYCLE': 60 * 60}, 见 meidou_mall/utils/db_pool/base.py
+
+# 持久连接空闲超过这个秒数后, 请求开始时先检查连接是否可用
+DATABASE_HEALTH_CHECK_INTERVAL = 30
 
 
 # Password validation
@@ -326,9 +335,9 @@ GENERATED_STATIC_HTML_FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(B
 
 # 定时任务
 CRONJOBS = [
-    # 每5分钟执行一次生成主页静态文件
+    # 每5分钟执行一次, 重新生成有数据修改的静态页面(正常由celery任务生成, 此处兜底)
     # ('*/1 * * * *', 'contents.crons.generate_static_index_html', '>> /home/python/Desktop/django_linegoods/meidou_mall/logs/crontab.log')
-    ('*/5 * * * *', 'contents.crons.generate_static_index_html', '>> '+ os.path.join(os.path.dirname(BASE_DIR)) + "/logs/crontab1.log")
+    ('*/5 * * * *', 'contents.crons.rebuild_dirty_static_pages', '>> '+ os.path.join(os.path.dirname(BASE_DIR)) + "/logs/crontab1.log")
 ]
 # 解决crontab中文问题
 CRONTAB_COMMAND_PREFIX = 'LANG_ALL=zh_cn.UTF-8'
@@ -341,15 +350,38 @@ HAYSTACK_CONNECTIONS = {
         'INDEX_NAME': 'meiduo_mall',  # 指定elasticsearch建立的索引库的名称
     },
 }
+# 也可以使用进程内的本地搜索引擎, 不需要Elasticsearch, 查询不经过网络, 见 meidou_mall/utils/search
+# HAYSTACK_CONNECTIONS = {
+#     'default': {
+#         'ENGINE': 'meidou_mall.utils.search.backend.LocalSearchEngine',
+#         'PATH': os.path.join(os.path.dirname(BASE_DIR), 'search_index'),  # 索引目录
+#     },
+# }
 
-# 当添加、修改、删除数据时，自动生成索引
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+# 当添加、修改、删除数据时，记录到redis中, 由celery定时任务批量更新索引
+HAYSTACK_SIGNAL_PROCESSOR = 'meidou_mall.utils.search_queue.QueuedSignalProcessor'
 
 # 支付宝
 ALIPAY_APPID = "2016100100642486"
 ALIPAY_URL = "https://openapi.alipaydev.com/gateway.do"
 ALIPAY_DEBUG = True
 
+# 用户浏览记录保存数量, 增加数量不会增加查询数据库的次数
+USER_BROWSING_HISTORY_COUNTS_LIMIT = 5
+
+# 下单时在redis中预扣已镜像商品的库存, 由celery定时任务把销量批量同步到数据库
+# 开启前需执行 scripts/load_stock_to_redis.py 镜像库存
+STOCK_REDIS_PREDECREMENT = False
+
+# 从库及其权重, 读操作按权重在可用的从库之间轮询
+DATABASE_REPLICAS = {'slave': 1}
+# 写入数据库后的这段时间内读主库, 单位秒
+DATABASE_PRIMARY_PIN_SECONDS = 5
+# 从库复制延迟超过这个秒数时暂停使用, None为不检查(需要数据库用户有 REPLICATION CLIENT 权限)
+DATABASE_REPLICA_MAX_LAG = 5
+# 检查从库复制延迟的间隔, 单位秒
+DATABASE_REPLICA_CHECK_INTERVAL = 10
+
 # 配置读写分离
 DATABASE_ROUTERS = ['meidou_mall.utils.db_router.MasterSlaveDBRouter']
 
@@ -0,0 +1,149 @@
+"""
+接口响应缓存
+
+- 每个视图可以指定缓存键函数, 默认按 视图 + 请求参数 + url参数 生成
+- 缓存带有标签, 模型修改时通过信号使标签失效, 带有该标签的缓存全部失效
+  标签的版本号是缓存键的一部分, 失效时版本号加1, 旧的缓存不再被读取, 到期后自动删除
+- 标签在事务提交后失效(由信号处理函数通过 transaction.on_commit 调用), 失效后的 CACHE_RESPONSE_PRIMARY_SECONDS 秒内
+  重新查询使用主库, 避免从库的旧数据被缓存到下次修改
+- 过了新鲜期但仍在陈旧期内的缓存: 一个请求重新查询并更新缓存, 其他请求直接返回旧的缓存
+- 命中/未命中/陈旧 次数记录在redis hash中
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from rest_framework.response import Response
+
+from meidou_mall.utils.db_router import use_primary
+
+# 默认新鲜期, 单位秒
+CACHE_RESPONSE_TIMEOUT = 60
+
+# 默认陈旧期, 单位秒, 新鲜期过后的这段时间内仍可返回旧的缓存
+CACHE_RESPONSE_STALE_TIMEOUT = 5 * 60
+
+# 重新查询的锁的有效期, 单位秒
+CACHE_RESPONSE_LOCK_EXPIRES = 10
+
+# 标签失效后重新查询使用主库的时长, 单位秒, 不短于从库允许的复制延迟
+CACHE_RESPONSE_PRIMARY_SECONDS = 10
+
+# 标签版本号缓存键
+CACHE_TAG_VERSION_KEY = 'cache_tag_%s'
+
+# 标签最近失效的标记缓存键, CACHE_RESPONSE_PRIMARY_SECONDS 秒后过期
+CACHE_TAG_INVALIDATED_KEY = 'cache_tag_invalidated_%s'
+
+# 命中统计 redis hash {'视图名:hit': 次数, '视图名:miss': 次数, '视图名:stale': 次数}
+CACHE_RESPONSE_METRICS_KEY = 'cache_response_metrics'
+
+
+def query_params_key_func(view, request, args, kwargs):
+    """按 视图 + 请求参数 + url参数 生成缓存键, 用于与用户无关的接口"""
+    return '%s.%s:%s:%s' % (
+        view.__class__.__name__,
+        getattr(view, 'action', None) or request.method.lower(),
+        sorted(kwargs.items()),
+        sorted(request.query_params.lists()),
+    )
+
+
+def user_key_func(view, request, args, kwargs):
+    """每个用户单独缓存"""
+    return '%s:user=%s' % (query_params_key_func(view, request, args, kwargs), request.user.id)
+
+
+def _get_tag_versions(tags):
+    """
+    :return: (版本号列表, 是否有标签刚失效)
+    """
+    keys = [CACHE_TAG_VERSION_KEY % tag for tag in tags]
+    invalidated_keys = [CACHE_TAG_INVALIDATED_KEY % tag for tag in tags]
+    values = cache.get_many(keys + invalidated_keys)
+    return [values.get(key, 0) for key in keys], any(key in values for key in invalidated_keys)
+
+
+def invalidate_cache_tags(*tags):
+    """使带有这些标签的缓存失效, 在事务中修改数据时应在事务提交后调用"""
+    for tag in tags:
+        # 先标记再修改版本号, 新版本的第一次查询一定使用主库
+        cache.set(CACHE_TAG_INVALIDATED_KEY % tag, 1, CACHE_RESPONSE_PRIMARY_SECONDS)
+        key = CACHE_TAG_VERSION_KEY % tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 版本号不存在, 缓存时按0处理
+            cache.set(key, 1, None)
+
+
+def _record(view_name, result):
+    get_redis_connection('default').hincrby(CACHE_RESPONSE_METRICS_KEY, '%s:%s' % (view_name, result), 1)
+
+
+def get_cache_response_metrics():
+    """
+    :return: {视图名: {'hit': 次数, 'miss': 次数, 'stale': 次数}}
+    """
+    metrics = {}
+    for field, count in get_redis_connection('default').hgetall(CACHE_RESPONSE_METRICS_KEY).items():
+        view_name, result = field.decode().rsplit(':', 1)
+        metrics.setdefault(view_name, {'hit': 0, 'miss': 0, 'stale': 0})[result] = int(count)
+    return metrics
+
+
+def cache_response(timeout=None, stale_timeout=None, key_func=query_params_key_func, tags=()):
+    """
+    缓存视图方法(get/list/retrieve)的响应, 只缓存状态码200的响应
+    :param timeout: 新鲜期
+    :param stale_timeout: 陈旧期
+    :param key_func: 缓存键函数 key_func(view, request, args, kwargs)
+    :param tags: 标签, 可以使用url参数和当前用户id, 如 'sku_list:{category_id}', 'user:{user_id}'
+    """
+    timeout = CACHE_RESPONSE_TIMEOUT if timeout is None else timeout
+    stale_timeout = CACHE_RESPONSE_STALE_TIMEOUT if stale_timeout is None else stale_timeout
+
+    def decorator(func):
+        @wraps(func)
+        def inner(self, request, *args, **kwargs):
+            view_name = self.__class__.__name__
+            tag_list = [tag.format(user_id=request.user.id, **kwargs) for tag in tags]
+            base_key = key_func(self, request, args, kwargs)
+            versions, invalidated = _get_tag_versions(tag_list)
+            key = 'cache_response:' + hashlib.md5(('%s:%s' % (base_key, versions)).encode()).hexdigest()
+            lock_key = key + ':lock'
+
+            entry = cache.get(key)
+            locked = False
+            if entry is not None:
+                fresh_until, status, data = entry
+                if time.time() < fresh_until:
+                    _record(view_name, 'hit')
+                    return Response(data, status=status)
+                # 已过新鲜期, 只有取得锁的请求重新查询
+                locked = cache.add(lock_key, 1, CACHE_RESPONSE_LOCK_EXPIRES)
+                if not locked:
+                    _record(view_name, 'stale')
+                    return Response(data, status=status)
+
+            _record(view_name, 'miss')
+            try:
+                if invalidated:
+                    # 从库可能还没有同步刚提交的修改
+                    with use_primary():
+                        response = func(self, request, *args, **kwargs)
+                else:
+                    response = func(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, (time.time() + timeout, response.status_code, response.data),
+                              timeout + stale_timeout)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+
+        return inner
+
+    return decorator
@@ -0,0 +1,76 @@
+"""
+数据库连接管理
+
+- 持久连接(CONN_MAX_AGE > 0)在空闲超过 DATABASE_HEALTH_CHECK_INTERVAL 秒后, 请求开始时先检查连接是否可用,
+  不可用(如被MySQL的wait_timeout断开)时关闭, 由下一次查询重新连接, 避免请求中途报错
+- 按数据库别名统计 新建连接/复用连接/检查失败/丢弃连接 的次数
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_metrics = defaultdict(lambda: defaultdict(int))
+_metrics_lock = threading.Lock()
+
+
+def record(alias, name, count=1):
+    with _metrics_lock:
+        _metrics[alias][name] += count
+
+
+def get_connection_metrics():
+    """
+    :return: {别名: {'connections_created':, 'connects':, 'reuses':, 'health_checks':, 'health_check_failures':, 'discards':}}
+    """
+    with _metrics_lock:
+        return {alias: dict(metrics) for alias, metrics in _metrics.items()}
+
+
+def reset_connection_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+@receiver(connection_created)
+def count_connection_created(sender, connection, **kwargs):
+    """建立连接(包括从连接池取出连接)次数"""
+    record(connection.alias, 'connections_created')
+
+
+def check_connections(interval=None):
+    """检查当前线程中空闲超过interval秒的持久连接"""
+    if interval is None:
+        interval = getattr(settings, 'DATABASE_HEALTH_CHECK_INTERVAL', 30)
+    now = time.time()
+    for conn in connections.all():
+        if conn.connection is None:
+            continue
+        last_used_at = getattr(conn, 'last_used_at', None)
+        if last_used_at is None or now - last_used_at < interval:
+            continue
+        record(conn.alias, 'health_checks')
+        if not conn.is_usable():
+            record(conn.alias, 'health_check_failures')
+            conn.close()
+
+
+class DBConnectionHealthMiddleware(object):
+    """请求开始时检查持久连接"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        check_connections()
+        response = self.get_response(request)
+        # 记录连接的最后使用时间
+        now = time.time()
+        for conn in connections.all():
+            if conn.connection is not None:
+                conn.last_used_at = now
+        return response
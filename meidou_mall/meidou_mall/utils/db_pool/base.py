@@ -0,0 +1,100 @@
+"""
+带进程内连接池的MySQL数据库后端, 用于多线程运行的进程
+
+使用方法, 在DATABASES中:
+    'ENGINE': 'meidou_mall.utils.db_pool',
+    'CONN_MAX_AGE': 0,      # 每个请求结束时把连接归还到连接池
+    'POOL': {
+        'MAX_SIZE': 10,     # 连接池中最多保留的空闲连接数
+        'RECYCLE': 60 * 60, # 连接的最长使用时间, 单位秒, 应小于MySQL的wait_timeout
+    }
+"""
+import queue
+import threading
+import time
+
+from django.db.backends.mysql import base
+
+from meidou_mall.utils import db_connections
+
+# 各数据库的连接池 {别名: ConnectionPool}
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool(object):
+    """空闲连接队列, 取出时检查连接是否可用"""
+
+    def __init__(self, alias, max_size, recycle):
+        self.alias = alias
+        self.recycle = recycle
+        self._idle = queue.LifoQueue(max_size)
+
+    def get(self, connect):
+        """
+        取出一个可用的空闲连接, 没有时新建
+        :param connect: 新建连接的函数
+        """
+        while True:
+            try:
+                raw_conn, created_at = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.time() - created_at > self.recycle:
+                self._discard(raw_conn)
+                continue
+            try:
+                raw_conn.ping()
+            except Exception:
+                db_connections.record(self.alias, 'health_check_failures')
+                self._discard(raw_conn)
+                continue
+            db_connections.record(self.alias, 'reuses')
+            return raw_conn, created_at
+
+        db_connections.record(self.alias, 'connects')
+        return connect(), time.time()
+
+    def put(self, raw_conn, created_at):
+        """归还连接, 连接池已满时关闭"""
+        try:
+            # 不能把未结束的事务留给下一个使用者
+            raw_conn.rollback()
+            self._idle.put_nowait((raw_conn, created_at))
+        except queue.Full:
+            self._discard(raw_conn)
+        except Exception:
+            self._discard(raw_conn)
+
+    def _discard(self, raw_conn):
+        db_connections.record(self.alias, 'discards')
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            options = settings_dict.get('POOL', {})
+            pool = _pools[alias] = ConnectionPool(
+                alias, options.get('MAX_SIZE', 10), options.get('RECYCLE', 60 * 60))
+        return pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict)
+        raw_conn, self._pool_created_at = pool.get(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        return raw_conn
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.errors_occurred:
+            # 出现过错误的连接可能已不可用, 直接关闭
+            return super()._close()
+        get_pool(self.alias, self.settings_dict).put(self.connection, self._pool_created_at)
@@ -1,14 +1,215 @@
+"""
+数据库主从读写分离路由
+
+- 多个从库按权重平滑轮询, 配置 DATABASE_REPLICAS = {别名: 权重}
+- 写数据库后的 DATABASE_PRIMARY_PIN_SECONDS 秒内, 当前请求(以及通过cookie标记的后续请求)的读操作使用主库,
+  保证用户能读到自己刚写入的数据
+- 事务中的读操作、use_primary() 中的读操作(如库存)使用主库
+- 每个进程由一个后台线程每隔 DATABASE_REPLICA_CHECK_INTERVAL 秒检查一次从库的复制延迟(不在请求中检查),
+  超过 DATABASE_REPLICA_MAX_LAG 秒或复制中断的从库暂停使用, 没有可用从库时读主库
+  DATABASE_REPLICA_MAX_LAG 为None时不检查
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('django')
+
+PRIMARY_DB = 'default'
+
+# 标记读主库截止时间的cookie
+PRIMARY_PIN_COOKIE_NAME = 'db_pin'
+
+_local = threading.local()
+
+
+def _get_settings():
+    return (
+        getattr(settings, 'DATABASE_REPLICAS', {'slave': 1}),
+        getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 5),
+        getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5),
+        getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 10),
+    )
+
+
+@contextmanager
+def use_primary():
+    """其中的读操作使用主库, 用于库存等不能读到旧数据的场景, 可以嵌套"""
+    _local.primary_depth = getattr(_local, 'primary_depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.primary_depth -= 1
+
+
+def pin_primary(seconds=None):
+    """当前线程在接下来的一段时间内读主库"""
+    if seconds is None:
+        seconds = _get_settings()[1]
+    _local.pinned_until = max(getattr(_local, 'pinned_until', 0), time.time() + seconds)
+
+
+def get_pinned_until():
+    return getattr(_local, 'pinned_until', 0)
+
+
+def reset_pin(pinned_until=0):
+    """请求开始/结束时重置, 线程会被后续请求复用"""
+    _local.pinned_until = pinned_until
+    _local.primary_depth = 0
+
+
+def _is_primary_read():
+    if getattr(_local, 'primary_depth', 0):
+        return True
+    if getattr(_local, 'pinned_until', 0) > time.time():
+        return True
+    # 主库事务中的读操作与写操作使用同一个连接
+    return connections[PRIMARY_DB].in_atomic_block
+
+
+class ReplicaSelector(object):
+    """从库选择: 按权重平滑轮询, 跳过延迟过大的从库"""
+
+    def __init__(self):
+        # 选择从库的锁, 只保护轮询状态, 不在其中访问数据库
+        self._lock = threading.Lock()
+        self._current = {}
+        # 检查线程整体替换, 选择时不加锁读取
+        self._healthy = {}
+        self._probe_lock = threading.Lock()
+        # 启动检查线程的进程id, fork出的子进程需要重新启动
+        self._probe_pid = None
+
+    def probe_lag(self, alias):
+        """
+        查询从库的复制延迟
+        :return: 延迟秒数, 复制中断或查询失败时返回None
+        """
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SHOW SLAVE STATUS')
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                columns = [column[0] for column in cursor.description]
+                return dict(zip(columns, row)).get('Seconds_Behind_Master')
+        except Exception as e:
+            logger.warning('从库[%s]复制延迟检查失败: %s' % (alias, e))
+            return None
+
+    def check(self, replicas, max_lag):
+        healthy = {}
+        for alias in replicas:
+            lag = self.probe_lag(alias)
+            healthy[alias] = lag is not None and lag <= max_lag
+            if not healthy[alias]:
+                logger.warning('从库[%s]暂停使用, 复制延迟: %s' % (alias, lag))
+            # 检查线程长期运行, 不经过请求结束时的连接清理
+            connections[alias].close_if_unusable_or_obsolete()
+        self._healthy = healthy
+
+    def _probe_loop(self):
+        while True:
+            replicas, _, max_lag, check_interval = _get_settings()
+            try:
+                self.check(replicas, max_lag)
+            except Exception as e:
+                logger.error('从库复制延迟检查异常: %s' % e)
+            time.sleep(check_interval)
+
+    def _ensure_probe(self, max_lag):
+        """在后台线程中定期检查复制延迟, 选择从库时不等待网络请求"""
+        if max_lag is None or self._probe_pid == os.getpid():
+            return
+        with self._probe_lock:
+            if self._probe_pid == os.getpid():
+                return
+            self._probe_pid = os.getpid()
+            thread = threading.Thread(target=self._probe_loop, name='replica-lag-probe')
+            thread.daemon = True
+            thread.start()
+
+    def select(self):
+        replicas, _, max_lag, _ = _get_settings()
+        self._ensure_probe(max_lag)
+        # 不检查复制延迟时全部从库可用, 首次检查完成前也是如此
+        healthy = self._healthy if max_lag is not None else {}
+
+        with self._lock:
+            # 平滑加权轮询: 每次所有从库加上自己的权重, 选中当前值最大的, 选中的减去总权重
+            total = 0
+            best = None
+            for alias, weight in replicas.items():
+                if not healthy.get(alias, True):
+                    continue
+                current = self._current.get(alias, 0) + weight
+                self._current[alias] = current
+                total += weight
+                if best is None or current > self._current[best]:
+                    best = alias
+            if best is None:
+                return PRIMARY_DB
+            self._current[best] -= total
+            return best
+
+    def is_healthy(self, alias):
+        return self._healthy.get(alias, True)
+
+
+replica_selector = ReplicaSelector()
+
+
 class MasterSlaveDBRouter(object):
     """数据库主从读写分离路由"""
 
     def db_for_read(self, model, **hints):
         """读数据库"""
-        return "slave"
+        if _is_primary_read():
+            return PRIMARY_DB
+        return replica_selector.select()
 
     def db_for_write(self, model, **hints):
         """写数据库"""
-        return "default"
+        # 写入后的一段时间内读主库
+        pin_primary()
+        return PRIMARY_DB
 
     def allow_relation(self, obj1, obj2, **hints):
         """是否运行关联操作"""
-        return True
\ No newline at end of file
+        return True
+
+
+class PrimaryPinMiddleware(object):
+    """
+    请求写入数据库后通过cookie标记, 之后一段时间内该客户端的请求读主库
+    例如新增地址后立即查询地址列表
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PRIMARY_PIN_COOKIE_NAME, 0))
+        except ValueError:
+            pinned_until = 0
+        # cookie由客户端保存, 不接受超出标记时长的值
+        pinned_until = min(pinned_until, time.time() + _get_settings()[1])
+        reset_pin(pinned_until)
+
+        try:
+            response = self.get_response(request)
+            new_pinned_until = get_pinned_until()
+            if new_pinned_until > pinned_until:
+                response.set_cookie(PRIMARY_PIN_COOKIE_NAME, '%.3f' % new_pinned_until,
+                                    max_age=int(new_pinned_until - time.time()) + 1)
+        finally:
+            reset_pin()
+
+        return response
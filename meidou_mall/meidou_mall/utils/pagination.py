@@ -1,7 +1,213 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 2
     page_size_query_param = 'page_size'
-    max_page_size = 20
\ No newline at end of file
+    max_page_size = 20
+
+    def get_requested_page(self, request):
+        """请求的页码, 不合法时抛出NotFound"""
+        try:
+            page = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        if page < 1:
+            raise NotFound(self.invalid_page_message)
+        return page
+
+    def build_paginated_response(self, request, page, page_size, count, results):
+        """
+        不经过queryset分页(如从redis索引、缓存中取得一页数据)时, 返回与get_paginated_response相同格式的响应
+        """
+        if page > 1 and not results:
+            raise NotFound(self.invalid_page_message)
+
+        url = request.build_absolute_uri()
+        next_url = None
+        if page * page_size < count:
+            next_url = replace_query_param(url, self.page_query_param, page + 1)
+        previous_url = None
+        if page == 2:
+            previous_url = remove_query_param(url, self.page_query_param)
+        elif page > 2:
+            previous_url = replace_query_param(url, self.page_query_param, page - 1)
+
+        return Response(OrderedDict([
+            ('count', count),
+            ('next', next_url),
+            ('previous', previous_url),
+            ('results', results)
+        ]))
+
+
+class KeysetPagination(BasePagination):
+    """
+    游标分页, 按 (排序字段, id) 定位, 不需要 OFFSET 和 COUNT 查询
+    游标中保存上一页边界数据的 (排序字段值, id), 前面插入或删除数据不会导致后面的页重复或遗漏
+    排序值在两次请求之间变化(如价格修改、销量增加)的数据可能越过游标, 在后面的页中重复出现或被跳过
+    第一页请求时带上空的游标参数 ?cursor=
+    """
+    cursor_query_param = 'cursor'
+    page_size = 2
+    page_size_query_param = 'page_size'
+    max_page_size = 20
+
+    ordering_query_param = 'ordering'
+    # 支持的排序字段
+    ordering_fields = ('create_time', 'price', 'sales')
+    default_ordering = '-create_time'
+
+    # 请求近似总数的参数, 如 ?with_count=1
+    count_query_param = 'with_count'
+    # 近似总数的缓存时间, 单位秒
+    count_cache_expires = 5 * 60
+
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param) or self.default_ordering
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = self.default_ordering
+        return ordering
+
+    def encode_cursor(self, ordering, value, pk, reverse):
+        if not isinstance(value, int):
+            value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        data = json.dumps([ordering, value, pk, reverse], separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, ordering, model=None):
+        """
+        :param model: 查询的模型, 用于把游标中的排序字段值转换为字段类型
+        :return: (排序字段值, id, 是否向前翻页), 第一页返回None
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            cursor_ordering, value, pk, reverse = json.loads(data.decode())
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # 游标只能用于生成它的排序方式
+        if cursor_ordering != ordering:
+            raise NotFound(self.invalid_cursor_message)
+        # 被篡改的游标值(如不是日期的create_time)在构造查询时才报错, 这里先按字段类型转换
+        if model is not None:
+            try:
+                value = model._meta.get_field(ordering.lstrip('-')).to_python(value)
+            except (TypeError, ValueError, ArithmeticError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, bool(reverse)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+
+        cursor = self.decode_cursor(request, self.ordering, queryset.model)
+        reverse = cursor is not None and cursor[2]
+
+        self.count = None
+        if request.query_params.get(self.count_query_param):
+            self.count = self.get_approximate_count(queryset, view)
+
+        # 向前翻页时反向查询, 取到数据后再恢复顺序
+        if descending != reverse:
+            queryset = queryset.order_by('-' + field, '-id')
+            lookup = 'lt'
+        else:
+            queryset = queryset.order_by(field, 'id')
+            lookup = 'gt'
+
+        if cursor is not None:
+            value, pk = cursor[0], cursor[1]
+            queryset = queryset.filter(
+                Q(**{field + '__' + lookup: value}) | Q(**{field: value, 'id__' + lookup: pk})
+            )
+
+        # 多取一条判断是否还有下一页
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.field = field
+        self.results = results
+        if reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        return results
+
+    def get_approximate_count(self, queryset, view):
+        """
+        近似总数, 按视图提供的缓存键缓存, 缓存期内数据的增减不反映在总数中
+        视图可以实现 get_count_cache_key() 返回缓存键, 没有缓存键时不缓存
+        """
+        key = view.get_count_cache_key() if hasattr(view, 'get_count_cache_key') else None
+        if key is None:
+            return queryset.order_by().count()
+
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, self.count_cache_expires)
+        return count
+
+    def _get_link(self, item, reverse):
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self.ordering, getattr(item, self.field), item.pk, reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._get_link(self.results[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.results:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._get_link(self.results[0], True)
+
+    def get_paginated_response(self, data):
+        response_data = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ])
+        if self.count is not None:
+            response_data['count'] = self.count
+        return Response(response_data)
@@ -0,0 +1,15 @@
+"""
+进程内的本地搜索引擎, 作为haystack后端使用, 代替Elasticsearch
+
+    HAYSTACK_CONNECTIONS = {
+        'default': {
+            'ENGINE': 'meidou_mall.utils.search.backend.LocalSearchEngine',
+            'PATH': os.path.join(BASE_DIR, 'search_index'),
+        },
+    }
+
+- tokenizer: 中文按单字和相邻两字(bigram)切分, 英文数字按单词切分
+- segment: 不可修改的索引段文件, 查询时通过mmap读取
+- index: 索引目录(清单 + 索引段), 写入/删除/合并, 进程内读取并在清单变化时自动重新加载, BM25排序
+- backend: haystack后端
+"""
@@ -0,0 +1,104 @@
+"""
+haystack本地搜索后端
+
+    'ENGINE': 'meidou_mall.utils.search.backend.LocalSearchEngine',
+    'PATH': 索引目录, 多个进程可以共用同一个目录
+
+只对索引的文档字段(SKUIndex.text, 即商品名称、副标题)分词, 其他字段只存储用于返回结果,
+查询时不访问Elasticsearch和数据库. 不支持排除条件、按字段过滤、分面和高亮
+"""
+from django.core.exceptions import ImproperlyConfigured
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery, log_query
+from haystack.constants import DJANGO_CT, DJANGO_ID
+from haystack.inputs import PythonData
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+
+from .index import LocalIndex
+from .tokenizer import tokenize
+
+# 每个进程中每个索引目录只打开一次 {目录: LocalIndex}
+_indexes = {}
+
+
+def get_index(path):
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = LocalIndex(path)
+    return index
+
+
+class LocalSearchBackend(BaseSearchBackend):
+
+    def __init__(self, connection_alias, **connection_options):
+        super().__init__(connection_alias, **connection_options)
+        if not connection_options.get('PATH'):
+            raise ImproperlyConfigured("You must specify a 'PATH' in your settings for connection '%s'." % connection_alias)
+        self.index = get_index(connection_options['PATH'])
+
+    def prepare_documents(self, index, iterable):
+        """:return: [(文档id, 存储字段字典, 词项列表), ...]"""
+        content_field = index.get_content_field()
+        docs = []
+        for obj in iterable:
+            prepared = index.full_prepare(obj)
+            docs.append((get_identifier(obj), prepared, tokenize(str(prepared.get(content_field) or ''))))
+        return docs
+
+    def update(self, index, iterable, commit=True):
+        self.index.add_documents(self.prepare_documents(index, iterable))
+
+    def remove(self, obj_or_string, commit=True):
+        self.index.delete_documents([get_identifier(obj_or_string)])
+
+    def clear(self, models=None, commit=True):
+        if not models:
+            self.index.clear()
+        else:
+            self.index.delete_by_prefix([get_model_ct(model) + '.' for model in models])
+
+    @log_query
+    def search(self, query_string, **kwargs):
+        if not query_string:
+            return {'results': [], 'hits': 0}
+
+        models = kwargs.get('models')
+        id_prefixes = tuple(get_model_ct(model) + '.' for model in models) if models else None
+        hits, docs = self.index.get_reader().search(
+            query_string, kwargs.get('start_offset') or 0, kwargs.get('end_offset'), id_prefixes)
+
+        result_class = kwargs.get('result_class') or SearchResult
+        results = []
+        for score, stored in docs:
+            app_label, model_name = stored[DJANGO_CT].split('.')
+            fields = {key: value for key, value in stored.items() if key not in (DJANGO_CT, DJANGO_ID)}
+            results.append(result_class(app_label, model_name, stored[DJANGO_ID], score, **fields))
+
+        return {'results': results, 'hits': hits, 'facets': {}, 'spelling_suggestion': None}
+
+    def more_like_this(self, model_instance, additional_query_string=None, **kwargs):
+        return {'results': [], 'hits': 0}
+
+
+class LocalSearchQuery(BaseSearchQuery):
+
+    def build_query_fragment(self, field, filter_type, value):
+        if not hasattr(value, 'prepare'):
+            value = PythonData(value)
+        return str(value.prepare(self))
+
+    def build_query(self):
+        """所有查询条件的内容合并为一个查询字符串, 由后端分词"""
+        fragments = []
+
+        def collect(field, filter_type, value):
+            fragments.append(self.build_query_fragment(field, filter_type, value))
+            return ''
+
+        self.query_filter.as_query_string(collect)
+        return ' '.join(fragment for fragment in fragments if fragment) or self.matching_all_fragment()
+
+
+class LocalSearchEngine(BaseEngine):
+    backend = LocalSearchBackend
+    query = LocalSearchQuery
@@ -0,0 +1,264 @@
+"""
+索引目录
+
+    manifest.json   清单 {'generation': 写入次数, 'segments': [{'name': 文件名, 'deleted': [已删除的文档序号]}]}
+    seg_<n>.bin     索引段
+    .lock           写入锁
+
+写入(增加/删除文档)在写入锁内进行: 新文档写入新的索引段, 旧版本的文档记录为已删除, 最后原子地替换清单,
+索引段数量超过 MAX_SEGMENTS 时合并为一个. 读取不加锁, 每次查询检查清单的修改时间, 变化时重新加载,
+被合并删除的索引段文件在已打开的进程中仍可通过mmap读取
+"""
+import fcntl
+import heapq
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+from .segment import Segment, write_segment
+from .tokenizer import tokenize_query
+
+MANIFEST_NAME = 'manifest.json'
+
+# 索引段数量超过这个值时合并
+MAX_SEGMENTS = 8
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class IndexReader(object):
+    """某一版清单对应的只读索引"""
+
+    def __init__(self, path, manifest):
+        self.segments = []
+        for item in manifest['segments']:
+            self.segments.append((Segment(os.path.join(path, item['name'])), frozenset(item['deleted'])))
+
+        self.doc_count = sum(segment.doc_count - len(deleted) for segment, deleted in self.segments)
+        # 词项的文档数(df)包含已删除、尚未合并掉的文档, 与Lucene相同, 文档总数和平均长度也按包含已删除文档计算,
+        # 否则更新过的文档较多时 df > 文档总数, idf为负数, 排序反转
+        total_length = sum(segment.total_length for segment, _ in self.segments)
+        self.total_docs = sum(segment.doc_count for segment, _ in self.segments)
+        self.avg_length = total_length / self.total_docs if self.total_docs else 0
+
+    def find(self, doc_id):
+        """:return: (索引段下标, 文档序号), 不存在时返回None"""
+        for i, (segment, deleted) in enumerate(self.segments):
+            ord_ = segment.ords.get(doc_id)
+            if ord_ is not None and ord_ not in deleted:
+                return i, ord_
+        return None
+
+    def iter_docs(self):
+        """所有未删除的文档 (索引段下标, 文档序号, 文档id)"""
+        for i, (segment, deleted) in enumerate(self.segments):
+            for ord_, doc_id in enumerate(segment.ids):
+                if ord_ not in deleted:
+                    yield i, ord_, doc_id
+
+    def search(self, query_string, start=0, end=None, id_prefixes=None):
+        """
+        BM25排序查询, 匹配任意一个查询词项的文档都会返回, 匹配的词项越多、越少见得分越高
+        :param query_string: 查询内容, '*' 返回全部文档
+        :param start: 返回结果的起始位置
+        :param end: 返回结果的结束位置, None为全部
+        :param id_prefixes: 只返回文档id以这些前缀开头的文档, 如 ('goods.sku.',)
+        :return: (匹配的文档总数, [(得分, 存储字段字典), ...])
+        """
+        def allowed(segment, ord_):
+            return id_prefixes is None or segment.ids[ord_].startswith(id_prefixes)
+
+        if query_string.strip() == '*':
+            matched = [(0.0, i, ord_) for i, ord_, _ in self.iter_docs() if allowed(self.segments[i][0], ord_)]
+            hits = len(matched)
+            page = matched[start:end]
+        else:
+            scores = {}
+            for term in tokenize_query(query_string):
+                df = sum(segment.get_postings(term)[0] for segment, _ in self.segments)
+                if not df:
+                    continue
+                idf = math.log(1 + (self.total_docs - df + 0.5) / (df + 0.5))
+                for i, (segment, deleted) in enumerate(self.segments):
+                    _, postings = segment.get_postings(term)
+                    lengths = segment.lengths
+                    for j in range(0, len(postings), 2):
+                        ord_ = postings[j]
+                        if ord_ in deleted or not allowed(segment, ord_):
+                            continue
+                        freq = postings[j + 1]
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[ord_] / self.avg_length)
+                        key = (i, ord_)
+                        scores[key] = scores.get(key, 0.0) + idf * freq * (BM25_K1 + 1) / (freq + norm)
+
+            hits = len(scores)
+            if end is None:
+                ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            else:
+                ranked = heapq.nsmallest(end, scores.items(), key=lambda item: (-item[1], item[0]))
+            page = [(score, i, ord_) for (i, ord_), score in ranked[start:end]]
+
+        return hits, [(score, self.segments[i][0].get_stored(ord_)) for score, i, ord_ in page]
+
+
+class LocalIndex(object):
+    """索引目录的读写"""
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        self._reader = None
+        self._reader_version = None
+        self._reader_lock = threading.Lock()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'segments': []}
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _manifest_version(self):
+        # 清单每次都是替换为新文件, inode和修改时间都可能变化
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def get_reader(self):
+        """当前清单对应的只读索引, 清单修改后自动重新加载"""
+        version = self._manifest_version()
+        if self._reader is not None and version == self._reader_version:
+            return self._reader
+
+        with self._reader_lock:
+            for _ in range(3):
+                version = self._manifest_version()
+                if self._reader is not None and version == self._reader_version:
+                    break
+                try:
+                    self._reader = IndexReader(self.path, self._read_manifest())
+                except FileNotFoundError:
+                    # 读取清单后索引段被同时进行的合并删除, 重新读取清单
+                    continue
+                self._reader_version = version
+                break
+        return self._reader
+
+    def _mark_deleted(self, manifest, doc_ids):
+        reader = IndexReader(self.path, manifest)
+        for doc_id in doc_ids:
+            found = reader.find(doc_id)
+            if found is not None:
+                manifest['segments'][found[0]]['deleted'].append(found[1])
+        return reader
+
+    def _commit(self, manifest, removed_files=()):
+        self._write_manifest(manifest)
+        for name in removed_files:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    def add_documents(self, docs):
+        """
+        写入文档, 已存在的同id文档被替换
+        :param docs: [(文档id, 存储字段字典, 词项列表), ...]
+        """
+        # 同一批中重复的文档以最后一个为准
+        docs = list({doc[0]: doc for doc in docs}.values())
+        if not docs:
+            return
+        with self._write_lock():
+            manifest = self._read_manifest()
+            self._mark_deleted(manifest, [doc[0] for doc in docs])
+            manifest['generation'] += 1
+            name = 'seg_%d.bin' % manifest['generation']
+            write_segment(os.path.join(self.path, name), docs)
+            manifest['segments'].append({'name': name, 'deleted': []})
+
+            removed_files = []
+            if len(manifest['segments']) > MAX_SEGMENTS:
+                removed_files = self._merge(manifest)
+            self._commit(manifest, removed_files)
+
+    def delete_documents(self, doc_ids):
+        with self._write_lock():
+            manifest = self._read_manifest()
+            self._mark_deleted(manifest, doc_ids)
+            manifest['generation'] += 1
+            self._commit(manifest)
+
+    def delete_by_prefix(self, prefixes):
+        """删除文档id以这些前缀开头的文档, 如 ('goods.sku.',)"""
+        with self._write_lock():
+            manifest = self._read_manifest()
+            reader = IndexReader(self.path, manifest)
+            for i, ord_, doc_id in reader.iter_docs():
+                if doc_id.startswith(tuple(prefixes)):
+                    manifest['segments'][i]['deleted'].append(ord_)
+            manifest['generation'] += 1
+            self._commit(manifest)
+
+    def clear(self):
+        with self._write_lock():
+            manifest = self._read_manifest()
+            removed_files = [item['name'] for item in manifest['segments']]
+            manifest['generation'] += 1
+            manifest['segments'] = []
+            self._commit(manifest, removed_files)
+
+    def optimize(self):
+        """把所有索引段合并为一个, 移除已删除的文档"""
+        with self._write_lock():
+            manifest = self._read_manifest()
+            if not manifest['segments']:
+                return
+            self._commit(manifest, self._merge(manifest))
+
+    def _merge(self, manifest):
+        """
+        合并清单中的索引段, 直接合并倒排表, 不需要重新分词
+        :return: 被合并的索引段文件名
+        """
+        reader = IndexReader(self.path, manifest)
+        new_ords = {}
+        docs = []
+        for i, ord_, doc_id in reader.iter_docs():
+            new_ords[(i, ord_)] = len(docs)
+            docs.append([doc_id, reader.segments[i][0].get_stored(ord_), {}])
+        for i, (segment, deleted) in enumerate(reader.segments):
+            for term, postings in segment.iter_terms():
+                for j in range(0, len(postings), 2):
+                    new_ord = new_ords.get((i, postings[j]))
+                    if new_ord is not None:
+                        docs[new_ord][2][term] = postings[j + 1]
+
+        removed_files = [item['name'] for item in manifest['segments']]
+        manifest['generation'] += 1
+        name = 'seg_%d.bin' % manifest['generation']
+        write_segment(os.path.join(self.path, name), docs)
+        manifest['segments'] = [{'name': name, 'deleted': []}]
+        return removed_files
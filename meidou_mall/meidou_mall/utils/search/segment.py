@@ -0,0 +1,135 @@
+"""
+索引段文件
+
+索引段写入后不再修改, 删除的文档记录在清单中, 合并时才真正移除
+文件格式(整数均为本机字节序, 各部分按8字节对齐):
+    头部            HEADER
+    文档长度        uint32[文档数]                 每个文档的词项数, 用于BM25
+    文档存储偏移    uint64[文档数 + 1]             存储字段JSON在存储区中的起止位置
+    文档id          JSON数组                        haystack文档id, 如 goods.sku.1
+    词典            JSON对象 {词项: [倒排表偏移, 文档频率]}
+    倒排表          uint32[...]                     每个词项为 [文档序号, 词频, 文档序号, 词频, ...]
+    存储区          每个文档存储字段的JSON
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections import Counter
+
+MAGIC = b'MDSEG001'
+
+# 魔数, 文档数, 词项总数, 各部分的偏移: 文档长度, 存储偏移, 文档id, 词典, 倒排表, 存储区
+HEADER = struct.Struct('<8sIQQQQQQQ')
+
+
+def _pad(f):
+    f.write(b'\0' * (-f.tell() % 8))
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def write_segment(path, docs):
+    """
+    写入索引段
+    :param path: 文件路径
+    :param docs: [(文档id, 存储字段字典, 词项列表) 或 (文档id, 存储字段字典, {词项: 词频})]
+    """
+    lengths = array('I')
+    postings = {}
+    for ord_, (doc_id, stored, tokens) in enumerate(docs):
+        term_freqs = tokens if isinstance(tokens, dict) else Counter(tokens)
+        lengths.append(sum(term_freqs.values()))
+        for term, freq in term_freqs.items():
+            postings.setdefault(term, array('I')).extend((ord_, freq))
+
+    stored_list = [_dumps(stored) for _, stored, _ in docs]
+    offsets = array('Q', [0])
+    for data in stored_list:
+        offsets.append(offsets[-1] + len(data))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        _pad(f)
+
+        lengths_offset = f.tell()
+        f.write(lengths.tobytes())
+        _pad(f)
+
+        offsets_offset = f.tell()
+        f.write(offsets.tobytes())
+        _pad(f)
+
+        ids_offset = f.tell()
+        f.write(_dumps([doc[0] for doc in docs]))
+        _pad(f)
+
+        terms = {}
+        position = 0
+        for term in sorted(postings):
+            terms[term] = [position, len(postings[term]) // 2]
+            position += len(postings[term])
+        terms_offset = f.tell()
+        f.write(_dumps(terms))
+        _pad(f)
+
+        postings_offset = f.tell()
+        for term in sorted(postings):
+            f.write(postings[term].tobytes())
+        _pad(f)
+
+        stored_offset = f.tell()
+        for data in stored_list:
+            f.write(data)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(docs), sum(lengths), lengths_offset, offsets_offset, ids_offset,
+                            terms_offset, postings_offset, stored_offset))
+    os.replace(tmp_path, path)
+
+
+class Segment(object):
+    """只读的索引段, 文档长度、倒排表、存储字段直接从mmap读取"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.doc_count, self.total_length, lengths_offset, offsets_offset, ids_offset,
+         terms_offset, postings_offset, stored_offset) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError('不是索引段文件: %s' % path)
+
+        view = memoryview(self._mm)
+        self.lengths = view[lengths_offset:lengths_offset + 4 * self.doc_count].cast('I')
+        self.offsets = view[offsets_offset:offsets_offset + 8 * (self.doc_count + 1)].cast('Q')
+        self.ids = json.loads(self._mm[ids_offset:terms_offset].rstrip(b'\0').decode('utf-8'))
+        self.terms = json.loads(self._mm[terms_offset:postings_offset].rstrip(b'\0').decode('utf-8'))
+        self.postings = view[postings_offset:stored_offset].cast('I')
+        self._stored_offset = stored_offset
+        self.ords = {doc_id: ord_ for ord_, doc_id in enumerate(self.ids)}
+
+    def get_postings(self, term):
+        """
+        :return: (文档频率, [文档序号, 词频, ...]), 词项不存在时返回 (0, 空)
+        """
+        entry = self.terms.get(term)
+        if entry is None:
+            return 0, ()
+        position, df = entry
+        return df, self.postings[position:position + 2 * df]
+
+    def get_stored(self, ord_):
+        start = self._stored_offset + self.offsets[ord_]
+        end = self._stored_offset + self.offsets[ord_ + 1]
+        return json.loads(self._mm[start:end].decode('utf-8'))
+
+    def iter_terms(self):
+        """合并时使用 (词项, [文档序号, 词频, ...])"""
+        for term, (position, df) in self.terms.items():
+            yield term, self.postings[position:position + 2 * df]
@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from meidou_mall.utils.search import index as search_index
+from meidou_mall.utils.search.index import LocalIndex
+from meidou_mall.utils.search.tokenizer import tokenize, tokenize_query
+
+
+class TokenizerTest(SimpleTestCase):
+    """分词"""
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('华为手机 P10 Plus'), ['华', '为', '手', '机', '华为', '为手', '手机', 'p10', 'plus'])
+        self.assertEqual(tokenize('iPhone8(金色)'), ['iphone8', '金', '色', '金色'])
+        self.assertEqual(tokenize('--'), [])
+
+    def test_tokenize_query(self):
+        self.assertEqual(tokenize_query('华为手机 华为'), ['华为', '为手', '手机'])
+        self.assertEqual(tokenize_query('机'), ['机'])
+        self.assertEqual(tokenize_query('Apple apple 8'), ['apple', '8'])
+
+
+def _doc(sku_id, name):
+    return 'goods.sku.%s' % sku_id, {'id': sku_id, 'name': name}, tokenize(name)
+
+
+class LocalIndexTest(SimpleTestCase):
+    """索引目录的写入和BM25查询"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = LocalIndex(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def search(self, query_string, **kwargs):
+        hits, results = self.index.get_reader().search(query_string, **kwargs)
+        return hits, [(score, stored['id']) for score, stored in results]
+
+    def test_ranking(self):
+        self.index.add_documents([
+            _doc(1, '华为手机'),
+            _doc(2, '华为手机 华为 华为'),
+            _doc(3, '小米 note'),
+            _doc(4, '华为平板'),
+        ])
+        hits, results = self.search('华为手机')
+        self.assertEqual(hits, 3)
+        self.assertEqual([sku_id for _, sku_id in results], [1, 2, 4])
+        self.assertTrue(all(score > 0 for score, _ in results))
+
+        hits, results = self.search('华为手机', start=1, end=2)
+        self.assertEqual(hits, 3)
+        self.assertEqual([sku_id for _, sku_id in results], [2])
+
+        self.assertEqual(self.search('苹果')[0], 0)
+
+    def test_updated_documents(self):
+        # 反复更新的文档留下大量已删除、未合并的文档, 得分仍为正数, 词频高的文档排在前面
+        with mock.patch.object(search_index, 'MAX_SEGMENTS', 100):
+            for _ in range(20):
+                self.index.add_documents([_doc(1, '华为手机'), _doc(2, '华为 华为 华为 平板')])
+            hits, results = self.search('华为')
+        self.assertEqual(hits, 2)
+        self.assertEqual([sku_id for _, sku_id in results], [2, 1])
+        self.assertTrue(all(score > 0 for score, _ in results))
+
+    def test_delete_and_merge(self):
+        with mock.patch.object(search_index, 'MAX_SEGMENTS', 2):
+            for sku_id in range(1, 6):
+                self.index.add_documents([_doc(sku_id, '手机 %s' % sku_id)])
+            self.index.add_documents([_doc(3, '平板')])
+            self.index.delete_documents(['goods.sku.1', 'goods.sku.9'])
+
+            self.assertLessEqual(len(self.index._read_manifest()['segments']), 3)
+            hits, results = self.search('手机')
+            self.assertEqual(hits, 3)
+            self.assertEqual(sorted(sku_id for _, sku_id in results), [2, 4, 5])
+            self.assertEqual([sku_id for _, sku_id in self.search('平板')[1]], [3])
+
+            self.index.optimize()
+            self.assertEqual(len(self.index._read_manifest()['segments']), 1)
+            self.assertEqual(sorted(sku_id for _, sku_id in self.search('手机')[1]), [2, 4, 5])
+
+    def test_match_all_and_prefixes(self):
+        self.index.add_documents([_doc(1, '手机'), ('goods.goods.1', {'id': 100}, tokenize('手机'))])
+        self.assertEqual(self.search('*')[0], 2)
+        self.assertEqual([sku_id for _, sku_id in self.search('*', id_prefixes=('goods.sku.',))[1]], [1])
+        self.assertEqual([sku_id for _, sku_id in self.search('手机', id_prefixes=('goods.sku.',))[1]], [1])
+
+        self.index.delete_by_prefix(['goods.sku.'])
+        self.assertEqual([sku_id for _, sku_id in self.search('*')[1]], [100])
+
+        self.index.clear()
+        self.assertEqual(self.search('*')[0], 0)
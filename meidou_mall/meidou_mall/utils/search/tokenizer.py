@@ -0,0 +1,37 @@
+"""
+分词
+
+中文没有空格分隔, 不使用词典, 建立索引时每个汉字和每两个相邻汉字都作为词项,
+查询时两个字以上的中文只使用相邻两字, 单字查询使用单字, 英文和数字按单词切分并转为小写
+"""
+import re
+
+# 连续的汉字, 或连续的英文字母数字
+TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[0-9a-z]+')
+
+
+def _is_cjk(run):
+    return '\u4e00' <= run[0] <= '\u9fff'
+
+
+def tokenize(text):
+    """建立索引时的分词"""
+    tokens = []
+    for run in TOKEN_RE.findall(text.lower()):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def tokenize_query(text):
+    """查询时的分词, 去重并保持顺序"""
+    tokens = []
+    for run in TOKEN_RE.findall(text.lower()):
+        if _is_cjk(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return list(dict.fromkeys(tokens))
@@ -0,0 +1,158 @@
+"""
+排队的haystack信号处理器
+
+HAYSTACK_SIGNAL_PROCESSOR = 'meidou_mall.utils.search_queue.QueuedSignalProcessor'
+
+模型保存/删除时只把文档id记录到redis集合中(同一文档多次修改合并为一次), 由celery定时任务
+flush_search_index 批量更新索引, 保存操作不再等待搜索引擎
+- 索引类可以声明 non_indexed_fields, save(update_fields=...) 只修改这些字段时不记录
+- 事务提交后才记录, 批量更新时从主库读取, 不会读到修改前的数据
+- 批量更新时比较文档内容的哈希, 未影响索引内容的修改(如只修改了库存、销量)不写入搜索引擎
+  手动清空索引(clear_index)后需同时删除redis中的 search_doc_hashes, rebuild_index 重建全部文档不受影响
+"""
+import hashlib
+import json
+import logging
+
+from django.apps import apps
+from django.db import models, transaction
+from django_redis import get_redis_connection
+from haystack import connections
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+from haystack.utils import get_identifier
+
+from meidou_mall.utils.db_router import use_primary
+
+logger = logging.getLogger('django')
+
+# 需要更新的文档id set, 如 goods.sku.1
+SEARCH_DIRTY_KEY = 'search_dirty'
+
+# 需要删除的文档id set
+SEARCH_DELETED_KEY = 'search_deleted'
+
+# 已写入搜索引擎的文档内容哈希 hash {文档id: 哈希}
+SEARCH_DOC_HASHES_KEY = 'search_doc_hashes'
+
+
+def _get_index(model, using='default'):
+    try:
+        return connections[using].get_unified_index().get_index(model)
+    except NotHandled:
+        return None
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def handle_save(self, sender, instance, update_fields=None, **kwargs):
+        index = _get_index(sender)
+        if index is None:
+            return
+        if update_fields and set(update_fields) <= set(getattr(index, 'non_indexed_fields', ())):
+            return
+        doc_id = get_identifier(instance)
+        transaction.on_commit(lambda: get_redis_connection('default').sadd(SEARCH_DIRTY_KEY, doc_id))
+
+    def handle_delete(self, sender, instance, **kwargs):
+        if _get_index(sender) is None:
+            return
+        doc_id = get_identifier(instance)
+
+        def record():
+            pl = get_redis_connection('default').pipeline()
+            pl.sadd(SEARCH_DELETED_KEY, doc_id)
+            pl.srem(SEARCH_DIRTY_KEY, doc_id)
+            pl.execute()
+
+        transaction.on_commit(record)
+
+
+def _take(redis_conn):
+    """取出并清空待处理的文档id"""
+    pl = redis_conn.pipeline()
+    pl.smembers(SEARCH_DIRTY_KEY)
+    pl.smembers(SEARCH_DELETED_KEY)
+    pl.delete(SEARCH_DIRTY_KEY, SEARCH_DELETED_KEY)
+    dirty, deleted, _ = pl.execute()
+    return {doc_id.decode() for doc_id in dirty}, {doc_id.decode() for doc_id in deleted}
+
+
+def _doc_hash(index, obj):
+    data = json.dumps(index.full_prepare(obj), sort_keys=True, default=str)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def flush_search_queue():
+    """
+    把排队的修改批量写入搜索引擎
+    :return: (更新的文档数量, 删除的文档数量)
+    """
+    redis_conn = get_redis_connection('default')
+    dirty, deleted = _take(redis_conn)
+    if not dirty and not deleted:
+        return 0, 0
+
+    try:
+        # 按模型分组 {(app_label, model_name): {pk, ...}}
+        groups = {}
+        for doc_id in dirty:
+            app_label, model_name, pk = doc_id.split('.', 2)
+            groups.setdefault((app_label, model_name), set()).add(pk)
+
+        updated = 0
+        removed = set(deleted)
+        # 从库可能还没有新建或修改的数据, 读取对象和生成文档内容(关联对象)都使用主库
+        with use_primary():
+            for (app_label, model_name), pks in groups.items():
+                model = apps.get_model(app_label, model_name)
+                index = _get_index(model)
+                if index is None:
+                    continue
+                # 不在索引范围内的对象(如已下架的商品)从索引中删除
+                objs = list(index.index_queryset().filter(pk__in=pks))
+                found = {str(obj.pk) for obj in objs}
+                removed.update('%s.%s.%s' % (app_label, model_name, pk) for pk in pks - found)
+
+                # 索引内容没有变化的文档不写入
+                doc_ids = [get_identifier(obj) for obj in objs]
+                old_hashes = redis_conn.hmget(SEARCH_DOC_HASHES_KEY, doc_ids) if doc_ids else []
+                changed = []
+                new_hashes = {}
+                for obj, doc_id, old_hash in zip(objs, doc_ids, old_hashes):
+                    doc_hash = _doc_hash(index, obj)
+                    if old_hash is None or old_hash.decode() != doc_hash:
+                        changed.append(obj)
+                        new_hashes[doc_id] = doc_hash
+
+                if changed:
+                    for using in connections.connections_info:
+                        connections[using].get_backend().update(index, changed)
+                    redis_conn.hmset(SEARCH_DOC_HASHES_KEY, new_hashes)
+                    updated += len(changed)
+
+        if removed:
+            for using in connections.connections_info:
+                backend = connections[using].get_backend()
+                for doc_id in removed:
+                    backend.remove(doc_id)
+            redis_conn.hdel(SEARCH_DOC_HASHES_KEY, *removed)
+    except Exception:
+        # 写入失败时放回队列, 下次重试
+        pl = redis_conn.pipeline()
+        if dirty:
+            pl.sadd(SEARCH_DIRTY_KEY, *dirty)
+        if deleted:
+            pl.sadd(SEARCH_DELETED_KEY, *deleted)
+        pl.execute()
+        raise
+
+    return updated, len(removed)
@@ -0,0 +1,92 @@
+"""
+静态化页面写入
+
+- 先写入同目录下的临时文件再重命名, nginx不会读到写了一半的文件
+- 同时生成预压缩的 .gz 文件(安装了brotli时还生成 .br), 供nginx的 gzip_static / brotli_static 直接使用
+- 每个页面的内容哈希(ETag)记录在redis的清单hash中, 内容未改变的页面不重写
+"""
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 页面清单 redis hash {相对路径: 内容sha1}
+STATIC_HTML_MANIFEST_KEY = 'static_html_manifest'
+
+# 写入的文件权限, 需要nginx可读
+STATIC_HTML_FILE_MODE = 0o644
+
+
+def _atomic_write(file_path, content):
+    """写入临时文件后原子地替换目标文件"""
+    dir_name = os.path.dirname(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, STATIC_HTML_FILE_MODE)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _gzip(content):
+    buf = io.BytesIO()
+    # mtime固定为0, 相同内容的压缩结果相同
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(content)
+    return buf.getvalue()
+
+
+def get_static_html_etag(relative_path):
+    """查询清单中页面的内容哈希, 没有记录时返回None"""
+    etag = get_redis_connection('default').hget(STATIC_HTML_MANIFEST_KEY, relative_path)
+    return etag.decode() if etag else None
+
+
+def write_static_html(relative_path, html_text):
+    """
+    保存静态化页面, 内容未改变时不重写文件
+    :param relative_path: 相对于GENERATED_STATIC_HTML_FILES_DIR的路径, 如 goods/1.html
+    :param html_text: 页面内容
+    :return: 是否写入了文件
+    """
+    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, relative_path)
+    content = html_text.encode('utf-8')
+    etag = hashlib.sha1(content).hexdigest()
+
+    redis_conn = get_redis_connection('default')
+    old_etag = redis_conn.hget(STATIC_HTML_MANIFEST_KEY, relative_path)
+    if old_etag and old_etag.decode() == etag and os.path.exists(file_path):
+        return False
+
+    # 先写压缩文件再写页面, 页面替换后对应的压缩文件已经是新内容
+    _atomic_write(file_path + '.gz', _gzip(content))
+    if brotli is not None:
+        _atomic_write(file_path + '.br', brotli.compress(content, mode=brotli.MODE_TEXT))
+    _atomic_write(file_path, content)
+
+    redis_conn.hset(STATIC_HTML_MANIFEST_KEY, relative_path, etag)
+    return True
+
+
+def remove_static_html(relative_path):
+    """删除静态化页面及其压缩文件"""
+    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, relative_path)
+    for path in (file_path, file_path + '.gz', file_path + '.br'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    get_redis_connection('default').hdel(STATIC_HTML_MANIFEST_KEY, relative_path)
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import NotFound
+
+from goods.models import SKU
+from meidou_mall.utils.pagination import KeysetPagination
+
+
+class FakeRequest(object):
+    def __init__(self, **query_params):
+        self.query_params = query_params
+
+
+class KeysetCursorTest(SimpleTestCase):
+    """游标分页的游标编解码"""
+
+    def setUp(self):
+        self.paginator = KeysetPagination()
+
+    def decode(self, cursor, ordering):
+        return self.paginator.decode_cursor(FakeRequest(cursor=cursor), ordering, SKU)
+
+    def test_first_page(self):
+        self.assertIsNone(self.paginator.decode_cursor(FakeRequest(), '-sales', SKU))
+        self.assertIsNone(self.decode('', '-sales'))
+
+    def test_round_trip(self):
+        cursor = self.paginator.encode_cursor('-sales', 10, 5, False)
+        self.assertEqual(self.decode(cursor, '-sales'), (10, 5, False))
+
+        cursor = self.paginator.encode_cursor('price', Decimal('12.50'), 3, True)
+        self.assertEqual(self.decode(cursor, 'price'), (Decimal('12.50'), 3, True))
+
+        create_time = datetime(2018, 5, 1, 10, 30, tzinfo=timezone(timedelta(hours=8)))
+        cursor = self.paginator.encode_cursor('-create_time', create_time, 7, False)
+        self.assertEqual(self.decode(cursor, '-create_time'), (create_time, 7, False))
+
+    def test_other_ordering(self):
+        cursor = self.paginator.encode_cursor('-sales', 10, 5, False)
+        with self.assertRaises(NotFound):
+            self.decode(cursor, 'price')
+
+    def test_malformed_cursor(self):
+        for cursor in ('!!!', 'abc', self.paginator.encode_cursor('-sales', 10, 'x', False)):
+            with self.assertRaises(NotFound):
+                self.decode(cursor, '-sales')
+
+    def test_invalid_value(self):
+        for ordering, value in (('create_time', 'abc'), ('price', 'abc'), ('-sales', 'abc'), ('-sales', None)):
+            # 篡改的游标值
+            cursor = base64.urlsafe_b64encode(json.dumps([ordering, value, 1, False]).encode()).decode()
+            with self.assertRaises(NotFound):
+                self.decode(cursor, ordering)
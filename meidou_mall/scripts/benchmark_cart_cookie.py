@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+功能：对比cookie购物车旧格式 base64(pickle) 与 carts.codec 的cookie长度和编解码耗时
+使用方法:
+    ./benchmark_cart_cookie.py
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../meidou_mall/apps')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meidou_mall.settings.dev'
+
+# 让django进行初始化设置
+import django
+django.setup()
+
+
+import base64
+import pickle
+import random
+import timeit
+
+from carts.codec import decode_cart, encode_cart
+
+
+# 测试的购物车商品种数
+CART_SIZES = (1, 5, 20, 50, 200)
+
+# 每种购物车编解码的次数
+NUMBER = 2000
+
+
+def legacy_encode(cart_dict):
+    return base64.b64encode(pickle.dumps(cart_dict)).decode()
+
+
+def legacy_decode(cookie_cart):
+    return pickle.loads(base64.b64decode(cookie_cart.encode()))
+
+
+def make_cart(size):
+    sku_ids = random.sample(range(1, 100000), size)
+    return {sku_id: {'count': random.randint(1, 10), 'selected': random.random() < 0.8} for sku_id in sku_ids}
+
+
+def per_call_us(stmt):
+    return timeit.timeit(stmt, number=NUMBER) / NUMBER * 1000000
+
+
+if __name__ == '__main__':
+    print('%6s | %18s | %22s | %22s' % ('商品数', 'cookie字节 旧/新', '编码耗时us 旧/新', '解码耗时us 旧/新'))
+    for size in CART_SIZES:
+        cart_dict = make_cart(size)
+        legacy_cookie = legacy_encode(cart_dict)
+        new_cookie = encode_cart(cart_dict)
+        assert decode_cart(new_cookie) == cart_dict
+
+        print('%6d | %8d / %7d | %10.1f / %9.1f | %10.1f / %9.1f' % (
+            size,
+            len(legacy_cookie), len(new_cookie),
+            per_call_us(lambda: legacy_encode(cart_dict)), per_call_us(lambda: encode_cart(cart_dict)),
+            per_call_us(lambda: legacy_decode(legacy_cookie)), per_call_us(lambda: decode_cart(new_cookie)),
+        ))
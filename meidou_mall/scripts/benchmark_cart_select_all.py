@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+功能：对比大购物车(500行以上)全选/取消全选的耗时
+    redis购物车: 旧实现(hgetall取出整个hash再sadd, 两次往返) 与 lua脚本(一次往返, 数据不经过网络)
+    cookie购物车: 全选(需要重写cookie) 与 已全选时再次全选(不重写cookie)
+    使用redis的cart库中单独的测试键, 测试后删除
+使用方法:
+    ./benchmark_cart_select_all.py
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../meidou_mall/apps')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meidou_mall.settings.dev'
+
+# 让django进行初始化设置
+import django
+django.setup()
+
+
+import random
+import timeit
+
+from django.http import HttpResponse
+from django_redis import get_redis_connection
+
+from carts.codec import encode_cart
+from carts.store import CookieCartStore, RedisCartStore
+
+# 测试的购物车商品种数
+CART_SIZES = (500, 1000, 5000, 20000)
+
+# 每种购物车全选的次数
+NUMBER = 200
+
+# 测试用户id, 不与真实用户冲突
+BENCHMARK_USER_ID = 'benchmark'
+
+
+class CookieRequest(object):
+    def __init__(self, cookies):
+        self.COOKIES = cookies
+
+
+def legacy_select_all(redis_conn, store):
+    redis_cart = redis_conn.hgetall(store.cart_key)
+    sku_id_list = redis_cart.keys()
+    redis_conn.sadd(store.selected_key, *sku_id_list)
+
+
+def per_call_ms(stmt):
+    return timeit.timeit(stmt, number=NUMBER) / NUMBER * 1000
+
+
+def cookie_select_all(cookie_cart):
+    store = CookieCartStore(CookieRequest({'cart': cookie_cart}))
+    store.select_all(True)
+    store.save(HttpResponse())
+
+
+if __name__ == '__main__':
+    redis_conn = get_redis_connection('cart')
+    store = RedisCartStore(BENCHMARK_USER_ID, redis_conn)
+
+    print('%6s | %22s | %12s | %24s' % ('商品数', 'redis全选ms 旧/lua', '取消全选ms', 'cookie全选ms 修改/未修改'))
+    try:
+        for size in CART_SIZES:
+            sku_ids = random.sample(range(1, 1000000), size)
+            redis_conn.delete(store.cart_key, store.selected_key)
+            redis_conn.hmset(store.cart_key, {sku_id: random.randint(1, 10) for sku_id in sku_ids})
+
+            legacy_ms = per_call_ms(lambda: legacy_select_all(redis_conn, store))
+            lua_ms = per_call_ms(lambda: store.select_all(True))
+            assert redis_conn.scard(store.selected_key) == size
+            deselect_ms = per_call_ms(lambda: store.select_all(False))
+            assert redis_conn.scard(store.selected_key) == 0
+
+            unselected_cookie = encode_cart({sku_id: {'count': 1, 'selected': False} for sku_id in sku_ids})
+            selected_cookie = encode_cart({sku_id: {'count': 1, 'selected': True} for sku_id in sku_ids})
+
+            print('%6d | %10.2f / %9.2f | %12.2f | %11.2f / %10.2f' % (
+                size, legacy_ms, lua_ms, deselect_ms,
+                per_call_ms(lambda: cookie_select_all(unselected_cookie)),
+                per_call_ms(lambda: cookie_select_all(selected_cookie)),
+            ))
+    finally:
+        redis_conn.delete(store.cart_key, store.selected_key)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+功能：对比数据库连接方式的每秒请求数
+    每次请求: request_started信号 -> 一次主库查询 -> request_finished信号, 与django处理请求时的连接管理相同
+    no_persist   CONN_MAX_AGE=0, 每个请求新建连接(修改前的配置)
+    persistent   CONN_MAX_AGE>0, 持久连接 + 请求开始时的空闲检查
+    pool         meidou_mall.utils.db_pool 连接池后端, CONN_MAX_AGE=0
+使用方法:
+    ./benchmark_db_connections.py                       默认每种方式2000个请求, 4个线程
+    ./benchmark_db_connections.py --requests 5000 --threads 8
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../meidou_mall/apps')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meidou_mall.settings.dev'
+
+# 让django进行初始化设置
+import django
+django.setup()
+
+
+import argparse
+import copy
+import threading
+import time
+
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from meidou_mall.utils import db_connections
+from meidou_mall.utils.db_pool.base import DatabaseWrapper as PoolDatabaseWrapper
+
+ALIAS = 'default'
+
+MODES = ('no_persist', 'persistent', 'pool')
+
+
+def make_connection(mode):
+    """为当前线程创建指定方式的数据库连接对象"""
+    settings_dict = copy.deepcopy(connections.databases[ALIAS])
+    if mode == 'pool':
+        settings_dict['CONN_MAX_AGE'] = 0
+        return PoolDatabaseWrapper(settings_dict, ALIAS)
+    settings_dict['CONN_MAX_AGE'] = 0 if mode == 'no_persist' else 60
+    return connections[ALIAS].__class__(settings_dict, ALIAS)
+
+
+def worker(mode, count):
+    connections[ALIAS] = make_connection(mode)
+    for _ in range(count):
+        request_started.send(sender=None)
+        db_connections.check_connections()
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        connections[ALIAS].last_used_at = time.time()
+        request_finished.send(sender=None)
+    connections[ALIAS].close()
+
+
+def run(mode, requests, threads):
+    db_connections.reset_connection_metrics()
+    per_thread = requests // threads
+    thread_list = [threading.Thread(target=worker, args=(mode, per_thread)) for _ in range(threads)]
+    start = time.time()
+    for t in thread_list:
+        t.start()
+    for t in thread_list:
+        t.join()
+    seconds = time.time() - start
+    return per_thread * threads / seconds, db_connections.get_connection_metrics().get(ALIAS, {})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='对比数据库连接方式的每秒请求数')
+    parser.add_argument('--requests', type=int, default=2000, help='每种方式的请求数')
+    parser.add_argument('--threads', type=int, default=4, help='并发线程数')
+    args = parser.parse_args()
+
+    print('%-12s %10s  %s' % ('方式', '请求/秒', '连接统计'))
+    for mode in MODES:
+        rps, metrics = run(mode, args.requests, args.threads)
+        print('%-12s %10.1f  %s' % (mode, rps, metrics))
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+功能：比对redis预扣库存与数据库库存, 数据库库存 - 待同步销量 应等于 redis库存
+使用方法:
+    ./check_stock_drift.py          只检查
+    ./check_stock_drift.py --fix    按数据库库存重新校准不一致的商品
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../meidou_mall/apps')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meidou_mall.settings.dev'
+
+# 让django进行初始化设置
+import django
+django.setup()
+
+
+from goods import inventory
+
+
+if __name__ == '__main__':
+    drift = inventory.check_stock_drift()
+    for item in drift:
+        print('sku %(sku_id)s: 数据库库存 %(db_stock)s, 待同步销量 %(pending)s, redis库存 %(redis_stock)s' % item)
+    print('共%d个商品库存不一致' % len(drift))
+
+    if drift and '--fix' in sys.argv[1:]:
+        inventory.load_stock([item['sku_id'] for item in drift])
+        print('已重新校准')
+
+    sys.exit(1 if drift else 0)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""
+功能：把上架商品的库存镜像到redis, 用于开启redis预扣库存(STOCK_REDIS_PREDECREMENT)
+使用方法:
+    ./load_stock_to_redis.py [sku_id ...]
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../meidou_mall/apps')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meidou_mall.settings.dev'
+
+# 让django进行初始化设置
+import django
+django.setup()
+
+
+from goods import inventory
+
+
+if __name__ == '__main__':
+    sku_ids = [int(sku_id) for sku_id in sys.argv[1:]] or None
+    count = inventory.load_stock(sku_ids)
+    print('已镜像%d个商品的库存' % count)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+"""
+功能：输出各类商品搜索的耗时分位数(毫秒), 按 缓存命中(hit)/未命中(miss) 区分
+    查询类别: all(空查询) single(单字) cjk(中文) latin(字母数字) mixed(混合)
+使用方法:
+    ./search_latency_report.py
+"""
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../meidou_mall/apps')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meidou_mall.settings.dev'
+
+# 让django进行初始化设置
+import django
+django.setup()
+
+from goods.search import get_latency_percentiles
+
+
+if __name__ == '__main__':
+    report = get_latency_percentiles()
+    print('%-12s %8s %10s %10s %10s' % ('class', 'count', 'p50', 'p90', 'p99'))
+    for name in sorted(report):
+        item = report[name]
+        print('%-12s %8d %10.3f %10.3f %10.3f' % (name, item['count'], item[50], item[90], item[99]))